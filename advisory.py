@@ -0,0 +1,264 @@
+# advisory.py
+"""
+Nightly precomputed advisories for every known location.
+
+run_job() collects the known points (DISTRICTS in extract_soil_from_rasters,
+the districts / --points villages of data_builders/fetch_climate_and_soil,
+data/climate_soil_summary.csv and the bundled gazetteer, which is where typed
+city names resolve to), then per location computes soil values, weather
+features, the 30-day heavy-rain risk and the top crops for each fertility
+preset. Soil is one vectorized grid lookup, weather and risk are fetched
+concurrently and all location x preset rows are scored in a single batch.
+
+Results go to advisory.db, one compact JSON record per location cell (same
+~1 km grid as the HTTP cache). The app reads a record first and computes live
+only for cells the job doesn't cover or whose record is older than MAX_AGE_S.
+
+    python advisory.py                                  # e.g. cron: 30 2 * * * cd /app && python advisory.py
+    python advisory.py --points data/villages.csv       # plus every village in a CSV (name, lat, lon)
+"""
+import os, sys, json, time, sqlite3, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from http_client import cell_key
+from lookup_table import FERTILITY_PRESETS
+from telemetry import span
+
+DB_PATH = "advisory.db"
+SUMMARY_CSV = "data/climate_soil_summary.csv"
+MAX_AGE_S = 36 * 3600  # a record survives one missed nightly run
+WORKERS = 8
+TOP_K = 3
+# what page_crop falls back to when soil/weather are unknown
+DEFAULT_PH, DEFAULT_TEMP, DEFAULT_HUMIDITY = 6.5, 25.0, 60
+
+
+class AdvisoryStore:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS advisories "
+                         "(lat_cell INTEGER, lon_cell INTEGER, name TEXT, lat REAL, lon REAL, "
+                         "computed_at REAL NOT NULL, payload TEXT NOT NULL, "
+                         "PRIMARY KEY (lat_cell, lon_cell))")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put_many(self, records):
+        """Upsert records (dicts with name, lat, lon, computed_at and the payload fields)."""
+        rows = []
+        for r in records:
+            payload = {k: v for k, v in r.items() if k not in ("name", "lat", "lon", "computed_at")}
+            rows.append((*cell_key(r["lat"], r["lon"]), r["name"], float(r["lat"]), float(r["lon"]),
+                         float(r["computed_at"]), json.dumps(payload, separators=(",", ":"))))
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def get(self, lat, lon, max_age=MAX_AGE_S):
+        """Record for the point's cell, or None if there isn't a fresh one."""
+        row = self._conn().execute(
+            "SELECT name, lat, lon, computed_at, payload FROM advisories WHERE lat_cell = ? AND lon_cell = ?",
+            cell_key(lat, lon)).fetchone()
+        if row is None or (max_age is not None and time.time() - row[3] > max_age):
+            return None
+        return {"name": row[0], "lat": row[1], "lon": row[2], "computed_at": row[3], **json.loads(row[4])}
+
+    def stats(self):
+        n, oldest, newest = self._conn().execute(
+            "SELECT COUNT(*), MIN(computed_at), MAX(computed_at) FROM advisories").fetchone()
+        return {"locations": n, "oldest": oldest, "newest": newest}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_advisory_store(db_path=DB_PATH):
+    """Process-wide AdvisoryStore, or None when the job hasn't written one yet."""
+    global _store
+    if _store is not None and _store.db_path == db_path:
+        return _store
+    if not os.path.exists(db_path):
+        return None
+    with _store_lock:
+        if _store is None or _store.db_path != db_path:
+            _store = AdvisoryStore(db_path)
+        return _store
+
+
+def lookup(lat, lon, db_path=DB_PATH):
+    """Fresh advisory record for a point, or None (no store, unknown cell, stale or unreadable)."""
+    store = get_advisory_store(db_path)
+    if store is None:
+        return None
+    try:
+        with span("advisory_lookup"):
+            return store.get(lat, lon)
+    except sqlite3.Error:
+        return None
+
+
+def crop_inputs(fertility, soil, weather):
+    """The feature values page_crop builds for a preset, with its widget defaults for unknowns."""
+    n, p, k = FERTILITY_PRESETS[fertility]
+    weather = weather or {}
+    ph = soil.get("phh2o")
+    temp = weather.get("avg_temp")
+    hum = weather.get("avg_humidity")
+    return {"N": n, "P": p, "K": k,
+            "temperature": temp if temp is not None else DEFAULT_TEMP,
+            "humidity": hum if hum is not None else DEFAULT_HUMIDITY,
+            "ph": ph if ph is not None else DEFAULT_PH,
+            "rainfall": weather.get("next_7d_rainfall_mm") or 0.0}
+
+
+def precomputed_crop(record, fertility, values, model_version):
+    """Stored result for this preset if it was scored from the same inputs and model, else None."""
+    if not record:
+        return None
+    res = (record.get("crops") or {}).get(fertility)
+    if not res or res.get("model_version") != model_version:
+        return None
+    stored = res.get("inputs", {})
+    if any(f not in stored or abs(float(stored[f]) - float(v)) > 1e-9 for f, v in values.items()):
+        return None
+    return res
+
+
+# -------------------------------
+# Known locations
+# -------------------------------
+def known_locations(summary_csv=SUMMARY_CSV, points_csv=None, gazetteer=True):
+    """[(name, lat, lon)] from every location source, first name wins per cell."""
+    import pandas as pd
+    found = []
+    try:
+        from extract_soil_from_rasters import DISTRICTS
+        found += [(d, lat, lon) for d, (lat, lon) in DISTRICTS.items()]
+    except ImportError:
+        pass
+    builders = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_builders")
+    if builders not in sys.path:
+        sys.path.insert(0, builders)
+    try:
+        from fetch_climate_and_soil import load_points
+        found += load_points()
+        if points_csv:
+            found += load_points(points_csv)
+    except ImportError:
+        if points_csv:
+            df = pd.read_csv(points_csv)
+            name_col = next(c for c in ("name", "village", "district") if c in df.columns)
+            found += list(zip(df[name_col].astype(str), df["lat"], df["lon"]))
+    if summary_csv and os.path.exists(summary_csv):
+        df = pd.read_csv(summary_csv)
+        found += list(zip(df["district"].astype(str), df["lat"], df["lon"]))
+    if gazetteer:
+        from gazetteer import get_gazetteer
+        found += [(p.name, p.lat, p.lon) for p in get_gazetteer().places if p.source == "bundled"]
+
+    seen, out = set(), []
+    for name, lat, lon in found:
+        key = cell_key(lat, lon)
+        if key not in seen:
+            seen.add(key)
+            out.append((name, float(lat), float(lon)))
+    return out
+
+
+# -------------------------------
+# Job
+# -------------------------------
+def _soil(lats, lons):
+    from utils import fetch_soilgrids_local_many
+    df = fetch_soilgrids_local_many(lats, lons)
+    return [{k: (float(v) if np.isfinite(v) else None) for k, v in row.items()}
+            for row in df.to_dict("records")]
+
+
+def _weather(points, key, workers):
+    if not key:
+        return [None] * len(points)
+    from utils import fetch_openweather
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda p: fetch_openweather(p[1], p[2], key), points))
+
+
+def _crops(soils, weathers, model_dir, top_k):
+    """{preset: result} per location, all location x preset rows scored in one batch."""
+    from model_registry import get_registry
+    art = get_registry(model_dir).current()
+    presets = list(FERTILITY_PRESETS)
+    inputs = [crop_inputs(f, s, w) for s, w in zip(soils, weathers) for f in presets]
+    X = np.array([[v.get(f, 0.0) for f in art.features] for v in inputs], dtype=float)
+    probs = art.predict_proba(X)
+    contrib, _ = art.contributions(X, probs.argmax(axis=1))
+    results = art.rank(probs, top_k=top_k, contrib=contrib)
+    out = []
+    for i in range(len(soils)):
+        row = {}
+        for j, f in enumerate(presets):
+            res = results[i * len(presets) + j]
+            res["inputs"] = inputs[i * len(presets) + j]
+            row[f] = res
+        out.append(row)
+    return out
+
+
+def run_job(locations=None, db_path=DB_PATH, model_dir="./model_artifacts", workers=WORKERS, top_k=TOP_K):
+    """Compute and store an advisory for every location; returns the number written."""
+    from app_risk import compute_risk_batch
+    locations = known_locations() if locations is None else locations
+    if not locations:
+        return 0
+    now = time.time()
+    lats = [p[1] for p in locations]
+    lons = [p[2] for p in locations]
+    with span("advisory_soil"):
+        soils = _soil(lats, lons)
+    with span("advisory_weather"):
+        weathers = _weather(locations, os.getenv("OPENWEATHER_KEY", ""), workers)
+    with span("advisory_risk"):
+        risks = compute_risk_batch(list(zip(lats, lons)), max_concurrency=workers)
+    with span("advisory_crops"):
+        crops = _crops(soils, weathers, model_dir, top_k)
+
+    records = []
+    for (name, lat, lon), soil, weather, (prob, details), crop in zip(locations, soils, weathers, risks, crops):
+        records.append({
+            "name": name, "lat": lat, "lon": lon, "computed_at": now,
+            "soil": soil,
+            "weather": weather,
+            # climatology-only answers (forecast fetch failed) are left to the live path
+            "risk": {"prob": prob, "details": details} if details.get("forecast_days") else None,
+            "crops": crop,
+        })
+    return AdvisoryStore(db_path).put_many(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute advisories for every known location")
+    parser.add_argument("--db", type=str, default=DB_PATH)
+    parser.add_argument("--model_dir", type=str, default="./model_artifacts")
+    parser.add_argument("--points", type=str, default=None, help="Extra CSV of villages (name/village/district, lat, lon)")
+    parser.add_argument("--no_gazetteer", action="store_true", help="Skip the bundled gazetteer places")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    locs = known_locations(points_csv=args.points, gazetteer=not args.no_gazetteer)
+    n = run_job(locs, db_path=args.db, model_dir=args.model_dir, workers=args.workers)
+    print(f"✅ Stored advisories for {n} locations in {args.db} ({time.perf_counter() - t0:.1f}s)")
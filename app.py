@@ -1,10 +1,16 @@
 # app.py
 import streamlit as st
-import pandas as pd
 import numpy as np
 import os
-from utils import load_model_artifacts, fetch_soilgrids  # keep utils.py from earlier
+from utils import fetch_soilgrids_local, fetch_openweather
+from http_client import round_coord, FORECAST_TTL, GEOCODE_TTL
+from model_registry import get_registry
+from post_store import get_store
+from lookup_table import get_lookup_table, FERTILITY_PRESETS
 from app_risk import compute_30day_heavy_rain_probability, get_coords_for_city_openweather
+import advisory
+import telemetry
+from telemetry import span
 
 import os
 import streamlit as st
@@ -17,11 +23,95 @@ else:
 
 
 # ----------------------
-# Load model and metadata
+# Load model and metadata (cached per process; reruns reuse the loaded set).
+# Loaded on first use, so pages that don't predict never touch the model.
 # ----------------------
 MODEL_DIR = "./model_artifacts"
-model, scaler, le, meta = load_model_artifacts(MODEL_DIR)
-FEATURES = meta.get('features', ['N','P','K','temperature','humidity','ph','rainfall'])
+
+@st.cache_resource(show_spinner=False)
+def model_registry():
+    return get_registry(MODEL_DIR)
+
+# ----------------------
+# Cached lookups, shared by all sessions and keyed by a rounded location cell
+# (~1 km, same grid as the HTTP cache). Failed lookups are not cached.
+# Cells covered by the nightly advisory job (advisory.py) are read from its
+# store first; everything else is computed live.
+# ----------------------
+SOIL_TTL = 7 * 24 * 3600
+RISK_TTL = FORECAST_TTL
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+
+class _NotCached(Exception):
+    """Raised from a cached function to hand back a result without caching it."""
+
+
+@st.cache_data(ttl=GEOCODE_TTL, show_spinner=False)
+def _coords_for_city(city, key):
+    lat, lon = get_coords_for_city_openweather(city, key)
+    if lat is None:
+        raise _NotCached((None, None))
+    return lat, lon
+
+def coords_for_city(city):
+    try:
+        return _coords_for_city(city.strip(), os.getenv("OPENWEATHER_KEY", ""))
+    except _NotCached as e:
+        return e.args[0]
+
+def city_error(city, msg):
+    """st.error for an unresolved city, with the gazetteer's near misses as suggestions."""
+    from gazetteer import get_gazetteer
+    near = get_gazetteer().suggest(city)
+    if near:
+        msg += " Did you mean: " + ", ".join(f"{p.name}, {p.state}" if p.state else p.name for p in near) + "?"
+    st.error(msg)
+
+@st.cache_data(ttl=SOIL_TTL, show_spinner=False)
+def _soil_for_cell(lat, lon):
+    return fetch_soilgrids_local(lat, lon)
+
+def soil_at(lat, lon):
+    adv = advisory.lookup(lat, lon)
+    if adv and adv.get('soil'):
+        return adv['soil']
+    return _soil_for_cell(round_coord(lat), round_coord(lon))
+
+@st.cache_data(ttl=FORECAST_TTL, show_spinner=False)
+def _weather_for_cell(lat, lon, key):
+    w = fetch_openweather(lat, lon, key)
+    if w is None:
+        raise _NotCached(None)
+    return w
+
+def weather_at(lat, lon):
+    adv = advisory.lookup(lat, lon)
+    if adv and adv.get('weather'):
+        return adv['weather']
+    key = os.getenv("OPENWEATHER_KEY", "")
+    if not key:
+        return None
+    try:
+        return _weather_for_cell(round_coord(lat), round_coord(lon), key)
+    except _NotCached as e:
+        return e.args[0]
+
+@st.cache_data(ttl=RISK_TTL, show_spinner=False)
+def _rain_risk_for_cell(lat, lon):
+    prob, details = compute_30day_heavy_rain_probability(lat, lon)
+    if not details.get('forecast_days'):
+        raise _NotCached((prob, details))  # climatology-only fallback: try the forecast again next time
+    return prob, details
+
+def rain_risk_at(lat, lon):
+    adv = advisory.lookup(lat, lon)
+    if adv and adv.get('risk'):
+        return adv['risk']['prob'], adv['risk']['details']
+    try:
+        return _rain_risk_for_cell(round_coord(lat), round_coord(lon))
+    except _NotCached as e:
+        return e.args[0]
 
 # ----------------------
 # Language strings (en, hi, ur)
@@ -63,6 +153,13 @@ else:
 
 st.sidebar.markdown("---")
 st.sidebar.info("This demo focuses on Bhopal & nearby languages (Hindi/Urdu).")
+# per-stage timings (rendered at the bottom of the sidebar after the page runs)
+# the checkbox state lives in this session; unchecking stops the spans unless CROP_TIMING keeps them on
+show_timings = st.sidebar.checkbox("Show timing debug panel", value=telemetry.ENABLED_BY_ENV, key="show_timings")
+if show_timings:
+    telemetry.enable()
+elif not telemetry.ENABLED_BY_ENV:
+    telemetry.disable()
 
 # Navigation pages in requested order
 pages = [
@@ -86,14 +183,30 @@ st.write(T('app_sub'))
 # ----------------------
 # PAGE: 1 - Crop Recommendation
 # ----------------------
-# --- inside app.py, replace the Crop Recommendation page code with this function/page ---
+# Split into two fragments: moving the fertility radio or pH slider reruns only
+# the recommendation panel, not the location widgets (and the browser
+# geolocation iframe).
 def page_crop():
-    import json, streamlit as st
     st.header("1. " + T('recommended_crop'))
+    location_panel()
+    loc = st.session_state.get('location')
+    lat, lon = (loc['lat'], loc['lon']) if loc else (None, None)
+    recommend_panel(lat, lon)
+
+
+def _set_location(lat, lon, label):
+    """Remember the location for this session; full rerun only when it actually changed."""
+    new = {'lat': float(lat), 'lon': float(lon), 'label': label}
+    if st.session_state.get('location') != new:
+        st.session_state['location'] = new
+        st.rerun()
 
+
+@fragment
+def location_panel():
+    import json
     # Location: default auto-detect
     auto_loc = st.checkbox("Auto-detect my location (recommended)", value=True)
-    lat = lon = None
     if auto_loc:
         # same JS approach you had earlier - re-use components block from your app
         st.info("Allow browser location permission (if running in a browser).")
@@ -115,86 +228,100 @@ def page_crop():
         geo_raw = st.session_state.get("component_value")
         if geo_raw:
             try:
-                geo = json.loads(geo_raw)
-                lat, lon = geo.get("lat"), geo.get("lon")
-                st.success(f"Location detected: {lat:.3f}, {lon:.3f}")
-            except:
+                with span("geolocation"):
+                    geo = json.loads(geo_raw)
+                _set_location(geo["lat"], geo["lon"], "browser")
+            except (ValueError, KeyError, TypeError):
                 st.warning("Location not available from browser. Use manual mode.")
-    if not lat:
-        city = st.text_input(T('city_label'), value="Bhopal")
-        if st.button("Resolve location"):
-            lat, lon = get_coords_for_city_openweather(city, os.getenv("OPENWEATHER_KEY",""))
-            if not lat:
-                st.error("Could not resolve city. Enter coordinates manually.")
-            else:
-                st.success(f"Resolved {city} -> {lat:.3f}, {lon:.3f}")
 
+    loc = st.session_state.get('location')
+    if loc:
+        st.success(f"Location: {loc['label']} ({loc['lat']:.3f}, {loc['lon']:.3f})")
+        if st.button("Change location"):
+            del st.session_state['location']
+            st.rerun()
+        return
+    city = st.text_input(T('city_label'), value="Bhopal")
+    if st.button("Resolve location"):
+        with span("geolocation"):
+            lat, lon = coords_for_city(city)
+        if lat is None:
+            city_error(city, "Could not resolve city. Enter coordinates manually.")
+        else:
+            _set_location(lat, lon, city)
+
+
+@fragment
+def recommend_panel(lat, lon):
     # Soil & fertility
     st.subheader("Soil and Fertility")
     col1, col2 = st.columns([2,1])
     with col2:
         fertility = st.radio(T('soil_fert'), ["Low", "Medium", "High"])
     with col1:
-        # auto-fetch soil pH if lat/lon available
-        if lat and lon:
-            sg = fetch_soilgrids_local(lat, lon)
-            ph_val = sg.get("phh2o")
-            if ph_val is not None:
-                st.markdown(f"**Auto-detected soil pH:** {ph_val:.2f}")
-            else:
-                ph_val = st.slider(T('ph_label'), 3.0, 9.0, 6.5, step=0.1)
+        # auto-fetch soil pH if lat/lon available (cached per location cell)
+        sg = soil_at(lat, lon) if lat and lon else {}
+        ph_val = sg.get("phh2o")
+        if ph_val is not None:
+            st.markdown(f"**Auto-detected soil pH:** {ph_val:.2f}")
         else:
             ph_val = st.slider(T('ph_label'), 3.0, 9.0, 6.5, step=0.1)
 
-    # map fertility to NPK (same mapping you used)
-    if fertility.startswith("Low"):
-        N,P,K = 20.0, 10.0, 10.0
-    elif fertility.startswith("Medium"):
-        N,P,K = 60.0, 25.0, 25.0
-    else:
-        N,P,K = 90.0, 42.0, 43.0
+    # map fertility to NPK (presets shared with the lookup table)
+    N,P,K = FERTILITY_PRESETS[fertility]
 
-    # fetch weather (OpenWeather) to fill temperature/humidity/rainfall
-    OPENWEATHER_KEY = os.getenv("OPENWEATHER_KEY","")
-    weather = None
-    if lat and lon and OPENWEATHER_KEY:
-        weather = fetch_openweather(lat, lon, OPENWEATHER_KEY)
+    # weather (OpenWeather) fills temperature/humidity/rainfall; cached per cell for FORECAST_TTL
+    weather = weather_at(lat, lon) if lat and lon else None
 
     temp = weather['avg_temp'] if weather and weather.get('avg_temp') is not None else st.number_input("Temperature (°C)", value=25.0)
     hum = weather['avg_humidity'] if weather and weather.get('avg_humidity') is not None else st.slider("Humidity (%)", 10, 100, 60)
     rain7 = weather['next_7d_rainfall_mm'] if weather else 0.0
 
-    # Build model input
-    FEATURES = meta.get('features', ['N','P','K','temperature','humidity','ph','rainfall'])
+    # Build model input (newest artifact set; a retrain picked up mid-session swaps in here)
+    art = model_registry().current()
+    FEATURES = art.features
     values_map = {'N': N, 'P': P, 'K': K, 'temperature': temp, 'humidity': hum, 'ph': ph_val, 'rainfall': rain7}
-    input_df = pd.DataFrame([ {f: values_map.get(f,0.0) for f in FEATURES} ])
+    with span("build_input"):
+        x = np.array([[float(values_map.get(f, 0.0)) for f in FEATURES]])
 
     st.markdown("### Ready to predict")
     if st.button(T('get_advice')):
+        model = art.model
         if model is None:
-            st.error("Model artifact not found. Place `crop_recommender.pkl` in model_artifacts/")
+            st.error("Model artifact not found. Place `model.joblib` in model_artifacts/")
             return
-        # scale -> predict
+        # precomputed grid first; off-grid inputs go to the model
         try:
-            X = scaler.transform(input_df) if scaler else input_df.values
-            probs = model.predict_proba(X)[0]
-            idx = probs.argmax()
-            crop = le.inverse_transform([idx])[0] if le else str(idx)
-            conf = probs[idx]
+            with span("lookup_table"):
+                table = get_lookup_table(MODEL_DIR)
+                grid_idx = table.index(N, P, K, temp, hum, ph_val, rain7) if table is not None else None
+            pre = advisory.precomputed_crop(advisory.lookup(lat, lon) if lat and lon else None,
+                                            fertility, values_map, art.version)
+            if pre is not None:
+                # nightly job already scored these exact inputs for this location
+                crop, conf, factors = pre["crop"], pre["confidence"], [tuple(f) for f in pre["factors"]]
+                grid_idx = None
+            elif grid_idx is not None:
+                crop = str(table.classes[table.crop[grid_idx]])
+                conf = float(table.confidence[grid_idx])
+                factors = None
+            else:
+                # scored + explained together, cached per input row
+                res = art.explain_row(x[0], top_k=1)
+                crop, conf, factors = res["crop"], res["confidence"], res["factors"]
         except Exception as e:
             st.error("Prediction failed: " + str(e))
             return
 
-        # Show result + simple "why" (top features via feature_importances if classifier supports)
+        # Show result + simple "why": the inputs that pushed this prediction toward the crop
         st.success(f"✅ Recommended: {crop}  —  Confidence: {conf*100:.1f}%")
-        # quick explanation: top 3 features using model.feature_importances_ if available
+        st.caption(f"Model version {art.version}")
         try:
-            import numpy as np
-            if hasattr(model, 'feature_importances_'):
-                fi = np.array(model.feature_importances_)
-                topk = fi.argsort()[-3:][::-1]
-                explanations = [f"{FEATURES[i]} (importance {fi[i]:.3f})" for i in topk]
-                st.write("Top factors:", ", ".join(explanations))
+            if factors is None:
+                # table hit: explain the table's crop with the live trees
+                contrib, _ = art.contributions(x, [int(table.crop[grid_idx])])
+                factors = art.factors(contrib[0])
+            st.write("Top factors:", ", ".join(f"{f} ({v:+.2f})" for f, v in factors))
         except Exception:
             pass
 
@@ -210,13 +337,16 @@ def page_weather():
     st.write("Short-term weather (7-day) and basic stats. (Uses OpenWeather / fetch_openweather).")
     city = st.text_input("City for weather", value="Bhopal")
     if st.button("Fetch weather now"):
-        lat, lon = get_coords_for_city_openweather(city, os.getenv("OPENWEATHER_KEY",""))
+        lat, lon = coords_for_city(city)
         if lat is None:
-            st.error("Could not resolve city. Enter API key or use correct city name.")
+            city_error(city, "Could not resolve city. Enter API key or use correct city name.")
             return
-        from utils import fetch_openweather
-        w = fetch_openweather(lat, lon, os.getenv("OPENWEATHER_KEY",""))
-        st.json(w)
+        st.session_state['weather_view'] = {'city': city, 'lat': lat, 'lon': lon}
+    # the last requested city stays on screen across reruns (served from cache)
+    view = st.session_state.get('weather_view')
+    if view:
+        st.caption(f"{view['city']} ({view['lat']:.3f}, {view['lon']:.3f})")
+        st.json(weather_at(view['lat'], view['lon']))
 
 # ----------------------
 # PAGE: 3 - Rainfall Forecast (30d)
@@ -225,8 +355,15 @@ def page_rainfall():
     st.header("3. Rainfall Forecast (30-day risk)")
     city = st.text_input("City for 30-day forecast", value="Bhopal")
     if st.button("Compute 30-day risk"):
-        lat, lon = get_coords_for_city_openweather(city, os.getenv("OPENWEATHER_KEY",""))
-        prob30, details = compute_30day_heavy_rain_probability(lat, lon)
+        lat, lon = coords_for_city(city)
+        if lat is None:
+            city_error(city, "Could not resolve city.")
+            return
+        st.session_state['rain_view'] = {'city': city, 'lat': lat, 'lon': lon}
+    view = st.session_state.get('rain_view')
+    if view:
+        prob30, details = rain_risk_at(view['lat'], view['lon'])
+        st.caption(f"{view['city']} ({view['lat']:.3f}, {view['lon']:.3f})")
         st.metric("Chance ≥1 heavy day (30d)", f"{prob30*100:.1f}%")
         st.json(details)
 
@@ -236,6 +373,7 @@ def page_rainfall():
 def page_mandi():
     st.header("4. Mandi Price (demo)")
     st.write("This page will fetch Agmarknet / local mandi data. For demo we show placeholders.")
+    import pandas as pd
     st.table(pd.DataFrame([{"crop":"Rice","price_rs_qtl":2200}, {"crop":"Wheat","price_rs_qtl":1850}]))
 
 # ----------------------
@@ -243,21 +381,12 @@ def page_mandi():
 # ----------------------
 def page_support():
     st.header("5. Support Desk")
-    st.write("Submit an issue or question. This demo saves to local file `support_messages.json`.")
+    st.write("Submit an issue or question. This demo saves to a local database (`app_data.db`).")
     name = st.text_input("Your name")
     phone = st.text_input("Phone (optional)")
     msg = st.text_area("Message / समस्या विवरण")
     if st.button("Send"):
-        entry = {"name": name, "phone": phone, "message": msg, "city": st.session_state.get('city', 'unknown')}
-        p = "support_messages.json"
-        data = []
-        if os.path.exists(p):
-            try:
-                data = pd.read_json(p).to_dict(orient='records')
-            except:
-                data = []
-        data.append(entry)
-        pd.DataFrame(data).to_json(p, orient='records', indent=2)
+        get_store().add_support_message(name, phone, msg, city=st.session_state.get('city', 'unknown'))
         st.success("Message saved. Local demo only.")
 
 # ----------------------
@@ -265,28 +394,27 @@ def page_support():
 # ----------------------
 def page_community():
     st.header("6. Community Hub")
-    st.write("Farmers can post short messages. This demo stores messages locally (JSON).")
+    st.write("Farmers can post short messages. This demo stores messages locally (SQLite).")
+    store = get_store()
     user = st.text_input("Name")
     post = st.text_input("Post (max 200 chars)")
     if st.button("Post"):
-        msg_file = "community_posts.json"
-        posts = []
-        if os.path.exists(msg_file):
-            try:
-                posts = pd.read_json(msg_file).to_dict(orient='records')
-            except:
-                posts = []
-        posts.insert(0, {"name": user, "post": post})
-        pd.DataFrame(posts).to_json(msg_file, orient='records', indent=2)
+        store.add_post(user, post[:200])
+        st.session_state['community_cursor'] = None
         st.success("Posted (demo).")
-    # Show latest posts
-    if os.path.exists("community_posts.json"):
-        try:
-            posts = pd.read_json("community_posts.json").to_dict(orient='records')
-            for p in posts[:20]:
-                st.write(f"**{p.get('name','')}** — {p.get('post','')}")
-        except:
-            st.info("No posts or reading error.")
+    # Show latest posts, one page at a time
+    posts, next_cursor = store.latest_posts(before_id=st.session_state.get('community_cursor'))
+    if not posts:
+        st.info("No posts yet.")
+    for p in posts:
+        st.write(f"**{p.get('name') or ''}** — {p.get('post') or ''}")
+    col_new, col_old = st.columns(2)
+    if st.session_state.get('community_cursor') is not None and col_new.button("Newest posts"):
+        st.session_state['community_cursor'] = None
+        st.rerun()
+    if next_cursor is not None and col_old.button("Older posts"):
+        st.session_state['community_cursor'] = next_cursor
+        st.rerun()
 
 # ----------------------
 # Page router
@@ -303,3 +431,18 @@ elif page.startswith("5."):
     page_support()
 else:
     page_community()
+
+# ----------------------
+# Sidebar: timing debug panel
+# ----------------------
+if show_timings:
+    with st.sidebar.expander("⏱️ Timings", expanded=True):
+        rows = telemetry.snapshot()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("No spans recorded yet in this process.")
+        st.download_button("Download Prometheus metrics", telemetry.export_prometheus(),
+                           file_name="crop_metrics.prom", mime="text/plain")
+        if st.button("Reset timings"):
+            telemetry.reset()
@@ -1,27 +1,33 @@
 # app_risk.py
-import requests, datetime, math
+import datetime, sqlite3
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from http_client import get_client, FORECAST_TTL, CLIMATOLOGY_TTL
+from series_store import get_series_store, current_issue
+from telemetry import span
+from utils import get_coords_for_city_openweather  # re-exported for app.py
 
-def get_coords_for_city_openweather(city, api_key):
-    try:
-        if not api_key:
-            return None, None
-        url = "http://api.openweathermap.org/geo/1.0/direct"
-        r = requests.get(url, params={'q': city, 'limit':1, 'appid': api_key}, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        if data:
-            return float(data[0]['lat']), float(data[0]['lon'])
-    except:
-        return None, None
+RISK_MAX_CONCURRENCY = 16  # default cap on in-flight requests for compute_risk_batch
+RISK_THRESHOLDS_MM = (25.0, 50.0, 75.0, 100.0)
+RISK_HORIZONS_DAYS = (7, 14, 30, 60)
+DEFAULT_P_DAILY = 0.02  # heavy-day prior when no climatology is available
+OPEN_METEO_MAX_FORECAST_DAYS = 16
+SERIES_DB = "data/series.db"  # local forecast/climatology store (series_store.py); None = always ask the API
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="risk-fetch")
 
-def fetch_open_meteo_daily_precip(lat, lon, days=30, timezone='UTC'):
+def fetch_open_meteo_daily_precip(lat, lon, days=30, timezone='UTC', start_date=None):
+    """Daily forecast [(date, mm), ...] from the API; start_date (ISO) asks for days from there on only."""
     try:
         url = "https://api.open-meteo.com/v1/forecast"
-        params = {'latitude': lat, 'longitude': lon, 'daily':'precipitation_sum', 'forecast_days': int(days), 'timezone': timezone}
-        r = requests.get(url, params=params, timeout=12)
-        r.raise_for_status()
-        data = r.json()
+        # the API rejects forecast_days above 16; the rest comes from climatology
+        days = min(int(days), OPEN_METEO_MAX_FORECAST_DAYS)
+        params = {'latitude': lat, 'longitude': lon, 'daily':'precipitation_sum', 'timezone': timezone}
+        if start_date is None:
+            params['forecast_days'] = days
+        else:
+            end = datetime.date.fromisoformat(start_date) + datetime.timedelta(days=days - 1)
+            params['start_date'], params['end_date'] = start_date, end.isoformat()
+        data = get_client().get_json(url, params=params, ttl=FORECAST_TTL, timeout=12)
         daily = data.get('daily', {})
         times = daily.get('time', [])
         precs = daily.get('precipitation_sum', [])
@@ -33,9 +39,7 @@ def fetch_open_meteo_monthly_climatology(lat, lon):
     try:
         url = "https://climate-api.open-meteo.com/v1/climate"
         params = {'latitude': lat, 'longitude': lon, 'start_year':1991, 'end_year':2020, 'monthly':'precipitation_sum'}
-        r = requests.get(url, params=params, timeout=12)
-        r.raise_for_status()
-        data = r.json()
+        data = get_client().get_json(url, params=params, ttl=CLIMATOLOGY_TTL, timeout=12)
         monthly = data.get('monthly', {})
         precip = monthly.get('precipitation_sum', [])
         if precip and len(precip) >= 12:
@@ -43,37 +47,166 @@ def fetch_open_meteo_monthly_climatology(lat, lon):
     except:
         return {}
 
-def compute_30day_heavy_rain_probability(lat, lon, heavy_threshold_mm=50.0, prefer_open_meteo=True):
-    days_needed = 30
-    forecast_days = fetch_open_meteo_daily_precip(lat, lon, days=days_needed) if prefer_open_meteo else []
+def _utc_today():
+    # forecasts are requested with timezone=UTC, so "today" is the UTC date everywhere here
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+# --- reads through the local series store ---
+def _series_store():
+    if not SERIES_DB:
+        return None
+    try:
+        return get_series_store(SERIES_DB)
+    except sqlite3.Error:
+        return None
+
+def daily_precip(lat, lon, days=30):
+    """
+    Forecast [(date, mm), ...] from today (UTC). Days already stored for the
+    current forecast issue come from the series store; only the missing tail
+    is fetched, then stored.
+    """
+    n = min(int(days), OPEN_METEO_MAX_FORECAST_DAYS)
+    store = _series_store()
+    if store is None:
+        return fetch_open_meteo_daily_precip(lat, lon, days=n)
+    today = _utc_today()
+    wanted = [(today + datetime.timedelta(days=i)).isoformat() for i in range(n)]
+    issued = current_issue()
+    try:
+        have = store.get_forecast(lat, lon, issued, wanted)
+    except sqlite3.Error:
+        have = []
+    if len(have) >= n:
+        return have
+    missing = wanted[len(have):]
+    fetched = fetch_open_meteo_daily_precip(lat, lon, days=len(missing), start_date=missing[0] if have else None)
+    missing_set = set(missing)
+    fetched = [(d, p) for d, p in fetched if d in missing_set]
+    if fetched:
+        try:
+            store.put_forecast(lat, lon, issued, fetched)
+        except sqlite3.Error:
+            pass
+    return have + fetched
+
+def monthly_climatology(lat, lon):
+    """{month: mm} normals for the cell; fetched once, then always served from the series store."""
+    store = _series_store()
+    if store is not None:
+        try:
+            stored = store.get_climatology(lat, lon)
+        except sqlite3.Error:
+            stored = None
+        if stored:
+            return stored
+    monthly = fetch_open_meteo_monthly_climatology(lat, lon)
+    if monthly and store is not None:
+        try:
+            store.put_climatology(lat, lon, monthly)
+        except sqlite3.Error:
+            pass
+    return monthly
+
+def _daily_heavy_probs(forecasts, monthlies, thresholds, n_days, start=None):
+    """
+    Per-day probability of a heavy day, shape (n_locations, n_thresholds, n_days).
+    Forecast days are 0/1 (heavy or not); later days use the climatological
+    p = exp(-threshold / daily_mean), with daily_mean from the real month length.
+    Day 0 is start (default: today UTC, the first day daily_precip returns).
+    """
+    thr = np.asarray(thresholds, dtype=float)
+    n_loc = len(forecasts)
+    start = np.datetime64(start or _utc_today(), 'D')
+    dates = start + np.arange(n_days)
+    month_start = dates.astype('datetime64[M]')
+    month_idx = month_start.astype(int) % 12
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(float)
+
+    clim = np.full((n_loc, 12), np.nan)
+    for i, monthly in enumerate(monthlies):
+        if monthly:
+            clim[i] = [monthly.get(m + 1) or 0.0 for m in range(12)]
+    daily_mean = clim[:, month_idx] / days_in_month                        # (L, D)
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        p_clim = np.exp(-thr[None, :, None] / (daily_mean[:, None, :] + 1e-6))
+    p_clim = np.where(daily_mean[:, None, :] > 0, p_clim, 0.0)
+    p_clim = np.where(np.isnan(daily_mean)[:, None, :], DEFAULT_P_DAILY, p_clim)
+
+    fc = np.full((n_loc, n_days), np.nan)
+    for i, forecast in enumerate(forecasts):
+        vals = [p if p is not None else 0.0 for _, p in forecast[:n_days]]
+        fc[i, :len(vals)] = vals
+    known = ~np.isnan(fc)[:, None, :]
+    with np.errstate(invalid='ignore'):
+        heavy = (fc[:, None, :] >= thr[None, :, None]).astype(float)
+    return np.where(known, heavy, p_clim)
+
+def heavy_rain_risk_surface(forecasts, monthlies, thresholds=RISK_THRESHOLDS_MM, horizons=RISK_HORIZONS_DAYS, start=None):
+    """
+    P(at least one day with rain >= threshold within the next horizon days) for
+    every location x threshold x horizon in one pass.
+    forecasts: per location [(date, mm), ...] starting today; monthlies: per
+    location {month: mm} ({} falls back to a flat 2%/day).
+    Returns an array of shape (n_locations, n_thresholds, n_horizons).
+    """
+    hor = np.asarray(horizons, dtype=int)
+    p = _daily_heavy_probs(forecasts, monthlies, thresholds, int(hor.max()), start)
+    with np.errstate(divide='ignore'):
+        log_none = np.cumsum(np.log1p(-p), axis=-1)  # log P(no heavy day through day d)
+    return 1.0 - np.exp(log_none[..., hor - 1])
+
+def heavy_rain_risk_from_series(forecast_days, monthly, heavy_threshold_mm=50.0, days_needed=30):
+    """Combine a daily forecast [(date, mm), ...] and monthly climatology {month: mm} into (prob, details)."""
     forecast_count = len(forecast_days)
-    forecast_heavy = sum(1 for _,p in forecast_days if p is not None and p >= heavy_threshold_mm)
+    forecast_heavy = sum(1 for _,p in forecast_days[:days_needed] if p is not None and p >= heavy_threshold_mm)
+    p = _daily_heavy_probs([forecast_days], [monthly], [heavy_threshold_mm], days_needed)[0, 0]
+    with np.errstate(divide='ignore'):
+        prob = float(1.0 - np.exp(np.log1p(-p).sum())) if days_needed > 0 else 0.0
     if forecast_count >= days_needed:
-        prob_forecast = 1.0 if forecast_heavy>0 else 0.0
-        return prob_forecast, {'forecast_days':forecast_count, 'forecast_heavy_days':forecast_heavy}
-    remaining_days = max(0, days_needed - forecast_count)
-    monthly = fetch_open_meteo_monthly_climatology(lat, lon)
-    if not monthly:
-        p_daily = 0.02
-    else:
-        today = datetime.date.today()
-        p_vals = []
-        for i in range(remaining_days):
-            day = today + datetime.timedelta(days=forecast_count + i)
-            month = day.month
-            monthly_mm = monthly.get(month, 0.0)
-            days_in_month = 30.0
-            daily_mean = monthly_mm / max(1, days_in_month)
-            if daily_mean <= 0:
-                p = 0.0
-            else:
-                p = math.exp(-heavy_threshold_mm / (daily_mean + 1e-6))
-                p = min(1.0, max(0.0,p))
-            p_vals.append(p)
-        p_daily = float(np.mean(p_vals)) if p_vals else 0.02
-    p_no_heavy_remaining = (1.0 - p_daily) ** remaining_days if remaining_days>0 else 1.0
-    prob_remain_at_least_one = 1.0 - p_no_heavy_remaining
-    prob_forecast = 1.0 if forecast_heavy>0 else 0.0
-    combined = 1.0 - (1.0 - prob_forecast) * (1.0 - prob_remain_at_least_one)
+        return prob, {'forecast_days':forecast_count, 'forecast_heavy_days':forecast_heavy}
+    remaining_days = days_needed - forecast_count
+    p_daily = float(p[forecast_count:].mean())
     details = {'forecast_days':forecast_count, 'forecast_heavy_days':forecast_heavy, 'remaining_days':remaining_days, 'p_daily_est':p_daily}
-    return combined, details
+    return prob, details
+
+def compute_30day_heavy_rain_probability(lat, lon, heavy_threshold_mm=50.0, prefer_open_meteo=True):
+    days_needed = 30
+    # forecast and climatology are independent; fetch them side by side
+    with span("rain_risk_fetch"):
+        fut_forecast = _fetch_pool.submit(daily_precip, lat, lon, days=days_needed) if prefer_open_meteo else None
+        fut_monthly = _fetch_pool.submit(monthly_climatology, lat, lon)
+        forecast_days = fut_forecast.result() if fut_forecast else []
+        monthly = fut_monthly.result()
+    with span("rain_risk_model"):
+        return heavy_rain_risk_from_series(forecast_days, monthly, heavy_threshold_mm, days_needed)
+
+def _fetch_series_many(points, days, max_concurrency):
+    """Fetch (forecast, climatology) for every (lat, lon) with a bounded pool."""
+    with ThreadPoolExecutor(max_workers=max(1, int(max_concurrency))) as pool:
+        forecasts = [pool.submit(daily_precip, lat, lon, days=days) for lat, lon in points]
+        monthlies = [pool.submit(monthly_climatology, lat, lon) for lat, lon in points]
+        return [f.result() for f in forecasts], [m.result() for m in monthlies]
+
+def _as_points(locations):
+    return [(loc['lat'], loc['lon']) if isinstance(loc, dict) else tuple(loc) for loc in locations]
+
+def compute_risk_batch(locations, heavy_threshold_mm=50.0, max_concurrency=RISK_MAX_CONCURRENCY):
+    """
+    Score many points at once. locations is an iterable of (lat, lon) pairs or
+    dicts with 'lat'/'lon'; returns [(prob, details), ...] in the same order.
+    At most max_concurrency HTTP requests are in flight at any time.
+    """
+    days_needed = 30
+    with span("rain_risk_fetch_batch"):
+        forecasts, monthlies = _fetch_series_many(_as_points(locations), days_needed, max_concurrency)
+    return [heavy_rain_risk_from_series(f, m, heavy_threshold_mm, days_needed)
+            for f, m in zip(forecasts, monthlies)]
+
+def compute_risk_surface(locations, thresholds=RISK_THRESHOLDS_MM, horizons=RISK_HORIZONS_DAYS,
+                         max_concurrency=RISK_MAX_CONCURRENCY):
+    """Fetch every location concurrently and return heavy_rain_risk_surface() for them."""
+    with span("rain_risk_fetch_batch"):
+        forecasts, monthlies = _fetch_series_many(_as_points(locations), max(horizons), max_concurrency)
+    with span("rain_risk_surface"):
+        return heavy_rain_risk_surface(forecasts, monthlies, thresholds, horizons)
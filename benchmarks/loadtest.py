@@ -0,0 +1,257 @@
+"""
+benchmarks/loadtest.py
+- Simulates N concurrent farmers going through the app's flows, each user a
+  thread in one process (the way Streamlit serves sessions):
+    crop:     resolve place -> soil -> weather -> recommendation (page_crop)
+    rainfall: resolve place -> 30-day heavy-rain risk (page_rainfall)
+  It calls the same functions the pages do, minus the Streamlit widget layer
+  and its st.cache_data wrappers. The HTTP client's cache and the series store
+  stay in the path.
+- Weather, geocoding and soil come from providers.ReplayClient / ReplaySoil:
+  a recorded cassette if given, synthetic answers otherwise, with configurable
+  latency and injected failures. Runs fully offline.
+- Reports throughput, p50/p95/p99 latency, errors (the flow raised) and
+  degraded answers (a source failed and the flow fell back to defaults), per
+  flow. It also reports HTTP client stats and the slowest telemetry stages.
+
+    python benchmarks/loadtest.py --users 16 --duration 30
+    python benchmarks/loadtest.py --users 32 --requests 2000 --latency_ms 120 --jitter_ms 80 --error_rate 0.02
+    python benchmarks/loadtest.py --cassette data/cassette.jsonl --flow rainfall
+    OPENWEATHER_KEY=... python benchmarks/loadtest.py --record data/cassette.jsonl --users 1 --requests 50   # live, needs network
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import numpy as np
+
+import telemetry
+from providers import Cassette, Latency, ReplayClient, ReplaySoil, RecordingClient, RecordingSoil, installed
+
+FLOWS = ("crop", "rainfall")
+PLACE_JITTER_DEG = 0.15  # farms scattered ~15 km around each town
+REPLAY_KEY = "replay"    # stands in for OPENWEATHER_KEY when replaying
+
+
+# -------------------------------
+# Flows (what page_crop / page_rainfall run per request)
+# -------------------------------
+def crop_flow(city, lat, lon, fertility, key, model_dir):
+    """Returns True when the answer used every source, False when something fell back to defaults."""
+    import advisory
+    from app_risk import get_coords_for_city_openweather
+    from lookup_table import get_lookup_table
+    from model_registry import get_registry
+    from utils import fetch_soilgrids_local, fetch_openweather
+
+    if get_coords_for_city_openweather(city, key)[0] is None:
+        return False
+    adv = advisory.lookup(lat, lon)
+    soil = (adv or {}).get("soil") or fetch_soilgrids_local(lat, lon)
+    weather = (adv or {}).get("weather") or fetch_openweather(lat, lon, key)
+    values = advisory.crop_inputs(fertility, soil, weather)
+    art = get_registry(model_dir).current()
+    if advisory.precomputed_crop(adv, fertility, values, art.version) is None:
+        table = get_lookup_table(model_dir)
+        idx = table.index(*(values[f] for f in ("N", "P", "K", "temperature", "humidity", "ph", "rainfall"))) \
+            if table is not None else None
+        if idx is None:
+            art.explain_row([float(values.get(f, 0.0)) for f in art.features], top_k=1)
+    return soil.get("phh2o") is not None and weather is not None
+
+
+def rainfall_flow(city, lat, lon, fertility, key, model_dir):
+    import advisory
+    from app_risk import get_coords_for_city_openweather, compute_30day_heavy_rain_probability
+    if get_coords_for_city_openweather(city, key)[0] is None:
+        return False
+    adv = advisory.lookup(lat, lon)
+    if adv and adv.get("risk"):
+        return True
+    _, details = compute_30day_heavy_rain_probability(lat, lon)
+    return bool(details.get("forecast_days"))
+
+
+FLOW_FNS = {"crop": crop_flow, "rainfall": rainfall_flow}
+
+
+# -------------------------------
+# Driver
+# -------------------------------
+def _places(limit=None):
+    from gazetteer import get_gazetteer
+    places = [p for p in get_gazetteer().places if p.source == "bundled"]
+    return places[:limit] if limit else places
+
+
+def run(users, flows, duration=None, requests=None, key=REPLAY_KEY, model_dir="./model_artifacts",
+        think_ms=0.0, seed=0):
+    """
+    Closed loop: each user thread runs a flow, waits think_ms, repeats until
+    duration seconds have passed or requests flows have run in total.
+    flows is {flow: weight}. Returns (samples, wall seconds, {exception name: count})
+    where samples are (flow, seconds, status), status "ok", "degraded" or "error".
+    """
+    from lookup_table import FERTILITY_PRESETS
+    places = _places()
+    names, weights = zip(*flows.items())
+    presets = list(FERTILITY_PRESETS)
+    samples, errors = [], {}
+    lock = threading.Lock()
+    budget = [requests if requests is not None else float("inf")]
+    deadline = time.perf_counter() + duration if duration else None
+    start = threading.Barrier(users + 1)
+
+    def take():
+        with lock:
+            if budget[0] <= 0:
+                return False
+            budget[0] -= 1
+            return True
+
+    def user(i):
+        rng = random.Random(seed * 1000 + i)
+        start.wait()
+        while (deadline is None or time.perf_counter() < deadline) and take():
+            flow = rng.choices(names, weights)[0]
+            place = rng.choice(places)
+            lat = place.lat + rng.uniform(-PLACE_JITTER_DEG, PLACE_JITTER_DEG)
+            lon = place.lon + rng.uniform(-PLACE_JITTER_DEG, PLACE_JITTER_DEG)
+            t0 = time.perf_counter()
+            try:
+                status = "ok" if FLOW_FNS[flow](place.name, lat, lon, rng.choice(presets), key, model_dir) else "degraded"
+            except Exception as e:
+                status = "error"
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            elapsed = time.perf_counter() - t0
+            with lock:
+                samples.append((flow, elapsed, status))
+            if think_ms:
+                time.sleep(think_ms / 1000.0)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - t0, errors
+
+
+def summarize(samples, wall):
+    """{flow: {requests, errors, degraded, error_rate, rps, p50_ms, p95_ms, p99_ms, max_ms}} plus "all"."""
+    out = {}
+    for flow in sorted({s[0] for s in samples}) + ["all"]:
+        rows = [s for s in samples if flow == "all" or s[0] == flow]
+        ms = np.array([s[1] for s in rows]) * 1000.0
+        n = len(rows)
+        n_err = sum(1 for s in rows if s[2] == "error")
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if n else (0.0, 0.0, 0.0)
+        out[flow] = {"requests": n, "errors": n_err, "degraded": sum(1 for s in rows if s[2] == "degraded"),
+                     "error_rate": n_err / n if n else 0.0, "rps": n / wall if wall else 0.0,
+                     "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                     "max_ms": float(ms.max()) if n else 0.0}
+    return out
+
+
+def report(summary, wall, client_stats, errors, stages, title):
+    print(f"\n=== {title} ({wall:.1f}s) ===")
+    print(f"{'flow':10} {'requests':>9} {'errors':>7} {'degraded':>9} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for flow, r in summary.items():
+        print(f"{flow:10} {r['requests']:9d} {r['errors']:7d} {r['degraded']:9d} {r['rps']:8.1f} "
+              f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['max_ms']:8.1f}")
+    if errors:
+        print("Errors: " + ", ".join(f"{k} x{v}" for k, v in sorted(errors.items(), key=lambda kv: -kv[1])))
+    print("HTTP client: " + ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                                      for k, v in client_stats.items()))
+    if stages:
+        print("Busiest stages (telemetry, bucketed):")
+        for s in stages[:8]:
+            print(f"  {s['metric']:5} {s['label']:22} n={s['count']:<7d} mean {s['mean_ms']:8.2f} ms  "
+                  f"p95 <= {s['p95_ms'] if s['p95_ms'] is not None else 'inf'} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test of the crop / rainfall flows")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run (default 20 unless --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many flows in total")
+    parser.add_argument("--flow", choices=FLOWS + ("mixed",), default="mixed")
+    parser.add_argument("--crop_share", type=float, default=0.7, help="Share of crop flows in --flow mixed")
+    parser.add_argument("--think_ms", type=float, default=0.0, help="Pause between a user's requests")
+    parser.add_argument("--cassette", type=str, default=None, help="Replay recorded responses from this JSONL file")
+    parser.add_argument("--strict", action="store_true", help="Fail requests the cassette can't answer instead of synthesizing")
+    parser.add_argument("--latency_ms", type=float, default=50.0, help="Base latency per replayed HTTP call")
+    parser.add_argument("--jitter_ms", type=float, default=30.0, help="Mean of the exponential latency tail")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of replayed HTTP calls that fail")
+    parser.add_argument("--soil_ms", type=float, default=0.0, help="Latency per soil lookup")
+    parser.add_argument("--record", type=str, default=None, help="Hit the live APIs and append responses to this cassette")
+    parser.add_argument("--series_db", type=str, default=None, help="Series store to use (default: a fresh temp file)")
+    parser.add_argument("--model_dir", type=str, default=os.path.join(REPO, "model_artifacts"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Also write the results here")
+    args = parser.parse_args(argv)
+
+    for name in ("cassette", "record", "series_db", "model_dir", "json"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    os.chdir(REPO)  # the gazetteer, soil and advisory paths are repo-relative, as in the app
+
+    import app_risk
+    tmp = tempfile.TemporaryDirectory()
+    app_risk.SERIES_DB = args.series_db or os.path.join(tmp.name, "series.db")
+
+    if args.flow == "mixed":
+        flows = {"crop": args.crop_share, "rainfall": 1.0 - args.crop_share}
+    else:
+        flows = {args.flow: 1.0}
+    if args.duration is None and args.requests is None:
+        args.duration = 20.0
+
+    if args.record:
+        key = os.getenv("OPENWEATHER_KEY", "")
+        tape = Cassette(args.record)
+        client, soil = RecordingClient(tape), RecordingSoil(tape)
+        title = f"record -> {args.record}, {args.users} users"
+    else:
+        key = REPLAY_KEY
+        tape = Cassette.load(args.cassette) if args.cassette else None
+        client = ReplayClient(tape, Latency(args.latency_ms, args.jitter_ms, args.error_rate, seed=args.seed),
+                              synthetic=not args.strict)
+        soil = ReplaySoil(tape, Latency(args.soil_ms, seed=args.seed) if args.soil_ms else None,
+                          synthetic=not args.strict)
+        source = f"cassette {args.cassette} ({len(tape)} records)" if tape is not None else "synthetic"
+        title = (f"{args.users} users, {source}, {args.latency_ms:.0f}+~{args.jitter_ms:.0f} ms, "
+                 f"{args.error_rate:.1%} injected errors")
+
+    from model_registry import get_registry
+    get_registry(args.model_dir).current()  # load once up front, like a warm server
+    telemetry.enable()
+    telemetry.reset()
+    with installed(client, soil):
+        samples, wall, errors = run(args.users, flows, duration=args.duration, requests=args.requests, key=key,
+                                    model_dir=args.model_dir, think_ms=args.think_ms, seed=args.seed)
+    summary = summarize(samples, wall)
+    stages = telemetry.snapshot()
+    report(summary, wall, client.stats(), errors, stages, title)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"title": title, "wall_s": wall, "flows": summary, "errors": errors,
+                       "http": client.stats(), "stages": stages}, f, indent=2)
+    tmp.cleanup()
+    return 1 if not samples else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""
+benchmarks/run_benchmarks.py
+- Times the hot paths: train_model, artifact cold load, predict_crop (single row
+  and batch), end-to-end CSV scoring (score_file in one process and one
+  process per core on shards), fetch_soilgrids_local (grid and raster
+  fallback, on synthetic GeoTIFFs written to the temp dir), the 30-day rain risk
+  (HTTP stubbed with canned Open-Meteo responses, with and without the local
+  series store), synthesize_to_file() throughput and bulk spatial-prior interpolation.
+- Runs offline on CPU only: the model is trained into a temp dir first.
+- Compares every result with benchmarks/baselines.json and exits 1 when one
+  regresses past its threshold.
+
+    python benchmarks/run_benchmarks.py                    # run + compare
+    python benchmarks/run_benchmarks.py --save-baseline    # run + overwrite baselines
+    python benchmarks/run_benchmarks.py --only predict_single soil_lookup --threshold 0.5
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import datetime
+import contextlib
+import statistics
+from urllib.parse import urlparse, parse_qs
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, "data_builders"))
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter
+
+BASELINE_PATH = os.path.join(REPO, "benchmarks", "baselines.json")
+DEFAULT_THRESHOLD = 0.25  # allowed relative slowdown before a result counts as a regression
+DATA_CSV = os.path.join(REPO, "Crop_recommendation.csv")
+
+
+def timeit(fn, repeat, warmup=1):
+    """Median and p95 wall time of fn() in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# -------------------------------
+# Stubbed Open-Meteo transport
+# -------------------------------
+class OpenMeteoStubAdapter(BaseAdapter):
+    """
+    requests transport that answers Open-Meteo forecast/climate URLs with canned
+    JSON. Forecast days start today (UTC) and follow forecast_days or
+    start_date/end_date like the real API.
+    """
+
+    PRECIP = [0.0, 3.2, 12.5, 55.0, 8.1, 0.0, 0.0, 1.2, 22.0, 0.0, 0.4, 0.0, 14.0, 9.9, 0.0, 2.0]
+    CLIMATE = {"monthly": {"precipitation_sum": [12, 8, 6, 3, 10, 140, 360, 310, 190, 40, 12, 6]}}
+
+    def forecast(self, url):
+        q = {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if "start_date" in q:
+            first = (datetime.date.fromisoformat(q["start_date"]) - today).days
+            last = (datetime.date.fromisoformat(q["end_date"]) - today).days
+        else:
+            first, last = 0, int(q.get("forecast_days", 7)) - 1
+        days = range(max(first, 0), min(last, len(self.PRECIP) - 1) + 1)
+        return {"daily": {"time": [(today + datetime.timedelta(days=i)).isoformat() for i in days],
+                          "precipitation_sum": [self.PRECIP[i] for i in days]}}
+
+    def send(self, request, **kwargs):
+        body = self.CLIMATE if "climate" in request.url else self.forecast(request.url)
+        r = requests.Response()
+        r.status_code = 200
+        r._content = json.dumps(body).encode()
+        r.headers["Content-Type"] = "application/json"
+        r.url = request.url
+        r.request = request
+        return r
+
+    def close(self):
+        pass
+
+
+# -------------------------------
+# Benchmarks: each returns {name: (value, unit, higher_is_better)}
+# -------------------------------
+def bench_train(ctx):
+    from training import train_model
+    t0 = time.perf_counter()
+    with quiet():
+        train_model(DATA_CSV, ctx["model_dir"])
+    return {"train_model_s": (time.perf_counter() - t0, "s", False)}
+
+
+def bench_cold_load(ctx):
+    from model_registry import load_artifact_set
+    med, p95 = timeit(lambda: load_artifact_set(ctx["model_dir"]), repeat=5)
+    return {"load_artifacts_cold_ms": (med, "ms", False)}
+
+
+def bench_predict_single(ctx):
+    import predict
+    from model_registry import get_registry
+    predict.registry = get_registry(ctx["model_dir"])
+    rows = pd.read_csv(DATA_CSV).iloc[:200, :7].to_numpy(float)
+    it = iter(np.tile(rows, (50, 1)))
+    med, p95 = timeit(lambda: predict.predict_crop(*next(it)), repeat=2000, warmup=20)
+    return {"predict_single_ms_p50": (med, "ms", False), "predict_single_ms_p95": (p95, "ms", False)}
+
+
+def bench_predict_batch(ctx):
+    import predict
+    from model_registry import get_registry
+    predict.registry = get_registry(ctx["model_dir"])
+    df = pd.read_csv(DATA_CSV)
+    big = pd.concat([df] * 20, ignore_index=True)  # 44k rows
+    med, _ = timeit(lambda: predict.predict_batch(big, explain=False), repeat=3)
+    return {"predict_batch_rows_per_s": (len(big) / (med / 1000.0), "rows/s", True)}
+
+
+def _score_shard(model_dir, in_path, out_path):
+    import predict
+    from model_registry import get_registry
+    predict.registry = get_registry(model_dir)
+    return predict.score_file(in_path, out_path, explain=False)
+
+
+def bench_score_file(ctx):
+    """
+    Rows/s of score_file on a CSV, in one process and split into one shard per
+    core (model load included). The second only beats the first on multi-core
+    machines; compare them before promising a bulk-scoring rate.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    df = pd.concat([pd.read_csv(DATA_CSV)] * 40, ignore_index=True)  # 88k rows
+    procs = os.cpu_count() or 1
+    shards = []
+    for i, part in enumerate(np.array_split(np.arange(len(df)), procs)):
+        path = os.path.join(ctx["tmp"], f"score_in_{i}.csv")
+        df.iloc[part].to_csv(path, index=False)
+        shards.append((ctx["model_dir"], path, os.path.join(ctx["tmp"], f"score_out_{i}.csv")))
+    single = os.path.join(ctx["tmp"], "score_in.csv")
+    df.to_csv(single, index=False)
+
+    t0 = time.perf_counter()
+    with quiet():
+        n = _score_shard(ctx["model_dir"], single, os.path.join(ctx["tmp"], "score_out.csv"))
+    one = n / (time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(procs) as pool:
+        n = sum(pool.map(_score_shard, *zip(*shards)))
+    many = n / (time.perf_counter() - t0)
+    return {"score_file_rows_per_s": (one, "rows/s", True),
+            "score_file_rows_per_s_all_cores": (many, "rows/s", True)}
+
+
+def write_synthetic_rasters(out_dir, size=1200, res=0.0025, west=76.0, north=25.0, seed=0):
+    """
+    GeoTIFFs shaped like the SoilGrids downloads (one band, EPSG:4326, a nodata
+    value and some nodata holes) around Bhopal, for utils.RASTER_FILES.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+    rng = np.random.default_rng(seed)
+    transform = from_origin(west, north, res, res)
+    files = {}
+    for layer, (lo, hi) in {"phh2o": (55, 82), "soc": (40, 250), "clay": (120, 480)}.items():
+        band = rng.uniform(lo, hi, (size, size)).astype(np.int16)
+        band[rng.random((size, size)) < 0.02] = -32768
+        path = os.path.join(out_dir, f"{layer}_0-5cm.tif")
+        with rasterio.open(path, "w", driver="GTiff", height=size, width=size, count=1, dtype="int16",
+                           crs="EPSG:4326", transform=transform, nodata=-32768, tiled=True) as dst:
+            dst.write(band, 1)
+        files[layer] = path
+    return files
+
+
+def bench_soil_lookup(ctx):
+    """
+    Point soil lookups against synthetic rasters (the bundled .tifs are not
+    readable GeoTIFFs): the stacked grid, and the per-pixel raster fallback.
+    """
+    import utils
+    from soil_grid import build_soil_grid
+    src = os.path.join(ctx["tmp"], "soil")
+    os.makedirs(src, exist_ok=True)
+    files = write_synthetic_rasters(src)
+    build_soil_grid(files, out_dir=src)
+    pts = [(23.25 + 0.01 * i, 77.40 + 0.01 * i) for i in range(20)]
+    prev = utils.RASTER_FILES, utils.SOIL_GRID_DIR
+    try:
+        utils.RASTER_FILES = files
+        utils.SOIL_GRID_DIR = src
+        if any(v is None for la, lo in pts for v in utils.fetch_soilgrids_local(la, lo).values()):
+            raise RuntimeError("synthetic soil grid lookup returned no data")
+        it = iter(pts * 10)
+        med, _ = timeit(lambda: utils.fetch_soilgrids_local(*next(it)), repeat=150, warmup=5)
+        if any(v is None for v in utils._read_soil_rasters(*pts[0]).values()):
+            raise RuntimeError("synthetic raster read returned no data")
+        it = iter(pts * 3)
+        med_raster, _ = timeit(lambda: utils._read_soil_rasters(*next(it)), repeat=50, warmup=5)
+    finally:
+        utils.RASTER_FILES, utils.SOIL_GRID_DIR = prev
+    return {"soil_lookup_ms": (med, "ms", False), "soil_lookup_raster_ms": (med_raster, "ms", False)}
+
+
+def bench_rain_risk(ctx):
+    import app_risk
+    client = app_risk.get_client()
+    adapter = OpenMeteoStubAdapter()
+    client.session.mount("https://api.open-meteo.com", adapter)
+    client.session.mount("https://climate-api.open-meteo.com", adapter)
+    app_risk.SERIES_DB = os.path.join(ctx["tmp"], "series.db")
+    store = app_risk.get_series_store(app_risk.SERIES_DB)
+
+    def cold():
+        client.clear()
+        store.clear()
+        app_risk.compute_30day_heavy_rain_probability(23.25, 77.41)
+
+    def from_store():
+        client.clear()  # series already stored: no HTTP at all
+        app_risk.compute_30day_heavy_rain_probability(23.25, 77.41)
+
+    med_cold, _ = timeit(cold, repeat=100, warmup=5)
+    med_store, _ = timeit(from_store, repeat=200, warmup=5)
+    med_warm, _ = timeit(lambda: app_risk.compute_30day_heavy_rain_probability(23.25, 77.41), repeat=500, warmup=5)
+    return {"rain_risk_stubbed_http_ms": (med_cold, "ms", False), "rain_risk_series_store_ms": (med_store, "ms", False),
+            "rain_risk_cached_ms": (med_warm, "ms", False)}
+
+
+def bench_synthesize(ctx):
+    from synthesize_local_dataset import synthesize_to_file, load_kaggle
+    kag = load_kaggle(DATA_CSV)
+    cs = pd.DataFrame({"district": ["Bhopal", "Sehore", "Raisen"], "lat": [23.26, 23.11, 23.27],
+                       "lon": [77.40, 77.07, 78.17], "t2m_mean": [25.1, 25.4, 26.0],
+                       "annual_precip_mean": [1100.0, 1050.0, 1200.0], "soil_ph_prior": [7.1, 7.0, 6.8]})
+    out = os.path.join(ctx["tmp"], "synth.csv")
+    n = 200_000
+    with quiet(), contextlib.redirect_stderr(io.StringIO()):
+        med, _ = timeit(lambda: synthesize_to_file(kag, cs, cs["district"].tolist(), out, size=n, seed=0), repeat=3)
+    return {"synthesize_rows_per_s": (n / (med / 1000.0), "rows/s", True)}
+
+
+def bench_spatial_priors(ctx):
+    from spatial_priors import SpatialPriors
+    rng = np.random.default_rng(0)
+    n_samples, n_query = 20_000, 1_000_000
+    lats, lons = rng.uniform(8, 35, n_samples), rng.uniform(68, 97, n_samples)
+    priors = SpatialPriors(lats, lons, {"t2m_mean": 30 - 0.5 * (lats - 8), "soil_ph_prior": 6 + 0.05 * (lons - 68)})
+    qlat, qlon = rng.uniform(8, 35, n_query), rng.uniform(68, 97, n_query)
+    med, _ = timeit(lambda: priors.query(qlat, qlon), repeat=3)
+    return {"spatial_priors_points_per_s": (n_query / (med / 1000.0), "points/s", True)}
+
+
+BENCHMARKS = {
+    "train": bench_train,  # must run first: the others use its artifacts
+    "cold_load": bench_cold_load,
+    "predict_single": bench_predict_single,
+    "predict_batch": bench_predict_batch,
+    "score_file": bench_score_file,
+    "soil_lookup": bench_soil_lookup,
+    "rain_risk": bench_rain_risk,
+    "synthesize": bench_synthesize,
+    "spatial_priors": bench_spatial_priors,
+}
+
+
+def compare(results, baseline, threshold, overrides):
+    """Return a list of (metric, baseline, new, change, regressed)."""
+    rows = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, None, res["value"], None, False))
+            continue
+        change = (res["value"] - base["value"]) / base["value"] if base["value"] else 0.0
+        worse = -change if res["higher_is_better"] else change
+        limit = overrides.get(name, threshold)
+        rows.append((name, base["value"], res["value"], change, worse > limit))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crop recommendation hot paths")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="Run a subset (train always runs if no model dir)")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"Allowed relative regression (default: baseline file's value or {DEFAULT_THRESHOLD})")
+    parser.add_argument("--model_dir", type=str, default=None, help="Reuse trained artifacts instead of training")
+    args = parser.parse_args()
+
+    os.chdir(REPO)  # utils.RASTER_FILES and friends are repo-relative
+    tmp = tempfile.mkdtemp(prefix="crop-bench-")
+    ctx = {"tmp": tmp, "model_dir": args.model_dir or os.path.join(tmp, "model_artifacts")}
+    selected = args.only or list(BENCHMARKS)
+    if args.model_dir is None and "train" not in selected:
+        selected = ["train"] + selected
+
+    results = {}
+    try:
+        for name in BENCHMARKS:
+            if name not in selected:
+                continue
+            print(f"▶ {name} ...", flush=True)
+            for metric, (value, unit, higher) in BENCHMARKS[name](ctx).items():
+                results[metric] = {"value": round(float(value), 4), "unit": unit, "higher_is_better": higher}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    baseline_doc = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline_doc = json.load(f)
+    threshold = args.threshold if args.threshold is not None else baseline_doc.get("threshold", DEFAULT_THRESHOLD)
+    rows = compare(results, baseline_doc.get("results", {}), threshold, baseline_doc.get("thresholds", {}))
+
+    print(f"\n{'metric':32} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, base, new, change, regressed in rows:
+        unit = results[name]["unit"]
+        base_s = f"{base:.4g}" if base is not None else "-"
+        change_s = f"{change * 100:+.1f}%" if change is not None else "new"
+        print(f"{name:32} {base_s:>12} {new:>12.4g} {change_s:>8} {unit}{'  ❌ REGRESSION' if regressed else ''}")
+
+    if args.save_baseline:
+        doc = {
+            "threshold": baseline_doc.get("threshold", DEFAULT_THRESHOLD),
+            "thresholds": baseline_doc.get("thresholds", {}),
+            "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpus": os.cpu_count(), "recorded": time.strftime("%Y-%m-%d")},
+            "results": {**baseline_doc.get("results", {}), **results},
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(doc, f, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    return 1 if any(r[4] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,131 @@
+"""
+data_builders/fetch_climate_and_soil.py
+- Fetches NASA POWER climatology and Bhuvan WFS soil layers for a list of points
+  (the six Bhopal-region districts by default, or every village in --points).
+- Points are fetched concurrently; each API host has its own token bucket so we
+  stay under its rate limit.
+- Raw responses go to a content-addressed cache (data/.http_cache), so re-runs
+  and retries never hit the network twice for the same request.
+- Rows are appended to <out>.partial as they finish, one write per row, and
+  that file is the progress log: a re-run skips the points already in it. Points
+  whose requests failed are left out and retried next time. Only a run with no
+  failures moves the finished file over the output, so an existing summary is
+  never lost to an interrupted or failed run.
+- Output: data/climate_soil_summary.csv
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
 import requests
 import pandas as pd
 from tqdm import tqdm
-import time
+
+OUT_CSV = "data/climate_soil_summary.csv"
+CACHE_DIR = "data/.http_cache"
+WORKERS = 8
+# requests per second / burst size per host
+HOST_RATES = {
+    "power.larc.nasa.gov": (2.0, 4),
+    "bhuvan-app1.nrsc.gov.in": (1.0, 2),
+}
+DEFAULT_RATE = (1.0, 1)
+
+SOIL_LAYERS = {
+    "soil_ph_prior": "Soil_pH_0_15cm",
+    "soil_oc_prior": "Soil_OC_0_15cm",
+    "soil_n_prior": "Soil_Available_N",
+    "soil_p_prior": "Soil_Available_P",
+    "soil_k_prior": "Soil_Available_K"
+}
+COLUMNS = ["district", "lat", "lon", "t2m_mean", "annual_precip_mean", *SOIL_LAYERS]
+
+# -------------------------------
+# Districts & Coordinates (default point set)
+# -------------------------------
+districts = {
+    "Bhopal": (23.2599, 77.4126),
+    "Sehore": (23.1150, 77.0665),
+    "Raisen": (23.2676, 78.1727),
+    "Vidisha": (23.8463, 77.8370),
+    "Rajgarh": (23.8717, 76.7745),
+    "Narmadapuram": (22.6003, 77.9270)
+}
+
+
+# -------------------------------
+# 0. Rate limiting + response cache
+# -------------------------------
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, up to `burst` saved up."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_session = requests.Session()
+
+
+def _bucket_for(url):
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*HOST_RATES.get(host, DEFAULT_RATE))
+        return _buckets[host]
+
+
+def cached_get_json(url, params=None, timeout=30, cache_dir=CACHE_DIR):
+    """GET url and return its JSON body, reading/writing the on-disk cache."""
+    key = json.dumps([url, sorted((params or {}).items())], default=str)
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    path = os.path.join(cache_dir, digest[:2], digest + ".json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    _bucket_for(url).acquire()
+    r = _session.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)  # atomic, so a crash never leaves a truncated entry
+    return data
+
 
 # -------------------------------
 # 1. NASA POWER Climate Fetch
 # -------------------------------
-def fetch_climate_from_nasa(lat, lon):
-    url = (
-        "https://power.larc.nasa.gov/api/temporal/climatology/point"
-        f"?parameters=T2M,PRECTOT&community=AG&longitude={lon}&latitude={lat}&format=JSON"
-    )
+def fetch_climate_from_nasa(lat, lon, errors=None):
+    url = "https://power.larc.nasa.gov/api/temporal/climatology/point"
+    params = {"parameters": "T2M,PRECTOT", "community": "AG", "longitude": lon, "latitude": lat, "format": "JSON"}
     try:
-        r = requests.get(url, timeout=30)
-        r.raise_for_status()
-        data = r.json()
+        data = cached_get_json(url, params=params)
         t2m = data["properties"]["parameter"]["T2M"]
         pr = data["properties"]["parameter"]["PRECTOT"]
 
@@ -24,14 +135,15 @@ def fetch_climate_from_nasa(lat, lon):
         }
     except Exception as e:
         print(f"[NASA] Error fetching climate at {lat},{lon}: {e}")
+        if errors is not None:
+            errors.append(f"NASA climate: {e}")
         return {"t2m_mean": None, "annual_precip_mean": None}
-print("[NASA raw response]", r.json())
 
 
 # -------------------------------
 # 2. Bhuvan Soil Fetch
 # -------------------------------
-def fetch_soil_from_bhuvan(lat, lon, property_layer):
+def fetch_soil_from_bhuvan(lat, lon, property_layer, errors=None):
     base_url = "https://bhuvan-app1.nrsc.gov.in/bhuvan/wfs"
     params = {
         "service": "WFS",
@@ -44,74 +156,112 @@ def fetch_soil_from_bhuvan(lat, lon, property_layer):
     }
 
     try:
-        r = requests.get(base_url, params=params, timeout=30)
-        r.raise_for_status()
-        data = r.json()
+        data = cached_get_json(base_url, params=params)
         if "features" in data and len(data["features"]) > 0:
             return data["features"][0]["properties"]
         else:
             return None
     except Exception as e:
         print(f"[Bhuvan] Error fetching {property_layer} at {lat},{lon}: {e}")
+        if errors is not None:
+            errors.append(f"Bhuvan {property_layer}: {e}")
         return None
 
 
-def fetch_all_soil_properties(lat, lon):
-    layers = {
-        "soil_ph_prior": "Soil_pH_0_15cm",
-        "soil_oc_prior": "Soil_OC_0_15cm",
-        "soil_n_prior": "Soil_Available_N",
-        "soil_p_prior": "Soil_Available_P",
-        "soil_k_prior": "Soil_Available_K"
-    }
-    results = {}
-    for key, layer in layers.items():
-        results[key] = fetch_soil_from_bhuvan(lat, lon, layer)
-        time.sleep(1)  # small delay to avoid hitting API limits
-    return results
-print("[Bhuvan raw response]", r.text[:500])
+def fetch_all_soil_properties(lat, lon, errors=None):
+    # pacing is handled by the Bhuvan token bucket
+    return {key: fetch_soil_from_bhuvan(lat, lon, layer, errors) for key, layer in SOIL_LAYERS.items()}
 
 
-# -------------------------------
-# 3. Districts & Coordinates
-# -------------------------------
-districts = {
-    "Bhopal": (23.2599, 77.4126),
-    "Sehore": (23.1150, 77.0665),
-    "Raisen": (23.2676, 78.1727),
-    "Vidisha": (23.8463, 77.8370),
-    "Rajgarh": (23.8717, 76.7745),
-    "Narmadapuram": (22.6003, 77.9270)
-}
+class FetchError(Exception):
+    """At least one request for a point failed (as opposed to returning no data)."""
 
 
-# -------------------------------
-# 4. Main Loop
-# -------------------------------
-rows = []
-print(f"Will fetch NASA POWER & Bhuvan Soil data for these districts: {list(districts.keys())}")
-
-for district, (lat, lon) in tqdm(districts.items(), total=len(districts)):
-    # Climate
-    climate = fetch_climate_from_nasa(lat, lon)
-
-    # Soil
-    soil = fetch_all_soil_properties(lat, lon)
-
+def fetch_point(name, lat, lon):
+    errors = []
     row = {
-        "district": district,
+        "district": name,
         "lat": lat,
         "lon": lon,
-        **climate,
-        **soil
+        **fetch_climate_from_nasa(lat, lon, errors),
+        **fetch_all_soil_properties(lat, lon, errors)
     }
-    rows.append(row)
+    if errors:
+        raise FetchError("; ".join(errors))
+    return row
+
 
 # -------------------------------
-# 5. Save to CSV
+# 3. Runner
 # -------------------------------
-df = pd.DataFrame(rows)
-out_path = "data/climate_soil_summary.csv"
-df.to_csv(out_path, index=False)
-print(f"✅ Saved climate+soil summary to: {out_path}")
-print(df)
+def load_points(path=None):
+    """Return [(name, lat, lon)] from a CSV (name/district/village, lat, lon) or the default districts."""
+    if not path:
+        return [(d, lat, lon) for d, (lat, lon) in districts.items()]
+    df = pd.read_csv(path)
+    name_col = next(c for c in ("name", "village", "district") if c in df.columns)
+    return list(zip(df[name_col].astype(str), df["lat"].astype(float), df["lon"].astype(float)))
+
+
+def _point_key(name, lat, lon):
+    return f"{name}|{float(lat):.6f}|{float(lon):.6f}"
+
+
+def _resume(partial_path):
+    """Keys of the rows already in partial_path, after cutting off a row torn by a crash."""
+    if not os.path.exists(partial_path):
+        return set()
+    with open(partial_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with open(partial_path, newline="") as f:
+        return {_point_key(r["district"], r["lat"], r["lon"]) for r in csv.DictReader(f)}
+
+
+def run(points, out_path=OUT_CSV, workers=WORKERS):
+    """
+    Fetch every point not yet in <out_path>.partial, appending its row there,
+    and replace out_path with the result once every point has succeeded.
+    Returns the number of points that failed (0 when out_path was written).
+    """
+    partial_path = out_path + ".partial"
+    done = _resume(partial_path)
+    todo = [p for p in points if _point_key(*p) not in done]
+    print(f"Will fetch NASA POWER & Bhuvan Soil data for {len(todo)} points ({len(points) - len(todo)} already done)")
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    new_file = not os.path.exists(partial_path) or os.path.getsize(partial_path) == 0
+    failed = []
+    with open(partial_path, "a", newline="") as out_f, ThreadPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(out_f, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+        futures = {pool.submit(fetch_point, *p): p for p in todo}
+        for fut in tqdm(as_completed(futures), total=len(futures)):
+            try:
+                row = fut.result()
+            except FetchError as e:
+                failed.append((futures[fut], e))
+                continue
+            writer.writerow(row)  # the row is also its progress record
+            out_f.flush()
+
+    if failed:
+        for (name, lat, lon), e in failed[:10]:
+            print(f"  failed: {name} ({lat}, {lon}): {e}")
+        print(f"⚠️ {len(failed)} points failed; {out_path} left unchanged. Re-run to retry them "
+              f"(finished rows are kept in {partial_path}).")
+        return len(failed)
+    os.replace(partial_path, out_path)
+    print(f"✅ Saved climate+soil summary to: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch climate + soil priors for a set of points")
+    parser.add_argument("--points", type=str, default=None, help="CSV with name/village/district, lat, lon columns")
+    parser.add_argument("--out", type=str, default=OUT_CSV)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+    raise SystemExit(1 if run(load_points(args.points), out_path=args.out, workers=args.workers) else 0)
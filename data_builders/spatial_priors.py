@@ -0,0 +1,164 @@
+"""
+data_builders/spatial_priors.py
+- Interpolates climate / soil priors (t2m_mean, annual_precip_mean, soil_*_prior)
+  from any number of sample points to arbitrary farm coordinates.
+- Sample points are indexed once in a KD-tree (scipy cKDTree) on unit-sphere
+  xyz coordinates, so chord distance orders neighbours exactly like
+  great-circle distance and each lookup is O(log n) in the sample count.
+- query() takes whole arrays of farm coordinates (millions at a time, in
+  chunks) and blends each farm's k nearest samples, either by
+  inverse-distance weighting ("idw") or with a Gaussian kernel that relaxes
+  to the column mean away from every sample ("gaussian", a kriging-lite).
+  Missing sample values are skipped per column.
+
+    python data_builders/spatial_priors.py --lat 23.18 --lon 77.29
+    python data_builders/spatial_priors.py --points data/villages.csv --out data/village_priors.csv
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+CLIMATE_SOIL_CSV = "data/climate_soil_summary.csv"
+PRIOR_COLUMNS = ["t2m_mean", "annual_precip_mean", "soil_ph_prior", "soil_oc_prior",
+                 "soil_n_prior", "soil_p_prior", "soil_k_prior"]
+EARTH_RADIUS_KM = 6371.0
+K_NEIGHBOURS = 8
+IDW_POWER = 2.0
+GAUSSIAN_SCALE_KM = 25.0
+GAUSSIAN_NUGGET = 0.05  # weight of the column mean; wins once every sample is a few scales away
+QUERY_CHUNK = 100_000  # points per KD-tree query; bounds the (chunk, k, columns) temporaries
+
+
+def to_xyz(lats, lons):
+    """(n, 3) unit vectors for lat/lon in degrees."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+class SpatialPriors:
+    def __init__(self, lats, lons, values, names=None):
+        """
+        values maps column -> array aligned with lats/lons (NaN = unknown at
+        that sample). Points without coordinates are dropped.
+        """
+        from scipy.spatial import cKDTree
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        keep = np.isfinite(lats) & np.isfinite(lons)
+        if not keep.any():
+            raise ValueError("no sample points with coordinates")
+        self.lats, self.lons = lats[keep], lons[keep]
+        self.names = np.asarray(names, dtype=object)[keep] if names is not None else None
+        self.columns = list(values)
+        # (n_samples, n_columns); one gather per query serves every column
+        self.values = np.column_stack([np.asarray(values[c], dtype=float)[keep] for c in self.columns]) \
+            if self.columns else np.empty((keep.sum(), 0))
+        self.means = np.array([np.nanmean(v) if np.isfinite(v).any() else np.nan for v in self.values.T])
+        self.tree = cKDTree(to_xyz(self.lats, self.lons))
+
+    def __len__(self):
+        return len(self.lats)
+
+    @classmethod
+    def from_frame(cls, df, columns=None, name_col="district"):
+        columns = [c for c in (columns or PRIOR_COLUMNS) if c in df.columns]
+        return cls(df["lat"], df["lon"], {c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+                                          for c in columns},
+                   names=df[name_col].astype(str).to_numpy() if name_col in df.columns else None)
+
+    @classmethod
+    def from_csv(cls, path=CLIMATE_SOIL_CSV, columns=None):
+        return cls.from_frame(pd.read_csv(path), columns)
+
+    def nearest(self, lats, lons):
+        """(sample index, distance km) of the closest sample for every point."""
+        chord, idx = self.tree.query(to_xyz(lats, lons), k=1)
+        return idx, chord_to_km(chord)
+
+    def query(self, lats, lons, k=K_NEIGHBOURS, method="idw", power=IDW_POWER,
+              scale_km=GAUSSIAN_SCALE_KM, nugget=GAUSSIAN_NUGGET, max_km=None, chunk=QUERY_CHUNK):
+        """
+        Interpolated priors for every (lat, lon): {column: float array}. NaN
+        where a column has no known sample among the k nearest (within max_km).
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        out = np.full((lats.size, len(self.columns)), np.nan)
+        k = max(1, min(int(k), len(self)))
+        for start in range(0, lats.size, chunk):
+            sl = slice(start, start + chunk)
+            out[sl] = self._blend(lats[sl], lons[sl], k, method, power, scale_km, nugget, max_km)
+        return {c: out[:, j] for j, c in enumerate(self.columns)}
+
+    def _blend(self, lats, lons, k, method, power, scale_km, nugget, max_km):
+        chord, idx = self.tree.query(to_xyz(lats, lons), k=k, workers=-1)
+        if k == 1:
+            chord, idx = chord[:, None], idx[:, None]
+        km = chord_to_km(chord)                     # (n, k)
+        vals = self.values[idx]                     # (n, k, columns)
+        known = np.isfinite(vals)
+        if max_km is not None:
+            known &= (km <= max_km)[:, :, None]
+        if method == "idw":
+            # floored at 1 m: a farm on top of a sample effectively takes its value
+            w = np.maximum(km, 1e-3) ** -power
+            base_w, base = 0.0, 0.0
+        elif method == "gaussian":
+            w = np.exp(-0.5 * (km / scale_km) ** 2)
+            base_w, base = nugget, np.nan_to_num(self.means)
+        else:
+            raise ValueError(f"unknown method {method!r} (expected 'idw' or 'gaussian')")
+        w = np.where(known, w[:, :, None], 0.0)     # (n, k, columns)
+        num = (w * np.where(known, vals, 0.0)).sum(axis=1) + base_w * base
+        den = w.sum(axis=1) + base_w
+        with np.errstate(invalid="ignore", divide="ignore"):
+            est = num / den
+        # no usable sample for a column: unknown, not the background mean
+        return np.where(known.any(axis=1), est, np.nan)
+
+
+def load_priors(path=CLIMATE_SOIL_CSV, columns=None):
+    """SpatialPriors over the climate/soil summary, or None if it has no usable rows."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return SpatialPriors.from_csv(path, columns)
+    except ValueError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interpolate climate/soil priors at arbitrary coordinates")
+    parser.add_argument("--samples", type=str, default=CLIMATE_SOIL_CSV, help="CSV with lat, lon and prior columns")
+    parser.add_argument("--lat", type=float, default=None)
+    parser.add_argument("--lon", type=float, default=None)
+    parser.add_argument("--points", type=str, default=None, help="CSV of points (lat, lon) to interpolate at")
+    parser.add_argument("--out", type=str, default=None, help="Write --points with prior columns appended")
+    parser.add_argument("--method", choices=["idw", "gaussian"], default="idw")
+    parser.add_argument("--k", type=int, default=K_NEIGHBOURS)
+    parser.add_argument("--max_km", type=float, default=None)
+    args = parser.parse_args()
+
+    priors = SpatialPriors.from_csv(args.samples)
+    print(f"Indexed {len(priors)} sample points ({', '.join(priors.columns)})")
+    if args.points:
+        pts = pd.read_csv(args.points)
+    elif args.lat is not None and args.lon is not None:
+        pts = pd.DataFrame({"lat": [args.lat], "lon": [args.lon]})
+    else:
+        raise SystemExit("Give --lat/--lon or --points")
+    est = priors.query(pts["lat"], pts["lon"], k=args.k, method=args.method, max_km=args.max_km)
+    out = pts.assign(**est)
+    if args.out:
+        out.to_csv(args.out, index=False)
+        print(f"✅ Saved priors for {len(out)} points to: {args.out}")
+    else:
+        print(out.head(20).to_string(index=False))
@@ -4,11 +4,19 @@ data_builders/synthesize_local_dataset.py
 - Loads climate_soil_summary.csv (from fetch_climate_and_soil.py)
 - Synthesizes a localized Kaggle-style dataset by sampling rows and replacing
   climate and pH fields with district-specific draws.
+- Draws are vectorized per chunk from a seeded numpy Generator (--seed).
+  synthesize() returns the rows as a DataFrame; synthesize_to_file() (used by
+  the CLI) streams them to CSV or Parquet, so tens of millions of rows fit in
+  bounded memory.
+- With --points (a CSV of farm/village coordinates) or --random_points N, rows
+  are spread over those locations instead, each with priors interpolated from
+  the summary's sample points (spatial_priors.py, KD-tree + IDW).
 - Output: data/localized_kaggle_bhopal_synth.csv
 """
 
 import pandas as pd
 import numpy as np
+import argparse
 import os
 from tqdm import tqdm
 
@@ -17,6 +25,7 @@ CLIMATE_SOIL_CSV = "data/climate_soil_summary.csv"
 OUT_DIR = "data"
 OUT_CSV = os.path.join(OUT_DIR, "localized_kaggle_bhopal_synth.csv")
 SYNTH_SIZE = 1200  # target synthetic rows (you can increase)
+CHUNK_ROWS = 500_000  # rows drawn and written per chunk; bounds memory
 
 os.makedirs(OUT_DIR, exist_ok=True)
 
@@ -55,40 +64,124 @@ def district_sampler(climate_df, district):
         return t, r, p
     return sample_once
 
-def synthesize(dataset, climate_df, districts, out_path, size=SYNTH_SIZE):
-    synth_rows = []
-    for i in tqdm(range(size)):
-        row = dataset.sample(1).iloc[0].copy()
-        # choose a target district randomly
-        district = np.random.choice(districts)
-        sampler = district_sampler(climate_df, district)
-        if sampler is None:
-            # fallback: leave original values
-            t, r, p = None, None, None
-        else:
-            t, r, p = sampler()
-        # map column names (best effort)
-        # Kaggle column names vary; we try common ones
-        if 'temperature' in row.index and t is not None:
-            row['temperature'] = t
-        elif 'temp' in row.index and t is not None:
-            row['temp'] = t
-        if 'rainfall' in row.index and r is not None:
-            row['rainfall'] = r
-        if 'ph' in row.index and p is not None:
-            row['ph'] = p
-        # attach district and lat/lon from climate_df for traceability
-        cs = climate_df[climate_df['district'] == district].iloc[0]
-        row['district'] = district
-        row['district_lat'] = cs['lat']
-        row['district_lon'] = cs['lon']
-        synth_rows.append(row)
-    synth_df = pd.DataFrame(synth_rows)
-    synth_df.to_csv(out_path, index=False)
+def district_params(climate_df, districts):
+    """
+    Per-district (names, t2m mean, annual precip mean, soil pH prior, lat, lon)
+    arrays aligned with `districts`; NaN where the district or value is missing.
+    """
+    first = climate_df.drop_duplicates('district').set_index('district')
+    rows = first.reindex(list(districts))
+    cols = ['t2m_mean', 'annual_precip_mean', 'soil_ph_prior', 'lat', 'lon']
+    return [np.asarray(districts, dtype=object)] + [
+        pd.to_numeric(rows[c], errors='coerce').to_numpy(dtype=float) if c in rows else np.full(len(rows), np.nan)
+        for c in cols]
+
+def point_params(priors, lats, lons, names=None):
+    """
+    district_params for arbitrary points: the same arrays, with priors
+    interpolated at every point in one bulk query.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if names is None:
+        names = [f"{a:.4f},{b:.4f}" for a, b in zip(lats, lons)]
+    est = priors.query(lats, lons)
+    cols = ['t2m_mean', 'annual_precip_mean', 'soil_ph_prior']
+    return [np.asarray(names, dtype=object)] + [est.get(c, np.full(lats.size, np.nan)) for c in cols] + [lats, lons]
+
+def random_points(climate_df, n, rng, margin=0.25):
+    """n uniform points over the bounding box of the summary's points (plus margin degrees)."""
+    lat, lon = climate_df['lat'].astype(float), climate_df['lon'].astype(float)
+    return (rng.uniform(lat.min() - margin, lat.max() + margin, n),
+            rng.uniform(lon.min() - margin, lon.max() + margin, n))
+
+def synthesize_chunk(rng, columns, n_source, params, n):
+    """Draw n synthetic rows. columns maps column name -> source ndarray."""
+    names, tmean, prmean, phprior, dlat, dlon = params
+    src = rng.integers(0, n_source, size=n)
+    d = rng.integers(0, len(tmean), size=n)
+    chunk = {c: v[src] for c, v in columns.items()}
+
+    # temperature: normal around the district mean, small sd
+    t = np.round(rng.normal(tmean[d], np.maximum(0.5, np.abs(tmean[d]) * 0.03)), 2)
+    # rainfall: normal around the district mean, folded at zero
+    r = np.abs(np.round(rng.normal(prmean[d], np.maximum(5, np.abs(prmean[d]) * 0.08)), 2))
+    # pH around the soil prior
+    p = np.clip(np.round(rng.normal(phprior[d], 0.4), 2), 4.5, 9.5)
+
+    # Kaggle column names vary; we try common ones. Missing priors keep the source value.
+    temp_col = 'temperature' if 'temperature' in chunk else ('temp' if 'temp' in chunk else None)
+    for col, draw in ((temp_col, t), ('rainfall', r), ('ph', p)):
+        if col in chunk:
+            chunk[col] = np.where(np.isnan(draw), chunk[col], draw)
+    chunk['district'] = names[d]
+    chunk['district_lat'] = dlat[d]
+    chunk['district_lon'] = dlon[d]
+    return pd.DataFrame(chunk)
+
+def synthesize(dataset, climate_df, districts, out_path, size=SYNTH_SIZE, seed=None, params=None):
+    """
+    Draw `size` synthetic rows in memory, save them to out_path (.csv or
+    .parquet) and return them as a DataFrame. For large sizes use
+    synthesize_to_file, which streams and never holds the whole dataset.
+    """
+    rng = np.random.default_rng(seed)
+    if params is None:
+        params = district_params(climate_df, districts)
+    columns = {c: dataset[c].to_numpy() for c in dataset.columns}
+    synth_df = synthesize_chunk(rng, columns, len(dataset), params, size)
+    if out_path.lower().endswith(('.parquet', '.pq')):
+        synth_df.to_parquet(out_path, index=False)
+    else:
+        synth_df.to_csv(out_path, index=False)
     print("Saved synthetic localized dataset:", out_path)
     return synth_df
 
+def synthesize_to_file(dataset, climate_df, districts, out_path, size=SYNTH_SIZE, seed=None, chunksize=CHUNK_ROWS,
+                       params=None):
+    """
+    Stream `size` synthetic rows to out_path (.csv or .parquet) in chunks of
+    `chunksize`, drawing all samples per chunk from one seeded Generator.
+    params (from point_params) replaces the per-district priors.
+    Returns the number of rows written.
+    """
+    rng = np.random.default_rng(seed)
+    if params is None:
+        params = district_params(climate_df, districts)
+    columns = {c: dataset[c].to_numpy() for c in dataset.columns}
+    parquet = out_path.lower().endswith(('.parquet', '.pq'))
+    writer = None
+    written = 0
+    try:
+        for start in tqdm(range(0, size, chunksize), total=-(-size // chunksize)):
+            n = min(chunksize, size - start)
+            chunk = synthesize_chunk(rng, columns, len(dataset), params, n)
+            if parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(out_path, mode='w' if start == 0 else 'a', header=(start == 0), index=False)
+            written += n
+    finally:
+        if writer is not None:
+            writer.close()
+    print("Saved synthetic localized dataset:", out_path)
+    return written
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthesize a localized Kaggle-style dataset")
+    parser.add_argument("--size", type=int, default=SYNTH_SIZE)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--out", type=str, default=OUT_CSV, help=".csv or .parquet")
+    parser.add_argument("--points", type=str, default=None, help="CSV of locations (name/village/district, lat, lon)")
+    parser.add_argument("--random_points", type=int, default=None, help="Spread rows over N random locations in the region")
+    args = parser.parse_args()
+
     print("Loading Kaggle dataset:", KAGGLE_CSV)
     if not os.path.exists(KAGGLE_CSV):
         raise SystemExit(f"Missing {KAGGLE_CSV} in repo root. Add the Kaggle file and re-run.")
@@ -98,6 +191,23 @@ if __name__ == "__main__":
         raise SystemExit(f"Missing {CLIMATE_SOIL_CSV} - run fetch_climate_and_soil.py first.")
     cs = pd.read_csv(CLIMATE_SOIL_CSV)
     districts = cs['district'].tolist()
-    out = synthesize(kag, cs, districts, OUT_CSV, size=SYNTH_SIZE)
-    print("Sample rows:")
-    print(out.head())
+    params = None
+    if args.points or args.random_points:
+        from spatial_priors import SpatialPriors
+        priors = SpatialPriors.from_frame(cs)
+        if args.points:
+            from fetch_climate_and_soil import load_points
+            names, lats, lons = zip(*load_points(args.points))
+        else:
+            names = None
+            lats, lons = random_points(cs, args.random_points, np.random.default_rng(args.seed))
+        params = point_params(priors, lats, lons, names)
+        print(f"Interpolated priors at {len(params[0])} locations from {len(priors)} sample points")
+    n = synthesize_to_file(kag, cs, districts, args.out, size=args.size, seed=args.seed, chunksize=args.chunksize,
+                           params=params)
+    print(f"Sample rows ({n} written):")
+    if args.out.lower().endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+        print(next(pq.ParquetFile(args.out).iter_batches(batch_size=5)).to_pandas())
+    else:
+        print(pd.read_csv(args.out, nrows=5))
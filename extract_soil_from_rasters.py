@@ -17,28 +17,34 @@ PROPERTIES = ["phh2o", "soc", "clay"]
 DEPTH = "0-5cm"
 OUT_CSV = "data/climate_soil_summary_local.csv"
 
-os.makedirs("data", exist_ok=True)
-
-# --- LOAD RASTERS ---
-rasters = {}
-for prop in PROPERTIES:
-    path = os.path.join(RASTER_DIR, f"{prop}_{DEPTH}.tif")
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"{path} not found. Run download script first.")
-    rasters[prop] = rasterio.open(path)
-
-# --- EXTRACT VALUES ---
-records = []
-for d, (lat, lon) in DISTRICTS.items():
-    record = {"district": d, "lat": lat, "lon": lon}
-    for prop, raster in rasters.items():
-        # raster.sample expects (lon, lat)
-        val = list(raster.sample([(lon, lat)]))[0][0]
-        record[f"soil_{prop}_local"] = float(val) if val is not None else None
-    records.append(record)
-
-# --- SAVE CSV ---
-df = pd.DataFrame(records)
-df.to_csv(OUT_CSV, index=False)
-print(f"✅ Saved soil values to: {OUT_CSV}")
-print(df)
+
+def main():
+    os.makedirs("data", exist_ok=True)
+
+    # --- LOAD RASTERS ---
+    rasters = {}
+    for prop in PROPERTIES:
+        path = os.path.join(RASTER_DIR, f"{prop}_{DEPTH}.tif")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found. Run download script first.")
+        rasters[prop] = rasterio.open(path)
+
+    # --- EXTRACT VALUES ---
+    records = []
+    for d, (lat, lon) in DISTRICTS.items():
+        record = {"district": d, "lat": lat, "lon": lon}
+        for prop, raster in rasters.items():
+            # raster.sample expects (lon, lat)
+            val = list(raster.sample([(lon, lat)]))[0][0]
+            record[f"soil_{prop}_local"] = float(val) if val is not None else None
+        records.append(record)
+
+    # --- SAVE CSV ---
+    df = pd.DataFrame(records)
+    df.to_csv(OUT_CSV, index=False)
+    print(f"✅ Saved soil values to: {OUT_CSV}")
+    print(df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# gazetteer.py
+"""
+Offline place-name index for "Resolve location" / "Fetch weather".
+
+Loads data/india_places.csv (name, state, lat, lon, aliases separated by "|",
+including Devanagari and Urdu spellings) plus any places learned from the
+OpenWeather geocoder (data/gazetteer_learned.csv). lookup() accepts only an
+exact match on the normalized name or one of its aliases (a dict hit, a few
+microseconds).
+
+Phonetic keys are not proof of identity: distinct towns share consonant
+skeletons (Patan / Patna, Banda / Bhind, Sivani / Seoni), so a phonetic or
+edit-distance match over the tries of names and keys only feeds suggest()
+("did you mean"). Anything lookup() misses goes to the geocoder, and
+utils.get_coords_for_city_openweather adds its answer here with the query as
+an alias, so the next "Bhopaal" is an exact hit.
+"""
+import os, csv, re, threading, unicodedata
+from collections import namedtuple
+
+PLACES_CSV = "data/india_places.csv"
+LEARNED_CSV = "data/gazetteer_learned.csv"
+CSV_COLUMNS = ["name", "state", "lat", "lon", "aliases"]
+
+Place = namedtuple("Place", "name state lat lon source")
+
+# --- Devanagari -> Latin (enough for phonetic keys, not a full scheme) ---
+_DEV_VOWELS = {"अ": "a", "आ": "aa", "इ": "i", "ई": "ii", "उ": "u", "ऊ": "uu", "ऋ": "ri",
+               "ए": "e", "ऐ": "ai", "ओ": "o", "औ": "au", "ऑ": "o"}
+_DEV_MATRAS = {"ा": "aa", "ि": "i", "ी": "ii", "ु": "u", "ू": "uu", "ृ": "ri",
+               "े": "e", "ै": "ai", "ो": "o", "ौ": "au", "ॅ": "e", "ॉ": "o"}
+_DEV_CONSONANTS = {"क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n", "च": "ch", "छ": "chh",
+                   "ज": "j", "झ": "jh", "ञ": "n", "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh",
+                   "ण": "n", "त": "t", "थ": "th", "द": "d", "ध": "dh", "न": "n", "प": "p",
+                   "फ": "ph", "ब": "b", "भ": "bh", "म": "m", "य": "y", "र": "r", "ल": "l",
+                   "व": "v", "श": "sh", "ष": "sh", "स": "s", "ह": "h"}
+_DEV_NUKTA = {"ड": "r", "ढ": "rh", "क": "q", "ख": "kh", "ग": "g", "ज": "z", "फ": "f"}
+_VIRAMA, _NUKTA = "्", "़"
+_NASALS = {"ं": "n", "ँ": "n", "ः": "h"}
+
+# applied in order to lowercase Latin
+_PHONETIC_SUBS = [("ck", "k"), ("chh", "C"), ("ch", "C"), ("c", "k"), ("C", "c"),
+                  ("sh", "s"), ("ph", "f"), ("kh", "k"), ("gh", "g"), ("bh", "b"), ("dh", "d"),
+                  ("th", "t"), ("jh", "j"), ("q", "k"), ("z", "j"), ("x", "ks"),
+                  ("nb", "mb"), ("np", "mp")]
+
+
+def normalize(text):
+    """Lowercase, strip Latin accents and punctuation, collapse spaces. Other scripts are kept."""
+    text = unicodedata.normalize("NFD", unicodedata.normalize("NFKC", str(text)).lower())
+    out = []
+    for c in text:
+        if "\u0300" <= c <= "\u036f":  # Latin combining accents
+            continue
+        # punctuation/symbols become spaces; Devanagari/Urdu vowel signs (Mn/Mc) stay
+        out.append(" " if unicodedata.category(c)[0] in "PSZ" else c)
+    return " ".join("".join(out).split())
+
+
+def transliterate_devanagari(text):
+    chars = unicodedata.normalize("NFD", text)
+    out = []
+    pending_a = False
+    i = 0
+    while i < len(chars):
+        c = chars[i]
+        if c in _DEV_CONSONANTS:
+            if pending_a:
+                out.append("a")
+            if i + 1 < len(chars) and chars[i + 1] == _NUKTA:
+                out.append(_DEV_NUKTA.get(c, _DEV_CONSONANTS[c]))
+                i += 1
+            else:
+                out.append(_DEV_CONSONANTS[c])
+            pending_a = True
+        else:
+            if c in _DEV_MATRAS:
+                out.append(_DEV_MATRAS[c])
+            elif c == _VIRAMA:
+                pass
+            else:
+                if pending_a:
+                    out.append("a")
+                out.append(_DEV_VOWELS.get(c) or _NASALS.get(c) or c)
+            pending_a = False
+        i += 1
+    if pending_a:
+        out.append("a")
+    return "".join(out)
+
+
+def phonetic_key(text):
+    """Consonant skeleton that tolerates transliteration variants; '' for scripts we can't read."""
+    s = transliterate_devanagari(normalize(text))
+    s = re.sub(r"[^a-z]", "", s)
+    if not s:
+        return ""
+    for a, b in _PHONETIC_SUBS:
+        s = s.replace(a, b)
+    s = re.sub(r"([aeiou])w", r"\1", s).replace("w", "v")
+    s = s[0] + s[1:].replace("h", "")
+    s = s.replace("y", "i")
+    head = "a" if s[0] in "aeiou" else s[0]
+    s = head + re.sub(r"[aeiou]", "", s[1:])
+    return re.sub(r"(.)\1+", r"\1", s)
+
+
+class Trie:
+    def __init__(self):
+        self.root = {}  # char -> child node; None -> [place ids]
+
+    def insert(self, word, pid):
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        ids = node.setdefault(None, [])
+        if pid not in ids:
+            ids.append(pid)
+
+    def with_prefix(self, prefix, limit=10):
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack and len(found) < limit * 4:
+            n = stack.pop()
+            found.extend(n.get(None, []))
+            stack.extend(child for ch, child in n.items() if ch is not None)
+        return found
+
+    def search(self, word, max_dist):
+        """[(distance, place id)] for every stored word within max_dist edits."""
+        results = []
+        first = list(range(len(word) + 1))
+        for ch, child in self.root.items():
+            if ch is not None:
+                self._search(child, ch, word, first, max_dist, results)
+        return results
+
+    def _search(self, node, ch, word, prev, max_dist, results):
+        row = [prev[0] + 1]
+        for i in range(1, len(word) + 1):
+            row.append(min(row[i - 1] + 1, prev[i] + 1, prev[i - 1] + (word[i - 1] != ch)))
+        if row[-1] <= max_dist and None in node:
+            results.extend((row[-1], pid) for pid in node[None])
+        if min(row) <= max_dist:
+            for c, child in node.items():
+                if c is not None:
+                    self._search(child, c, word, row, max_dist, results)
+
+
+def _max_edits(word):
+    return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+
+
+class Gazetteer:
+    def __init__(self, places_csv=PLACES_CSV, learned_csv=LEARNED_CSV):
+        self.learned_csv = learned_csv
+        self.places = []
+        self._exact = {}     # normalized name -> [ids]
+        self._phonetic = {}  # phonetic key -> [ids]
+        self._names = Trie()
+        self._keys = Trie()
+        self._lock = threading.Lock()
+        for path, source in ((places_csv, "bundled"), (learned_csv, "learned")):
+            if path and os.path.exists(path):
+                with open(path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        self._index(row["name"], row.get("state") or "", float(row["lat"]), float(row["lon"]),
+                                    [a for a in (row.get("aliases") or "").split("|") if a], source)
+
+    def __len__(self):
+        return len(self.places)
+
+    def _index(self, name, state, lat, lon, aliases, source):
+        pid = len(self.places)
+        self.places.append(Place(name, state, lat, lon, source))
+        for label in [name, *aliases]:
+            norm = normalize(label)
+            if not norm:
+                continue
+            self._exact.setdefault(norm, []).append(pid)
+            self._names.insert(norm, pid)
+            key = phonetic_key(label)
+            if key:
+                self._phonetic.setdefault(key, []).append(pid)
+                self._keys.insert(key, pid)
+        return pid
+
+    @staticmethod
+    def _parse(query):
+        parts = [p for p in str(query).split(",") if p.strip()]
+        if not parts:
+            return "", ""
+        return normalize(parts[0]), normalize(parts[1]) if len(parts) > 1 else ""
+
+    def _in_state(self, ids, state):
+        if state:
+            in_state = [i for i in ids if normalize(self.places[i].state).startswith(state)]
+            ids = in_state or ids
+        return ids
+
+    def lookup(self, query):
+        """
+        Place for a free-text query ("Sehore", "सीहोर", "Raisen, MP") whose name
+        matches a known name or alias exactly, else None (see suggest()).
+        """
+        norm, state = self._parse(query)
+        ids = self._exact.get(norm) if norm else None
+        if not ids:
+            return None
+        return self.places[self._in_state(ids, state)[0]]
+
+    def suggest(self, query, limit=5):
+        """Near misses for a query lookup() won't accept: same phonetic key, then edit distance."""
+        norm, state = self._parse(query)
+        if not norm:
+            return []
+        key = phonetic_key(norm)
+        ids = list(self._phonetic.get(key, [])) if key else []
+        ids += self._fuzzy(norm, key)
+        seen, out = set(), []
+        for i in self._in_state(ids, state):
+            if i not in seen:
+                seen.add(i)
+                out.append(self.places[i])
+        return out[:limit]
+
+    def _fuzzy(self, norm, key):
+        hits = self._names.search(norm, _max_edits(norm))
+        if key:
+            # phonetic matches rank after name matches at the same distance
+            hits += [(d + 0.5, pid) for d, pid in self._keys.search(key, _max_edits(key))]
+        hits.sort()
+        return [pid for _, pid in hits]
+
+    def complete(self, prefix, limit=10):
+        """Places whose name or alias starts with prefix (bundled order first)."""
+        norm = normalize(prefix)
+        if not norm:
+            return []
+        ids = sorted(set(self._names.with_prefix(norm, limit)))
+        return [self.places[i] for i in ids[:limit]]
+
+    def add(self, name, lat, lon, state="", aliases=(), persist=True):
+        """Index a place (e.g. a geocoder answer) and append it to the learned CSV."""
+        aliases = [a for a in aliases if a and normalize(a) != normalize(name)]
+        with self._lock:
+            place = self.places[self._index(name, state, float(lat), float(lon), aliases, "learned")]
+            if persist and self.learned_csv:
+                os.makedirs(os.path.dirname(self.learned_csv) or ".", exist_ok=True)
+                new_file = not os.path.exists(self.learned_csv)
+                with open(self.learned_csv, "a", newline="", encoding="utf-8") as f:
+                    writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+                    if new_file:
+                        writer.writeheader()
+                    writer.writerow({"name": name, "state": state, "lat": lat, "lon": lon, "aliases": "|".join(aliases)})
+        return place
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Return the process-wide Gazetteer."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
@@ -0,0 +1,174 @@
+# http_client.py
+"""
+Shared HTTP client for the weather, climate and geocoding APIs.
+
+One pooled requests.Session for the whole process, a TTL cache keyed by URL and
+params (lat/lon rounded to a grid cell), single-flight coalescing so identical
+requests already in flight share one network call, and bounded retries with
+exponential backoff on connection errors, 429 and 5xx.
+
+requests itself is imported when the first client is built, so importing this
+module (e.g. for round_coord or the TTLs) stays cheap. set_client() swaps the
+process-wide client, e.g. for the record/replay clients in providers.py.
+"""
+import time, threading
+from collections import OrderedDict
+
+from urllib.parse import urlparse
+
+from telemetry import http_span
+
+# cache lifetimes (seconds)
+FORECAST_TTL = 3 * 3600
+CLIMATOLOGY_TTL = 7 * 24 * 3600
+GEOCODE_TTL = 30 * 24 * 3600
+
+COORD_KEYS = ("lat", "lon", "latitude", "longitude")
+COORD_DECIMALS = 2  # ~1 km cells; nearby requests share one cache entry
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def round_coord(value, decimals=COORD_DECIMALS):
+    return round(float(value), decimals)
+
+
+def cell_key(lat, lon, decimals=COORD_DECIMALS):
+    """Integer (lat, lon) cell for the round_coord grid, for use as a store key."""
+    scale = 10 ** decimals
+    return int(round(float(lat) * scale)), int(round(float(lon) * scale))
+
+
+class HttpClient:
+    def __init__(self, pool_size=16, retries=2, backoff=0.5, timeout=10, max_entries=4096):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}          # key -> (Event, result holder)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "retries": 0, "errors": 0}
+
+    @staticmethod
+    def cache_key(url, params=None):
+        items = []
+        for k, v in sorted((params or {}).items()):
+            if k in COORD_KEYS and v is not None:
+                v = round_coord(v)
+            items.append((k, v))
+        return url, tuple(items)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._cache)
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / total if total else 0.0
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_json(self, url, params=None, ttl=0, timeout=None):
+        """
+        GET url and return the decoded JSON body. Responses are cached for ttl
+        seconds (0 disables caching but still coalesces concurrent calls).
+        Cached bodies are shared between callers, so treat them as read-only.
+        Raises requests.RequestException once retries are exhausted.
+        """
+        key = self.cache_key(url, params)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = (threading.Event(), {})
+                self._inflight[key] = waiter
+                leader = True
+                self._stats["misses"] += 1
+            else:
+                leader = False
+                self._stats["coalesced"] += 1
+
+        done, result = waiter
+        if not leader:
+            done.wait()
+            if "error" in result:
+                raise result["error"]
+            return result["value"]
+
+        try:
+            value = self._fetch(url, dict(key[1]), timeout)
+            result["value"] = value
+            if ttl > 0:
+                with self._lock:
+                    self._cache[key] = (time.monotonic() + ttl, value)
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+            return value
+        except Exception as e:
+            result["error"] = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+
+    def _fetch(self, url, params, timeout):
+        import requests
+        for attempt in range(self.retries + 1):
+            try:
+                return self._request(url, params, timeout)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                retryable = status is None or status in RETRY_STATUS
+                if attempt >= self.retries or not retryable:
+                    raise
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def _request(self, url, params, timeout):
+        """One GET -> decoded JSON; error statuses raise HTTPError (the retry loop decides what to retry)."""
+        with http_span(urlparse(url).netloc):
+            r = self.session.get(url, params=params, timeout=timeout or self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide HttpClient."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+
+def set_client(client):
+    """
+    Swap the process-wide client (e.g. for providers.ReplayClient) and return the
+    previous one; None goes back to a fresh live HttpClient on next use.
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
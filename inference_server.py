@@ -0,0 +1,193 @@
+# inference_server.py
+"""
+Headless JSON inference service for partner apps (SMS/IVR gateways).
+
+    python inference_server.py --port 8000
+
+POST /predict  {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202}
+               (or a list of such objects; optional "top_k")
+GET  /metrics  queue depth, batch sizes, p50/p99 latency
+GET  /healthz  model version
+
+Artifacts are loaded once through the model registry. Request threads check
+and convert their rows (400 on a missing or non-numeric feature) and enqueue
+plain float vectors; one batcher thread drains the queue into micro-batches
+(up to max_batch rows or max_wait_ms after the first row) and scores each with
+a single predict_proba call.
+"""
+import json, time, queue, threading, argparse, logging
+from collections import deque
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from model_registry import get_registry, feature_row
+
+log = logging.getLogger(__name__)
+
+MAX_BATCH = 256
+MAX_WAIT_MS = 3.0
+LATENCY_WINDOW = 10_000  # recent requests kept for percentiles
+LISTEN_BACKLOG = 128  # socketserver's default of 5 resets connections when a gateway opens many at once
+
+
+class MicroBatcher:
+    def __init__(self, registry, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.registry = registry
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batch_sizes = deque(maxlen=1000)
+        self._stats_lock = threading.Lock()
+        self._served = 0
+        self._errors = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, row, top_k=3):
+        """Queue one float vector (model feature order, see feature_row); returns a Future resolving to the result dict."""
+        fut = Future()
+        self._queue.put((row, top_k, fut, time.perf_counter()))
+        return fut
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        try:
+            art = self.registry.current()
+            X = np.array([row for row, _, _, _ in batch], dtype=float)
+            probs = art.predict_proba(X)
+        except Exception as e:
+            for _, _, fut, _ in batch:
+                fut.set_exception(e)
+            with self._stats_lock:
+                self._errors += len(batch)
+            return
+        max_k = max(top_k for _, top_k, _, _ in batch)
+        results = art.rank(probs, max_k)
+        done = time.perf_counter()
+        for (_, top_k, fut, t0), res in zip(batch, results):
+            res["top_k"] = res["top_k"][:top_k]
+            fut.set_result(res)
+        with self._stats_lock:
+            self._served += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._latencies.extend(done - t0 for _, _, _, t0 in batch)
+
+    def metrics(self):
+        with self._stats_lock:
+            lat = np.array(self._latencies) * 1000.0
+            sizes = np.array(self._batch_sizes)
+            served, errors = self._served, self._errors
+        return {
+            "queue_depth": self._queue.qsize(),
+            "served": served,
+            "errors": errors,
+            "latency_ms_p50": float(np.percentile(lat, 50)) if lat.size else None,
+            "latency_ms_p99": float(np.percentile(lat, 99)) if lat.size else None,
+            "batch_size_mean": float(sizes.mean()) if sizes.size else None,
+            "batch_size_max": int(sizes.max()) if sizes.size else None,
+        }
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for gateway connection pools
+    batcher = None  # set by serve()
+
+    def log_message(self, fmt, *args):
+        log.debug(fmt, *args)
+
+    def _send(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.batcher.metrics())
+        elif self.path == "/healthz":
+            self._send(200, {"status": "ok", **self.batcher.registry.current().info()})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            rows = payload if isinstance(payload, list) else [payload]
+            # validate the whole request before queueing, so a bad row never reaches a shared batch
+            features = self.batcher.registry.current().features
+            clean = []
+            for i, r in enumerate(rows):
+                if not isinstance(r, dict):
+                    raise ValueError(f"row {i}: expected an object")
+                try:
+                    clean.append((feature_row(r, features), int(r.get("top_k", 3))))
+                except (ValueError, TypeError) as e:
+                    raise ValueError(f"row {i}: {e}" if isinstance(payload, list) else str(e)) from None
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        try:
+            futures = [self.batcher.submit(x, top_k) for x, top_k in clean]
+            results = [f.result(timeout=30) for f in futures]
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+            return
+        self._send(200, results if isinstance(payload, list) else results[0])
+
+
+def serve(host="127.0.0.1", port=8000, model_dir="./model_artifacts", max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+    registry = get_registry(model_dir)
+    art = registry.current()
+    log.info("Loaded model version %s in %.3fs", art.version, art.load_seconds)
+    Handler.batcher = MicroBatcher(registry, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server = Server((host, port), Handler)
+    print(f"🌱 Serving crop recommendations on http://{host}:{server.server_port} (model {art.version})")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crop recommendation inference service")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model_dir", type=str, default="./model_artifacts")
+    parser.add_argument("--max_batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max_wait_ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import and initialization cost per module in a fresh process, then exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from startup_profile import main as profile_startup
+        raise SystemExit(profile_startup(["inference_server"]))
+    logging.basicConfig(level=logging.INFO)
+    srv = serve(args.host, args.port, args.model_dir, args.max_batch, args.max_wait_ms)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        srv.server_close()
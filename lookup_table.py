@@ -0,0 +1,218 @@
+# lookup_table.py
+"""
+Precomputed recommendation table over the inputs page_crop actually produces.
+
+build_table() scores the model on a regular grid of (fertility preset, pH,
+temperature, humidity, rainfall) and stores the argmax crop (uint8) and its
+confidence (float16) in one .npz. LookupTable.lookup() answers inputs that
+are within SNAP_TOL of a grid point on every axis: pH must sit on the slider's
+0.1 steps and humidity is snapped to the integer slider's 1 % steps, while the
+forecast's float temperature and rainfall are served from a cell only when they
+are within 0.5 °C / 5 mm of it. Anything further from a grid point, outside the
+grid, or with an N/P/K that is not one of the presets is scored by the live
+model. Snapping every value to the nearest point instead would serve a
+different crop than the model for a large share of real weather values;
+check_table() measures what the tolerances cost.
+
+    python lookup_table.py --check Crop_recommendation.csv
+"""
+import os, time, argparse
+import numpy as np
+
+from model_registry import get_registry
+
+TABLE_FILE = "lookup_table.npz"
+
+# N, P, K for the fertility radio in page_crop
+FERTILITY_PRESETS = {
+    "Low": (20.0, 10.0, 10.0),
+    "Medium": (60.0, 25.0, 25.0),
+    "High": (90.0, 42.0, 43.0),
+}
+# axis -> (start, step, count)
+GRID = {
+    "ph": (3.0, 0.1, 61),           # the 0.1-step slider, 3.0 .. 9.0
+    "temperature": (5.0, 2.0, 21),  # 5 .. 45 °C
+    "humidity": (10.0, 1.0, 91),    # the integer slider, 10 .. 100 %
+    "rainfall": (0.0, 20.0, 16),    # 0 .. 300 mm
+}
+AXES = ["ph", "temperature", "humidity", "rainfall"]
+ON_GRID_TOL = 1e-6  # in grid steps; absorbs float noise like 3.0 + 35 * 0.1
+# axis -> largest distance (feature units) still served from the nearest cell
+SNAP_TOL = {"temperature": 0.5, "humidity": 0.5, "rainfall": 5.0}
+BUILD_CHUNK = 262_144
+
+
+class LookupTable:
+    def __init__(self, crop, confidence, grid, classes, model_hash=None):
+        self.crop = crop              # uint8 [preset, ph, temperature, humidity, rainfall]
+        self.confidence = confidence  # float16, same shape
+        self.grid = grid
+        self.classes = np.asarray(classes)
+        self.model_hash = model_hash
+        self._presets = {tuple(v): i for i, v in enumerate(FERTILITY_PRESETS.values())}
+        # (start, step, count, tolerance in steps)
+        self._axes = [(float(grid[a][0]), float(grid[a][1]), int(grid[a][2]),
+                       max(ON_GRID_TOL, SNAP_TOL.get(a, 0.0) / float(grid[a][1]))) for a in AXES]
+        self.hits = 0
+        self.misses = 0
+
+    def index(self, N, P, K, temperature, humidity, ph, rainfall):
+        """Grid index tuple if the input is within SNAP_TOL of a grid point, else None."""
+        preset = self._presets.get((float(N), float(P), float(K)))
+        if preset is None:
+            return None
+        idx = [preset]
+        # plain floats: a handful of scalars is faster without NumPy
+        for x, (start, step, count, tol) in zip((ph, temperature, humidity, rainfall), self._axes):
+            pos = (float(x) - start) / step
+            i = round(pos)
+            if not 0 <= i < count or abs(pos - i) > tol:
+                return None
+            idx.append(i)
+        return tuple(idx)
+
+    def lookup(self, N, P, K, temperature, humidity, ph, rainfall, registry=None):
+        """Return (crop, confidence, from_table). Inputs off the grid are scored by the live model."""
+        idx = self.index(N, P, K, temperature, humidity, ph, rainfall)
+        if idx is not None:
+            self.hits += 1
+            return str(self.classes[self.crop[idx]]), float(self.confidence[idx]), True
+        self.misses += 1
+        registry = registry or get_registry()
+        res = registry.predict({"N": N, "P": P, "K": K, "temperature": temperature,
+                                "humidity": humidity, "ph": ph, "rainfall": rainfall}, top_k=1)
+        return res["crop"], res["confidence"], False
+
+    def save(self, path):
+        np.savez_compressed(path, crop=self.crop, confidence=self.confidence,
+                            grid=np.array([[float(v) for v in self.grid[a]] for a in AXES]),
+                            classes=self.classes.astype(str), model_hash=np.asarray(self.model_hash or ""))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            grid = {a: (float(r[0]), float(r[1]), int(r[2])) for a, r in zip(AXES, z["grid"])}
+            return cls(z["crop"], z["confidence"], grid, z["classes"], str(z["model_hash"]) or None)
+
+
+def grid_shape(grid=GRID):
+    return (len(FERTILITY_PRESETS), *[grid[a][2] for a in AXES])
+
+
+def grid_rows(flat_idx, grid=GRID):
+    """Feature rows (N, P, K, temperature, humidity, ph, rainfall) for flat grid indices."""
+    preset, *pos = np.unravel_index(flat_idx, grid_shape(grid))
+    npk = np.array(list(FERTILITY_PRESETS.values()))[preset]
+    vals = {a: grid[a][0] + p * grid[a][1] for a, p in zip(AXES, pos)}
+    return np.column_stack([npk, vals["temperature"], vals["humidity"], vals["ph"], vals["rainfall"]])
+
+
+def build_table(model_dir="./model_artifacts", grid=GRID, chunk=BUILD_CHUNK):
+    """Score every grid point with the current model (multi-threaded LightGBM, chunked)."""
+    import pandas as pd
+    art = get_registry(model_dir).current()
+    shape = grid_shape(grid)
+    total = int(np.prod(shape))
+    crop = np.empty(total, dtype=np.uint8)
+    conf = np.empty(total, dtype=np.float16)
+    feats = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+    t0 = time.perf_counter()
+    for start in range(0, total, chunk):
+        idx = np.arange(start, min(start + chunk, total))
+        X = pd.DataFrame(grid_rows(idx, grid), columns=feats)[art.features]
+        probs = art.model.predict_proba(art.scaler.transform(X), num_threads=0)
+        crop[idx] = probs.argmax(axis=1)
+        conf[idx] = probs.max(axis=1)
+    print(f"Scored {total:,} grid points in {time.perf_counter() - t0:.1f}s")
+    return LookupTable(crop.reshape(shape), conf.reshape(shape), dict(grid), art.le.classes_, art.content_hash)
+
+
+def check_table(table, data_path, model_dir="./model_artifacts"):
+    """
+    Compare the table with the live model on a labelled CSV. Rows are fed the way
+    page_crop feeds them: N/P/K snapped to the nearest preset and pH to the
+    slider's 0.1 steps, weather left raw. 'served_from_table' is the share of
+    rows within SNAP_TOL; on those, 'vs live model' is the error the tolerances
+    add and 'vs live model on raw row' also includes the preset/pH quantization.
+    'disagree_snapped_to_nearest' snaps every row to its nearest cell (what
+    serving with unlimited tolerance would cost), and 'disagree_on_grid_points'
+    checks a sample of grid points against the model (should be 0).
+    """
+    import pandas as pd
+    feats = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+    art = get_registry(model_dir).current()
+    df = pd.read_csv(data_path)
+    presets = np.array(list(FERTILITY_PRESETS.values()))
+    npk = df[["N", "P", "K"]].to_numpy(float)
+    nearest = np.abs(npk[:, None, :] - presets[None, :, :]).sum(axis=2).argmin(axis=1)
+    fed = df.copy()
+    fed[["N", "P", "K"]] = presets[nearest]
+    ph_start, ph_step, ph_count = table.grid["ph"]
+    fed["ph"] = ph_start + np.clip(np.round((fed["ph"] - ph_start) / ph_step), 0, ph_count - 1) * ph_step
+
+    # nearest cell for every row, and whether index() would serve it
+    pos = [np.clip(np.round((fed[a].to_numpy(float) - table.grid[a][0]) / table.grid[a][1]), 0, table.grid[a][2] - 1)
+           for a in AXES]
+    cell = tuple(np.array([nearest, *pos], dtype=int))
+    nearest_pred = table.crop[cell]
+    served = np.array([table.index(*row) is not None for row in fed[feats].itertuples(index=False)])
+
+    def predict(X):
+        return art.predict_proba(pd.DataFrame(X, columns=feats)[art.features].to_numpy(float)).argmax(axis=1)
+
+    live_fed = predict(fed[feats])
+    live_raw = predict(df[feats])
+    sample = np.random.default_rng(0).choice(table.crop.size, size=min(table.crop.size, 20_000), replace=False)
+    sample_live = predict(grid_rows(sample, table.grid))
+
+    def share(mask):
+        return float(mask.mean()) if mask.size else None
+
+    report = {
+        "disagree_on_grid_points": float((sample_live != table.crop.reshape(-1)[sample]).mean()),
+        "rows": len(df),
+        "served_from_table": float(served.mean()),
+        "disagree_vs_live_model": share(nearest_pred[served] != live_fed[served]),
+        "disagree_vs_live_model_raw_row": share(nearest_pred[served] != live_raw[served]),
+        "disagree_snapped_to_nearest": float((nearest_pred != live_fed).mean()),
+    }
+    if "label" in df:
+        labels = df["label"].to_numpy()
+        classes = np.asarray(table.classes)
+        report["table_accuracy_on_labels"] = share(classes[nearest_pred[served]] == labels[served])
+        report["live_accuracy_on_labels"] = float((np.asarray(art.le.classes_)[live_fed] == labels).mean())
+    return report
+
+
+_tables = {}  # path -> (mtime, LookupTable)
+
+
+def get_lookup_table(model_dir="./model_artifacts"):
+    """Table for the currently served model, or None if missing or built for another model."""
+    path = os.path.join(model_dir, TABLE_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if path not in _tables or _tables[path][0] != mtime:
+        _tables[path] = (mtime, LookupTable.load(path))
+    table = _tables[path][1]
+    if table.model_hash and table.model_hash != get_registry(model_dir).current().content_hash:
+        return None
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the quantized recommendation lookup table")
+    parser.add_argument("--model_dir", type=str, default="./model_artifacts")
+    parser.add_argument("--out", type=str, default=None, help=f"Output .npz (default: <model_dir>/{TABLE_FILE})")
+    parser.add_argument("--check", type=str, default=None, help="Labelled CSV to measure disagreement on")
+    args = parser.parse_args()
+
+    table = build_table(args.model_dir)
+    out = args.out or os.path.join(args.model_dir, TABLE_FILE)
+    table.save(out)
+    print(f"Saved {table.crop.size:,}-cell table ({os.path.getsize(out) / 1e6:.1f} MB) -> {out}")
+    if args.check:
+        for k, v in check_table(table, args.check, args.model_dir).items():
+            print(f"  {k}: {v}")
@@ -0,0 +1,227 @@
+# model_bundle.py
+"""
+Single-file model bundle: tree tables, scaler mean/scale, label classes,
+feature order and meta.json in one checksummed, memory-mappable file.
+
+The file is a plain 1-D uint8 .npy. Its payload starts with
+
+    b"CROPBNDL" | uint32 format | uint32 header length | header JSON
+
+followed by every array at a 64-byte aligned offset. load_bundle() opens it
+with np.load(mmap_mode='r') and hands out views into that one mapping, so a
+cold load unpickles nothing, reads a few KB up front, and worker processes
+share the node tables through the page cache.
+
+    python model_bundle.py --model_dir ./model_artifacts     # export from the joblib artifacts
+"""
+import os, json, time, struct, hashlib
+import numpy as np
+
+from tree_engine import TreeEnsemble
+
+BUNDLE_FILE = "model_bundle.npy"
+MAGIC = b"CROPBNDL"
+FORMAT = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+class BundleError(ValueError):
+    """The file is not a readable bundle (wrong magic, format, or checksum)."""
+
+
+class BundleScaler:
+    """The part of StandardScaler that callers use: mean_, scale_ and transform()."""
+
+    with_mean = with_std = True
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=float) - self.mean_) / self.scale_
+
+
+class BundleLabels:
+    """The part of LabelEncoder that callers use: classes_, transform(), inverse_transform()."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+        self._index = {c: i for i, c in enumerate(self.classes_.tolist())}
+
+    def transform(self, y):
+        return np.array([self._index[v] for v in y], dtype=np.int64)
+
+    def inverse_transform(self, idx):
+        return self.classes_[np.asarray(idx, dtype=np.int64)]
+
+
+class BundleModel:
+    """
+    Stands in for the fitted classifier: predict_proba()/predict() on scaled
+    rows, answered by the tree tables (which score raw rows).
+    """
+
+    def __init__(self, engine, scaler):
+        self.engine = engine
+        self.scaler = scaler
+        self.classes_ = np.arange(engine.n_classes)
+
+    def predict_proba(self, X, **kwargs):
+        X = np.asarray(X, dtype=float) * self.scaler.scale_ + self.scaler.mean_
+        return self.engine.predict_proba(X)
+
+    def predict(self, X, **kwargs):
+        return self.predict_proba(X).argmax(axis=1)
+
+
+class Bundle:
+    def __init__(self, path, header, arrays):
+        self.path = path
+        self.header = header
+        self.checksum = header["checksum"]
+        self.meta = header.get("meta", {})
+        self.features = list(header["features"])
+        self.scaler = BundleScaler(arrays.pop("scaler_mean"), arrays.pop("scaler_scale"))
+        self.labels = BundleLabels(header["classes"])
+        self.engine = TreeEnsemble.from_arrays({**arrays, "feature_names": np.asarray(self.features),
+                                                "classes": self.labels.classes_})
+        self.model = BundleModel(self.engine, self.scaler)
+
+
+def _digest(header, payload):
+    h = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+    h.update(payload)
+    return "sha256:" + h.hexdigest()
+
+
+def write_bundle(path, engine, scaler=None, classes=None, features=None, meta=None):
+    """Pack a TreeEnsemble (+ scaler, classes, features, meta) into one bundle file at path."""
+    features = list(features) if features is not None else list(engine.feature_names)
+    classes = classes if classes is not None else engine.classes
+    if classes is None:
+        classes = np.arange(engine.n_classes)
+    n = len(features)
+    mean = np.zeros(n)
+    scale = np.ones(n)
+    if scaler is not None:
+        mean = np.asarray(scaler.mean_ if getattr(scaler, "with_mean", True) else mean, dtype=np.float64)
+        scale = np.asarray(scaler.scale_ if getattr(scaler, "with_std", True) else scale, dtype=np.float64)
+
+    arrays = {k: v for k, v in engine.arrays().items() if k not in ("feature_names", "classes")}
+    arrays["scaler_mean"] = mean
+    arrays["scaler_scale"] = scale
+
+    layout, chunks, offset = {}, [], 0
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        layout[name] = [offset, a.dtype.str, list(a.shape)]
+        data = a.tobytes()
+        pad = -len(data) % ALIGN
+        chunks.append(data + b"\0" * pad)
+        offset += len(data) + pad
+    payload = b"".join(chunks)
+
+    meta = dict(meta or {})
+    header = {
+        "format": FORMAT,
+        "version": str(meta.get("version") or ""),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "features": features,
+        "classes": [str(c) for c in np.asarray(classes).tolist()],
+        "meta": meta,
+        "arrays": layout,
+    }
+    header["checksum"] = _digest(header, payload)
+    head = json.dumps(header).encode()
+    # offsets in the layout are relative to the aligned start of the payload
+    start = _PREFIX.size + len(head)
+    start += -start % ALIGN
+    blob = bytearray(start + len(payload))
+    blob[:_PREFIX.size] = _PREFIX.pack(MAGIC, FORMAT, len(head))
+    blob[_PREFIX.size:_PREFIX.size + len(head)] = head
+    blob[start:] = payload
+
+    tmp = path + ".tmp.npy"
+    np.save(tmp, np.frombuffer(bytes(blob), dtype=np.uint8))
+    os.replace(tmp, path)
+    return header
+
+
+def _read_header(buf):
+    if buf.dtype != np.uint8 or buf.ndim != 1 or buf.size < _PREFIX.size:
+        raise BundleError("not a model bundle")
+    magic, fmt, head_len = _PREFIX.unpack(bytes(buf[:_PREFIX.size]))
+    if magic != MAGIC:
+        raise BundleError("not a model bundle")
+    if fmt != FORMAT:
+        raise BundleError(f"unsupported bundle format {fmt} (expected {FORMAT})")
+    try:
+        header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + head_len]))
+    except ValueError as e:
+        raise BundleError(f"corrupt bundle header: {e}")
+    start = _PREFIX.size + head_len
+    return header, start + (-start % ALIGN)
+
+
+def read_checksum(path):
+    """The bundle's checksum from its header, without mapping or verifying the payload."""
+    return _read_header(np.load(path, mmap_mode="r"))[0]["checksum"]
+
+
+def load_bundle(path, verify=True):
+    """Map a bundle file; every array is a read-only view into the same mapping."""
+    buf = np.load(path, mmap_mode="r")
+    header, start = _read_header(buf)
+    payload = buf[start:]
+    if verify:
+        expected = header.pop("checksum")
+        got = _digest(header, memoryview(payload))
+        header["checksum"] = expected
+        if got != expected:
+            raise BundleError(f"checksum mismatch for {path}")
+    arrays = {}
+    for name, (offset, dtype, shape) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        nbytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        if offset + nbytes > payload.size:
+            raise BundleError(f"array {name!r} runs past the end of {path}")
+        arrays[name] = payload[offset:offset + nbytes].view(dtype).reshape(shape)
+    return Bundle(path, header, arrays)
+
+
+def export_bundle(model_dir, out=None):
+    """Write <model_dir>/model_bundle.npy from the joblib artifacts and meta.json there."""
+    import joblib
+    from tree_engine import export_model, FEATURES
+    model = joblib.load(os.path.join(model_dir, "model.joblib"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+    le = joblib.load(os.path.join(model_dir, "label_encoder.joblib"))
+    meta = {}
+    meta_path = os.path.join(model_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    features = meta.get("features", FEATURES)
+    engine = export_model(model, scaler, le, feature_names=features)
+    out = out or os.path.join(model_dir, BUNDLE_FILE)
+    return out, write_bundle(out, engine, scaler, le.classes_, features, meta)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack the trained artifacts into a single memory-mappable bundle")
+    parser.add_argument("--model_dir", type=str, default="./model_artifacts")
+    parser.add_argument("--out", type=str, default=None, help=f"Output file (default: <model_dir>/{BUNDLE_FILE})")
+    parser.add_argument("--verify", action="store_true", help="Reload the bundle and time a cold load")
+    args = parser.parse_args()
+
+    out, header = export_bundle(args.model_dir, args.out)
+    print(f"✅ Wrote {out} ({os.path.getsize(out) / 1e6:.2f} MB, {header['checksum'][:19]}...)")
+    if args.verify:
+        t0 = time.perf_counter()
+        b = load_bundle(out)
+        print(f"Cold load + checksum: {(time.perf_counter() - t0) * 1e3:.2f} ms, "
+              f"{b.engine.roots.size} trees, {len(b.labels.classes_)} classes")
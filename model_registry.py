@@ -0,0 +1,391 @@
+# model_registry.py
+"""
+Process-wide cache of trained artifact sets with hot reload.
+
+get_registry(model_dir) returns one ModelRegistry per directory. current()
+hands out an immutable ArtifactSet; when training writes new files the next
+call notices the changed mtimes, loads the new set and swaps the reference.
+Callers already holding the old set keep using it, so nothing in flight blocks
+or sees a half-loaded model.
+
+A model_bundle.npy at least as new as model.joblib is served on its own (see
+model_bundle.py): no unpickling, and the tree tables stay memory-mapped.
+
+Writers put every file in through a temp file and os.replace (dump_atomic,
+replace_atomic), then commit the set with commit_artifacts(), which replaces
+meta.json last with a manifest of their sha256 digests. The registry loads loose files only when they match that
+manifest (and haven't changed while loading), so a set caught mid-write, e.g. a
+new model.joblib next to the old label encoder, is never served; the current
+set stays in place until the next check. Directories whose meta.json has no
+manifest (older training runs) load as before.
+"""
+import os, json, math, time, hashlib, threading, logging
+from collections import OrderedDict
+import numpy as np
+
+from tree_engine import TreeEnsemble, export_model
+from model_bundle import BUNDLE_FILE, load_bundle, read_checksum
+from telemetry import span
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+# first existing name wins; the .pkl names are from older app builds
+ARTIFACT_FILES = {
+    "model": ["model.joblib", "crop_recommender.pkl"],
+    "scaler": ["scaler.joblib", "scaler.pkl"],
+    "label_encoder": ["label_encoder.joblib", "label_encoder.pkl"],
+    "meta": ["meta.json"],
+    "trees": ["trees.npz"],
+    "bundle": [BUNDLE_FILE],
+}
+CHECK_INTERVAL_S = 2.0  # how often current() stats the files
+KEEP_SETS = 3  # loaded sets kept by content hash (rollbacks reuse them)
+N_FACTORS = 3  # per-prediction factors returned with explain=True
+EXPLAIN_CACHE_SIZE = 4096  # explained single-row results kept per artifact set
+MANIFEST_KEY = "artifacts"  # meta.json: {kind: {"file", "sha256"}} of the committed set
+MANIFEST_KINDS = ("model", "scaler", "label_encoder", "trees")
+
+
+class IncompleteArtifacts(Exception):
+    """The files in a model directory don't match its meta.json manifest (a write is in progress)."""
+
+
+def feature_row(values, features):
+    """
+    Raw feature vector in features order from {feature: value}. Raises
+    ValueError naming any missing, non-numeric or non-finite feature.
+    """
+    missing = [f for f in features if f not in values]
+    if missing:
+        raise ValueError(f"missing feature(s): {', '.join(missing)}")
+    row = []
+    for f in features:
+        try:
+            v = float(values[f])
+        except (TypeError, ValueError):
+            raise ValueError(f"feature {f!r} is not a number: {values[f]!r}") from None
+        if not math.isfinite(v):
+            raise ValueError(f"feature {f!r} is not finite: {values[f]!r}")
+        row.append(v)
+    return row
+
+
+def _resolve(model_dir, prefer_bundle=True):
+    """Return {kind: path} for the artifact files present in model_dir."""
+    found = {}
+    for kind, names in ARTIFACT_FILES.items():
+        for name in names:
+            path = os.path.join(model_dir, name)
+            if os.path.exists(path):
+                found[kind] = path
+                break
+    bundle = found.pop("bundle", None)
+    if bundle and prefer_bundle and ("model" not in found or os.path.getmtime(bundle) >= os.path.getmtime(found["model"])):
+        return {"bundle": bundle}
+    return found
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def replace_atomic(path, write):
+    """Call write(f) on a temp file next to path, then os.replace it over path."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def dump_atomic(obj, path):
+    """joblib.dump through replace_atomic, so readers never see a half-written pickle."""
+    import joblib
+    replace_atomic(path, lambda f: joblib.dump(obj, f))
+
+
+def commit_artifacts(out_dir, meta):
+    """
+    Commit the artifact set already written to out_dir (each file atomically,
+    the bundle last): replace meta.json with meta plus a manifest of the
+    files' digests. Registries serve the loose files only once this is done.
+    Returns the meta that was written.
+    """
+    paths = _resolve(out_dir, prefer_bundle=False)
+    manifest = {kind: {"file": os.path.basename(paths[kind]), "sha256": _file_digest(paths[kind])}
+                for kind in MANIFEST_KINDS if kind in paths}
+    meta = {**meta, MANIFEST_KEY: manifest}
+    replace_atomic(os.path.join(out_dir, "meta.json"), lambda f: f.write(json.dumps(meta, indent=4).encode()))
+    return meta
+
+
+def _check_manifest(paths):
+    """Raise IncompleteArtifacts unless the loose files match meta.json's manifest (bundles check themselves)."""
+    if "bundle" in paths or "meta" not in paths:
+        return
+    with open(paths["meta"]) as f:
+        manifest = json.load(f).get(MANIFEST_KEY)
+    if not manifest:
+        return
+    for kind, entry in manifest.items():
+        path = paths.get(kind)
+        if path is None or os.path.basename(path) != entry["file"] or _file_digest(path) != entry["sha256"]:
+            raise IncompleteArtifacts(f"{kind} does not match meta.json yet (training still writing?)")
+
+
+def _fingerprint(paths):
+    return tuple(sorted((k, p, os.stat(p).st_mtime_ns, os.stat(p).st_size) for k, p in paths.items()))
+
+
+def _content_hash(paths):
+    if "bundle" in paths:
+        return read_checksum(paths["bundle"]).split(":", 1)[-1]
+    h = hashlib.sha256()
+    for kind in sorted(paths):
+        if kind == "trees":  # derived from the model, not part of its identity
+            continue
+        h.update(kind.encode())
+        with open(paths[kind], "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+class ArtifactSet:
+    """
+    One loaded (model, scaler, label_encoder, meta) set. Treat as read-only.
+    From a bundle, model/scaler/le are the light stand-ins in model_bundle.
+    """
+
+    def __init__(self, model, scaler, le, meta, engine, content_hash, load_seconds, paths):
+        self.model = model
+        self.scaler = scaler
+        self.le = le
+        self.meta = meta
+        self.engine = engine
+        self.content_hash = content_hash
+        self.version = str(meta.get("version") or content_hash[:12])
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.paths = paths
+        self.features = meta.get("features", DEFAULT_FEATURES)
+        self._explained = OrderedDict()  # feature tuple -> (result dict) for explained single rows
+        self._explained_lock = threading.Lock()
+
+    def as_tuple(self):
+        return self.model, self.scaler, self.le, self.meta
+
+    def predict_proba(self, X):
+        """Probabilities for raw (unscaled) feature rows in FEATURES order."""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if self.engine is not None:
+            with span("tree_engine_predict"):  # scaler is folded into the thresholds
+                return self.engine.predict_proba(X)
+        if self.model is None:
+            raise FileNotFoundError(f"No model artifact found (looked for {ARTIFACT_FILES['model']})")
+        with span("scaler_transform"):
+            Xs = self.scaler.transform(X) if self.scaler is not None else X
+        with span("predict_proba"):
+            return self.model.predict_proba(Xs)
+
+    def contributions(self, X, cls=None):
+        """
+        Raw-score contributions of each feature to class cls[i] (default: the
+        predicted class) for raw feature rows: (n_rows, n_features + 1) with the
+        expected value last, plus the class indices. Uses the tree tables, or
+        LightGBM's pred_contrib (much slower) when they are unavailable.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if self.engine is not None and self.engine.node_value is not None:
+            with span("contributions"):
+                return self.engine.contributions(X, cls)
+        if self.model is None:
+            raise FileNotFoundError(f"No model artifact found (looked for {ARTIFACT_FILES['model']})")
+        Xs = self.scaler.transform(X) if self.scaler is not None else X
+        if cls is None:
+            cls = self.model.predict_proba(Xs).argmax(axis=1)
+        cls = np.broadcast_to(np.asarray(cls, dtype=np.int64), (X.shape[0],))
+        width = X.shape[1] + 1
+        native = np.asarray(self.model.predict(Xs, pred_contrib=True)).reshape(X.shape[0], -1, width)
+        return native[np.arange(X.shape[0]), cls], np.asarray(cls)
+
+    def factors(self, contrib_row, n=N_FACTORS):
+        """[(feature, contribution)] pushing hardest toward the class, strongest first."""
+        vals = contrib_row[:len(self.features)]
+        order = np.argsort(-vals, kind="stable")[:n]
+        return [(self.features[i], round(float(vals[i]), 4)) for i in order]
+
+    def rank(self, probs, top_k=3, contrib=None, n_factors=N_FACTORS):
+        """
+        Turn a (n_rows, n_classes) probability matrix into per-row result dicts.
+        With contrib (from contributions()), each dict also gets "factors".
+        """
+        probs = np.atleast_2d(probs)
+        top_k = max(1, min(int(top_k), probs.shape[1]))
+        order = np.argsort(-probs, axis=1, kind="stable")[:, :top_k]
+        classes = self.le.classes_ if self.le is not None else np.arange(probs.shape[1]).astype(str)
+        out = []
+        for r, (row, idx) in enumerate(zip(probs, order)):
+            res = {
+                "crop": str(classes[idx[0]]),
+                "confidence": float(row[idx[0]]),
+                "top_k": [(str(classes[i]), float(row[i])) for i in idx],
+                "model_version": self.version,
+            }
+            if contrib is not None:
+                res["factors"] = self.factors(contrib[r], n_factors)
+            out.append(res)
+        return out
+
+    def explain_row(self, x, top_k=3):
+        """rank() with factors for one raw feature row, cached per artifact set."""
+        key = (tuple(float(v) for v in x), int(top_k))
+        with self._explained_lock:
+            hit = self._explained.get(key)
+            if hit is not None:
+                self._explained.move_to_end(key)
+                return dict(hit)
+        x = np.asarray([key[0]])
+        probs = self.predict_proba(x)
+        contrib, _ = self.contributions(x, probs.argmax(axis=1))
+        res = self.rank(probs, top_k, contrib)[0]
+        with self._explained_lock:
+            self._explained[key] = res
+            while len(self._explained) > EXPLAIN_CACHE_SIZE:
+                self._explained.popitem(last=False)
+        return dict(res)
+
+    def info(self):
+        return {"version": self.version, "content_hash": self.content_hash,
+                "load_seconds": round(self.load_seconds, 4), "loaded_at": self.loaded_at}
+
+
+def load_artifact_set(model_dir, paths=None, content_hash=None):
+    """
+    Load every artifact in model_dir into a fresh ArtifactSet. Pass
+    content_hash when the caller has already computed it for these paths.
+    """
+    t0 = time.perf_counter()
+    paths = paths if paths is not None else _resolve(model_dir)
+    if "bundle" in paths:
+        b = load_bundle(paths["bundle"])
+        return ArtifactSet(b.model, b.scaler, b.labels, {**b.meta, "features": b.features}, b.engine,
+                           b.checksum.split(":", 1)[-1], time.perf_counter() - t0, paths)
+    import joblib
+    if content_hash is None:
+        content_hash = _content_hash(paths)
+    model = joblib.load(paths["model"]) if "model" in paths else None
+    scaler = joblib.load(paths["scaler"]) if "scaler" in paths else None
+    le = joblib.load(paths["label_encoder"]) if "label_encoder" in paths else None
+    meta = {}
+    if "meta" in paths:
+        with open(paths["meta"]) as f:
+            meta = json.load(f)
+    engine = None
+    if model is not None:
+        features = meta.get("features", DEFAULT_FEATURES)
+        trees = paths.get("trees")
+        if trees and os.path.getmtime(trees) >= os.path.getmtime(paths["model"]):
+            engine = TreeEnsemble.load(trees)
+        if engine is None or engine.node_value is None:  # missing, stale, or from before contributions
+            try:
+                engine = export_model(model, scaler, le, feature_names=features)
+            except ValueError as e:
+                log.warning("Tree export unavailable, using %s directly: %s", type(model).__name__, e)
+    return ArtifactSet(model, scaler, le, meta, engine, content_hash, time.perf_counter() - t0, paths)
+
+
+class ModelRegistry:
+    def __init__(self, model_dir, check_interval=CHECK_INTERVAL_S):
+        self.model_dir = model_dir
+        self.check_interval = check_interval
+        self._current = None
+        self._fingerprint = None
+        self._by_hash = {}
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def current(self):
+        """Return the newest loaded ArtifactSet, reloading if training output changed."""
+        now = time.monotonic()
+        if self._current is None or now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._maybe_reload(block=self._current is None)
+        return self._current
+
+    def _maybe_reload(self, block):
+        # Only one thread reloads; the others keep serving the current set.
+        if not self._reload_lock.acquire(blocking=block):
+            return
+        try:
+            paths = _resolve(self.model_dir)
+            fp = _fingerprint(paths)
+            if fp == self._fingerprint:
+                return
+            try:
+                _check_manifest(paths)
+                content_hash = _content_hash(paths)
+                new = self._by_hash.get(content_hash) or load_artifact_set(self.model_dir, paths, content_hash)
+                if _fingerprint(_resolve(self.model_dir)) != fp:
+                    raise IncompleteArtifacts("files changed while loading")
+            except IncompleteArtifacts as e:
+                log.info("Artifacts in %s not committed yet: %s", self.model_dir, e)
+                if self._current is None:
+                    raise
+                return
+            except Exception as e:
+                # e.g. training is still writing the files; retry on the next check
+                log.warning("Could not load artifacts from %s: %s", self.model_dir, e)
+                if self._current is None:
+                    raise
+                return
+            self._by_hash.pop(new.content_hash, None)
+            self._by_hash[new.content_hash] = new
+            while len(self._by_hash) > KEEP_SETS:
+                self._by_hash.pop(next(iter(self._by_hash)))
+            self._fingerprint = fp
+            if self._current is None or new.content_hash != self._current.content_hash:
+                log.info("Serving model version %s (loaded in %.3fs)", new.version, new.load_seconds)
+            self._current = new  # atomic reference swap
+        finally:
+            self._reload_lock.release()
+
+    def reload(self):
+        """Force a check of the files now, waiting for any reload in progress."""
+        self._last_check = time.monotonic()
+        self._maybe_reload(block=True)
+        return self._current
+
+    def predict(self, values, top_k=3, explain=False):
+        """
+        Score one row given as {feature: value}. Returns a dict with crop,
+        confidence, top_k [(crop, prob), ...] and the model_version that served it;
+        explain=True adds "factors" [(feature, contribution), ...] for that crop.
+        Raises ValueError if a feature is missing or not a number.
+        """
+        art = self.current()
+        x = feature_row(values, art.features)
+        if explain:
+            return art.explain_row(x, top_k)
+        return art.rank(art.predict_proba(np.array([x])), top_k)[0]
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(model_dir="./model_artifacts"):
+    """Return the process-wide ModelRegistry for model_dir."""
+    key = os.path.abspath(model_dir)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(model_dir)
+        return _registries[key]
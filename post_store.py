@@ -0,0 +1,127 @@
+# post_store.py
+"""
+Local SQLite store (WAL mode) for Community Hub posts and Support Desk messages.
+
+Appends are single-row INSERTs, writers from several Streamlit sessions are
+serialized by SQLite instead of overwriting each other's JSON, and the feed
+reads only the newest page through the primary-key index. The old
+community_posts.json / support_messages.json files are imported once on first
+open.
+"""
+import os, json, time, sqlite3, threading
+
+DB_PATH = "app_data.db"
+PAGE_SIZE = 20
+
+TABLES = {
+    "community_posts": ["name", "post"],
+    "support_messages": ["name", "phone", "message", "city"],
+}
+LEGACY_JSON = {
+    # table -> (file, newest_first)
+    "community_posts": ("community_posts.json", True),
+    "support_messages": ("support_messages.json", False),
+}
+
+
+class PostStore:
+    def __init__(self, db_path=DB_PATH, migrate_from="."):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            for table, cols in TABLES.items():
+                col_defs = ", ".join(f"{c} TEXT" for c in cols)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                             f"(id INTEGER PRIMARY KEY AUTOINCREMENT, {col_defs}, created_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, applied_at REAL)")
+        if migrate_from is not None:
+            self.migrate_json(migrate_from)
+
+    def _conn(self):
+        # sqlite3 connections are per thread; Streamlit runs sessions on several threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, table, row):
+        cols = TABLES[table]
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                f"INSERT INTO {table} ({', '.join(cols)}, created_at) VALUES ({', '.join('?' * (len(cols) + 1))})",
+                [row.get(c) for c in cols] + [row.get("created_at", time.time())])
+        return cur.lastrowid
+
+    def _latest(self, table, limit, before_id):
+        """Newest-first page; pass the returned cursor as before_id for the next page."""
+        sql = f"SELECT * FROM {table}"
+        args = []
+        if before_id is not None:
+            sql += " WHERE id < ?"
+            args.append(int(before_id))
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(int(limit))
+        rows = [dict(r) for r in self._conn().execute(sql, args)]
+        cursor = rows[-1]["id"] if len(rows) == limit else None
+        return rows, cursor
+
+    # --- community hub ---
+    def add_post(self, name, post):
+        return self._insert("community_posts", {"name": name, "post": post})
+
+    def latest_posts(self, limit=PAGE_SIZE, before_id=None):
+        return self._latest("community_posts", limit, before_id)
+
+    # --- support desk ---
+    def add_support_message(self, name, phone, message, city="unknown"):
+        return self._insert("support_messages", {"name": name, "phone": phone, "message": message, "city": city})
+
+    def latest_support_messages(self, limit=PAGE_SIZE, before_id=None):
+        return self._latest("support_messages", limit, before_id)
+
+    # --- one-time import of the old JSON files ---
+    def migrate_json(self, base_dir="."):
+        conn = self._conn()
+        for table, (fname, newest_first) in LEGACY_JSON.items():
+            path = os.path.join(base_dir, fname)
+            if not os.path.exists(path):
+                continue
+            with conn:
+                # BEGIN IMMEDIATE so two processes starting together import only once
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (fname,)).fetchone():
+                    continue
+                try:
+                    with open(path) as f:
+                        records = json.load(f)
+                except (OSError, ValueError):
+                    records = []
+                if newest_first:
+                    records = records[::-1]
+                cols = TABLES[table]
+                now = time.time()
+                rows = [[r.get(c) for c in cols] + [now] for r in records
+                        if isinstance(r, dict) and any(r.get(c) for c in cols)]
+                conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(cols)}, created_at) VALUES ({', '.join('?' * (len(cols) + 1))})",
+                    rows)
+                conn.execute("INSERT INTO migrations VALUES (?, ?)", (fname, now))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(db_path=DB_PATH):
+    """Return the process-wide PostStore (kept across Streamlit reruns)."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.db_path != db_path:
+            _store = PostStore(db_path)
+        return _store
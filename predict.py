@@ -1,51 +1,178 @@
 print("✅ predict.py started")
-import joblib
-import numpy as np
 import argparse
-import json
-import os
+from telemetry import span
 
-# Load artifacts
+# numpy/pandas and the model load on first use, so `--help` and other
+# short-lived callers don't pay for them.
 model_dir = "./model_artifacts"
-model = joblib.load(os.path.join(model_dir, "model.joblib"))
-scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
-le = joblib.load(os.path.join(model_dir, "label_encoder.joblib"))
+registry = None  # ModelRegistry for model_dir; assign one to serve another directory
+BATCH_CHUNKSIZE = 200_000
 
-with open(os.path.join(model_dir, "meta.json"), "r") as f:
-    meta = json.load(f)
+def _registry():
+    """Artifacts are cached per process and reloaded when training writes new ones."""
+    global registry
+    if registry is None:
+        from model_registry import get_registry
+        registry = get_registry(model_dir)
+    return registry
 
-def predict_crop(N, P, K, temperature, humidity, ph, rainfall):
+def __getattr__(name):
+    # meta / FEATURES used to be loaded at import time
+    if name == "meta":
+        return _registry().current().meta
+    if name == "FEATURES":
+        return _registry().current().features
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def predict_crop(N, P, K, temperature, humidity, ph, rainfall, explain=False):
     """
     Predict the best crop given soil & weather inputs.
+    Returns (crop, confidence), or (crop, confidence, factors) with explain=True,
+    where factors lists the [(feature, contribution)] that pushed hardest toward the crop.
+    """
+    # Prepare input (raw values; the tree tables fold in the scaler)
+    values = {"N": N, "P": P, "K": K, "temperature": temperature, "humidity": humidity, "ph": ph, "rainfall": rainfall}
+    with span("predict_crop"):
+        result = _registry().predict(values, top_k=1, explain=explain)
+    if explain:
+        return result["crop"], round(result["confidence"], 3), result["factors"]
+    return result["crop"], round(result["confidence"], 3)
+
+# --- batch scoring ---
+def predict_batch(df, top_k=3, n_jobs=-1, explain=False, n_factors=None):
     """
-    # Prepare input
-    features = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
-    features_scaled = scaler.transform(features)
+    Score a DataFrame holding the FEATURES columns.
+    Returns a DataFrame with crop, confidence, model_version and top{i}_crop /
+    top{i}_conf columns. explain=True adds factor{i} / factor{i}_contrib (the
+    features that pushed hardest toward the predicted crop); it is off by
+    default so existing consumers keep the same columns and throughput.
+    n_factors defaults to model_registry.N_FACTORS.
+    """
+    import numpy as np
+    import pandas as pd
+    from model_registry import N_FACTORS
+    art = _registry().current()
+    with span("batch_scaler_transform"):
+        X = art.scaler.transform(df[art.features].astype(float))
+    # one pass over the trees for the whole chunk, on all cores
+    with span("batch_predict_proba"):
+        probs = art.model.predict_proba(X, num_threads=0 if n_jobs == -1 else n_jobs)
+
+    top_k = max(1, min(int(top_k), probs.shape[1]))
+    top_idx = np.argsort(-probs, axis=1, kind="stable")[:, :top_k]
+    top_conf = np.take_along_axis(probs, top_idx, axis=1)
+    classes = np.asarray(art.le.classes_)
 
-    # Predict
-    prediction = model.predict(features_scaled)[0]
-    crop = le.inverse_transform([prediction])[0]
+    out = pd.DataFrame(index=df.index)
+    out["crop"] = classes[top_idx[:, 0]]
+    out["confidence"] = np.round(top_conf[:, 0], 3)
+    out["model_version"] = art.version
+    for i in range(top_k):
+        out[f"top{i + 1}_crop"] = classes[top_idx[:, i]]
+        out[f"top{i + 1}_conf"] = np.round(top_conf[:, i], 3)
+    if explain:
+        contrib, _ = art.contributions(df[art.features].to_numpy(dtype=float), top_idx[:, 0])
+        feats = np.asarray(art.features)
+        n_factors = max(1, min(int(n_factors or N_FACTORS), len(feats)))
+        order = np.argsort(-contrib[:, :len(feats)], axis=1, kind="stable")[:, :n_factors]
+        vals = np.take_along_axis(contrib, order, axis=1)
+        for i in range(n_factors):
+            out[f"factor{i + 1}"] = feats[order[:, i]]
+            out[f"factor{i + 1}_contrib"] = np.round(vals[:, i], 3)
+    return out
 
-    # Predict probability for confidence
-    probs = model.predict_proba(features_scaled)[0]
-    confidence = np.max(probs)
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
 
-    return crop, round(float(confidence), 3)
+def iter_chunks(path, chunksize=BATCH_CHUNKSIZE):
+    """Yield DataFrame chunks from a CSV or Parquet file without loading it whole."""
+    import pandas as pd
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+def score_file(in_path, out_path, top_k=3, chunksize=BATCH_CHUNKSIZE, n_jobs=-1, explain=False):
+    """
+    Stream in_path (CSV/Parquet) through predict_batch chunk by chunk and write
+    the input columns plus predictions to out_path (factor columns only with
+    explain=True). Returns the number of rows scored.
+
+    One process scores a few thousand rows/s per core (see score_file_rows_per_s
+    in benchmarks/baselines.json). Only predict_proba uses more than one thread;
+    parsing and writing do not. For bulk jobs, split the input into shards and
+    run one process per core. Each shard is independent, so throughput grows
+    with the core count at best.
+    """
+    import pandas as pd
+    writer = None
+    n_rows = 0
+    try:
+        for i, chunk in enumerate(iter_chunks(in_path, chunksize)):
+            preds = predict_batch(chunk, top_k=top_k, n_jobs=n_jobs, explain=explain)
+            scored = pd.concat([chunk.drop(columns=preds.columns, errors="ignore"), preds], axis=1)
+            if _is_parquet(out_path):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(scored, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+            else:
+                scored.to_csv(out_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            n_rows += len(scored)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Crop Recommendation Prediction")
-    parser.add_argument("--N", type=float, required=True, help="Nitrogen value")
-    parser.add_argument("--P", type=float, required=True, help="Phosphorous value")
-    parser.add_argument("--K", type=float, required=True, help="Potassium value")
-    parser.add_argument("--temperature", type=float, required=True, help="Temperature (°C)")
-    parser.add_argument("--humidity", type=float, required=True, help="Humidity (%)")
-    parser.add_argument("--ph", type=float, required=True, help="Soil pH")
-    parser.add_argument("--rainfall", type=float, required=True, help="Rainfall (mm)")
+    parser.add_argument("--N", type=float, help="Nitrogen value")
+    parser.add_argument("--P", type=float, help="Phosphorous value")
+    parser.add_argument("--K", type=float, help="Potassium value")
+    parser.add_argument("--temperature", type=float, help="Temperature (°C)")
+    parser.add_argument("--humidity", type=float, help="Humidity (%%)")
+    parser.add_argument("--ph", type=float, help="Soil pH")
+    parser.add_argument("--rainfall", type=float, help="Rainfall (mm)")
+    parser.add_argument("--batch", type=str, help="Score a CSV/Parquet file instead of a single row")
+    parser.add_argument("--out", type=str, help="Output CSV/Parquet path for --batch")
+    parser.add_argument("--top_k", type=int, default=3, help="Number of ranked crops per row")
+    parser.add_argument("--chunksize", type=int, default=BATCH_CHUNKSIZE, help="Rows per chunk for --batch")
+    parser.add_argument("--n_jobs", type=int, default=-1, help="Threads for scoring (-1 = all cores)")
+    parser.add_argument("--explain", action="store_true", help="Add factor{i} / factor{i}_contrib columns to --batch output")
+    parser.add_argument("--no_explain", action="store_true", help="Skip the top factors line for a single row")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import and initialization cost per module in a fresh process, then exit")
 
     args = parser.parse_args()
 
-    crop, confidence = predict_crop(args.N, args.P, args.K, args.temperature, args.humidity, args.ph, args.rainfall)
+    if args.profile_startup:
+        from startup_profile import main as profile_startup
+        raise SystemExit(profile_startup(["predict"]))
+
+    if args.batch:
+        if not args.out:
+            parser.error("--out is required with --batch")
+        n = score_file(args.batch, args.out, top_k=args.top_k, chunksize=args.chunksize, n_jobs=args.n_jobs,
+                       explain=args.explain)
+        print(f"\n🌱 Scored {n} rows -> {args.out}")
+    else:
+        single = [args.N, args.P, args.K, args.temperature, args.humidity, args.ph, args.rainfall]
+        if any(v is None for v in single):
+            parser.error("--N, --P, --K, --temperature, --humidity, --ph and --rainfall are required")
+
+        if args.no_explain:
+            crop, confidence = predict_crop(*single)
+            factors = []
+        else:
+            crop, confidence, factors = predict_crop(*single, explain=True)
 
-    print(f"\n🌱 Recommended Crop: {crop}")
-    print(f"✅ Confidence: {confidence * 100:.2f}%")
-    print(f"(Model accuracy on test set: {meta['accuracy'] * 100:.2f}%)")
+        print(f"\n🌱 Recommended Crop: {crop}")
+        print(f"✅ Confidence: {confidence * 100:.2f}%")
+        if factors:
+            print("🔎 Top factors: " + ", ".join(f"{f} ({v:+.2f})" for f, v in factors))
+        art = _registry().current()
+        print(f"(Model accuracy on test set: {art.meta['accuracy'] * 100:.2f}%, version {art.version})")
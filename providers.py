@@ -0,0 +1,321 @@
+# providers.py
+"""
+Swappable weather, geocoding and soil sources, with a record/replay pair for
+load tests and offline runs.
+
+Every external source already sits behind one of two seams:
+
+- HTTP (OpenWeather onecall + geocoding, Open-Meteo forecast + climate) goes
+  through http_client.get_client().get_json(); http_client.set_client()
+  swaps the client.
+- Soil goes through utils.fetch_soilgrids_local[_many]; utils.set_soil_provider()
+  swaps in anything with soil(lat, lon) -> {"phh2o", "soc", "clay"}.
+
+RecordingClient / RecordingSoil call the live source and append every answer
+to a cassette (JSONL, API keys stripped). ReplayClient / ReplaySoil answer
+from a cassette without touching the network: an exact (URL, params) match
+first, else the nearest recorded location for the same URL and other params.
+Open-Meteo daily series are re-dated to the requested days, so a cassette
+recorded last month still reads as a forecast from today. With synthetic=True
+(the default) anything the cassette can't answer gets a deterministic,
+plausible generated body instead of an error, so replay also works with no
+cassette at all.
+
+Replay runs inside the real HttpClient (cache, single-flight, retries), and
+Latency adds per-call delay and injected connection failures to it.
+
+    from providers import Cassette, ReplayClient, ReplaySoil, Latency, installed
+    tape = Cassette.load("data/cassette.jsonl")
+    with installed(ReplayClient(tape, Latency(80, 40, error_rate=0.01)), ReplaySoil(tape)):
+        ...
+"""
+import json, time, zlib, random, datetime, threading, contextlib
+from urllib.parse import urlparse
+
+from http_client import HttpClient, COORD_KEYS, set_client, cell_key
+from telemetry import http_span
+
+DATE_KEYS = ("forecast_days", "start_date", "end_date")
+SECRET_KEYS = ("appid",)
+SOIL_LAYERS = ("phh2o", "soc", "clay")
+
+
+def _coords(params):
+    lat = params.get("lat", params.get("latitude"))
+    lon = params.get("lon", params.get("longitude"))
+    return (float(lat), float(lon)) if lat is not None and lon is not None else None
+
+
+def _shape(url, params):
+    """Bucket for nearest-location matching: URL plus every param that isn't a coordinate, date or key."""
+    skip = COORD_KEYS + DATE_KEYS + SECRET_KEYS
+    return url, tuple(sorted((k, str(v)) for k, v in params.items() if k not in skip))
+
+
+def _nearest(rows, point):
+    """Body of the row (lat, lon, body) closest to point (degrees, flat-earth is fine at this scale)."""
+    if point is None:
+        return rows[-1][2]
+    lat, lon = point
+    return min(rows, key=lambda r: (r[0] - lat) ** 2 + (r[1] - lon) ** 2)[2]
+
+
+# -------------------------------
+# Cassette
+# -------------------------------
+class Cassette:
+    """Recorded responses, appended to a JSONL file as they arrive when path is set."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._exact = {}   # HttpClient.cache_key minus secrets -> body
+        self._http = {}    # _shape -> [(lat, lon, body)]
+        self._soil = []    # [(lat, lon, body)]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Read a cassette; further recordings are appended to the same file."""
+        tape = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                if rec.get("kind") == "soil":
+                    tape.add_soil(rec["lat"], rec["lon"], rec["body"])
+                else:
+                    tape.add_http(rec["url"], rec["params"], rec["body"])
+        tape.path = path
+        return tape
+
+    def __len__(self):
+        return len(self._exact) + len(self._soil)
+
+    def _append(self, record):
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def add_http(self, url, params, body):
+        params = {k: v for k, v in params.items() if k not in SECRET_KEYS}
+        point = _coords(params)
+        with self._lock:
+            self._exact[HttpClient.cache_key(url, params)] = body
+            self._http.setdefault(_shape(url, params), []).append((*(point or (0.0, 0.0)), body))
+            self._append({"kind": "http", "url": url, "params": params, "body": body})
+
+    def add_soil(self, lat, lon, body):
+        with self._lock:
+            self._soil.append((float(lat), float(lon), body))
+            self._append({"kind": "soil", "lat": float(lat), "lon": float(lon), "body": body})
+
+    def match_http(self, url, params):
+        """(body, "exact" | "nearest") for a request, or (None, None)."""
+        public = {k: v for k, v in params.items() if k not in SECRET_KEYS}
+        body = self._exact.get(HttpClient.cache_key(url, public))
+        if body is not None:
+            return body, "exact"
+        rows = self._http.get(_shape(url, public))
+        if rows:
+            return _nearest(rows, _coords(public)), "nearest"
+        return None, None
+
+    def match_soil(self, lat, lon):
+        return _nearest(self._soil, (lat, lon)) if self._soil else None
+
+
+# -------------------------------
+# Latency / failure injection
+# -------------------------------
+class Latency:
+    """
+    Per-call delay of ms plus an exponential tail with mean jitter_ms, and an
+    error_rate share of calls failing with requests.ConnectionError.
+    """
+
+    def __init__(self, ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self.ms = float(ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, what):
+        with self._lock:
+            delay = self.ms + (self._rng.expovariate(1.0 / self.jitter_ms) if self.jitter_ms > 0 else 0.0)
+            fail = self._rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if fail:
+            import requests
+            raise requests.ConnectionError(f"injected failure: {what}")
+
+
+# -------------------------------
+# Synthetic answers
+# -------------------------------
+MONSOON_MM = (12, 8, 6, 3, 10, 140, 360, 310, 190, 40, 12, 6)
+
+
+def _rng(*key):
+    """Deterministic Random per key, so a cell always gets the same synthetic weather."""
+    return random.Random(zlib.crc32(repr(key).encode()))
+
+
+def synthetic_response(url, params):
+    """Generated body shaped like the real API's answer, or None for an unknown URL."""
+    point = _coords(params) or (0.0, 0.0)
+    cell = cell_key(*point)
+    host, path = urlparse(url).netloc, urlparse(url).path
+    if "climate" in host:
+        scale = _rng("climate", cell).uniform(0.6, 1.4)
+        return {"monthly": {"precipitation_sum": [round(mm * scale, 1) for mm in MONSOON_MM]}}
+    if "open-meteo" in host:
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        start = datetime.date.fromisoformat(params["start_date"]) if params.get("start_date") else today
+        if params.get("end_date"):
+            n = (datetime.date.fromisoformat(params["end_date"]) - start).days + 1
+        else:
+            n = int(params.get("forecast_days", 7))
+        days = [start + datetime.timedelta(days=i) for i in range(max(n, 0))]
+        precip = []
+        for d in days:
+            r = _rng("rain", cell, d.isoformat())
+            precip.append(round(r.expovariate(1 / 15.0), 1) if r.random() < 0.3 else 0.0)
+        return {"daily": {"time": [d.isoformat() for d in days], "precipitation_sum": precip}}
+    if path.endswith("/geo/1.0/direct"):
+        return []  # unknown place; the gazetteer answers the known ones
+    if path.endswith("/onecall"):
+        r = _rng("weather", cell)
+        base = r.uniform(18.0, 32.0)
+        return {"daily": [{"temp": {"day": round(base + r.uniform(-2, 2), 1)},
+                           "humidity": r.randint(35, 90),
+                           "rain": round(r.expovariate(1 / 4.0), 1) if r.random() < 0.4 else 0.0}
+                          for _ in range(8)]}
+    return None
+
+
+def synthetic_soil(lat, lon):
+    r = _rng("soil", cell_key(lat, lon))
+    return {"phh2o": round(r.uniform(5.5, 8.2), 2), "soc": round(r.uniform(4.0, 25.0), 1),
+            "clay": round(r.uniform(12.0, 48.0), 1)}
+
+
+def _redate(body, params):
+    """
+    Shift a recorded Open-Meteo daily series so it starts at the requested day
+    (start_date, else today UTC) and has the requested length.
+    """
+    daily = body.get("daily") if isinstance(body, dict) else None
+    if not isinstance(daily, dict) or not daily.get("time"):
+        return body
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    start = datetime.date.fromisoformat(params["start_date"]) if params.get("start_date") else today
+    if params.get("end_date"):
+        n = (datetime.date.fromisoformat(params["end_date"]) - start).days + 1
+    else:
+        n = int(params.get("forecast_days", len(daily["time"])))
+    first = max((start - today).days, 0)
+    length = len(daily["time"])
+    out = {k: (v[first:first + n] if isinstance(v, list) and len(v) == length else v) for k, v in daily.items()}
+    out["time"] = [(start + datetime.timedelta(days=i)).isoformat() for i in range(len(out["time"]))]
+    return {**body, "daily": out}
+
+
+# -------------------------------
+# HTTP clients
+# -------------------------------
+class RecordingClient(HttpClient):
+    """Live HttpClient that also writes every response it fetches to a cassette."""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def _request(self, url, params, timeout):
+        body = super()._request(url, params, timeout)
+        self.cassette.add_http(url, params, body)
+        return body
+
+
+class ReplayClient(HttpClient):
+    """HttpClient whose transport answers from a cassette (and synthetic bodies) instead of the network."""
+
+    def __init__(self, cassette=None, latency=None, synthetic=True, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.latency = latency
+        self.synthetic = synthetic
+        self._replay = {"exact": 0, "nearest": 0, "synthetic": 0, "unmatched": 0}
+
+    def _request(self, url, params, timeout):
+        import requests
+        with http_span(urlparse(url).netloc):
+            if self.latency is not None:
+                self.latency(url)
+            body, how = self.cassette.match_http(url, params) if self.cassette is not None else (None, None)
+            if body is None and self.synthetic:
+                body, how = synthetic_response(url, params), "synthetic"
+            with self._lock:
+                self._replay[how if body is not None else "unmatched"] += 1
+        if body is None:
+            raise requests.ConnectionError(f"no recording for {url}")
+        return _redate(body, params)
+
+    def stats(self):
+        out = super().stats()
+        with self._lock:
+            out.update({f"replay_{k}": v for k, v in self._replay.items()})
+        return out
+
+
+# -------------------------------
+# Soil
+# -------------------------------
+class RecordingSoil:
+    """Local grid / raster soil lookups, each answer also written to a cassette."""
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def soil(self, lat, lon):
+        from utils import read_local_soil
+        body = read_local_soil(lat, lon)
+        self.cassette.add_soil(lat, lon, body)
+        return body
+
+
+class ReplaySoil:
+    """Soil from the nearest recorded point, else synthetic (or the local grid with synthetic=False)."""
+
+    def __init__(self, cassette=None, latency=None, synthetic=True):
+        self.cassette = cassette
+        self.latency = latency
+        self.synthetic = synthetic
+
+    def soil(self, lat, lon):
+        if self.latency is not None:
+            self.latency("soil")
+        body = self.cassette.match_soil(lat, lon) if self.cassette is not None else None
+        if body is not None:
+            return dict(body)
+        if self.synthetic:
+            return synthetic_soil(lat, lon)
+        from utils import read_local_soil
+        return read_local_soil(lat, lon)
+
+
+@contextlib.contextmanager
+def installed(client=None, soil=None):
+    """Route HTTP through client and soil through soil (either may be None) for the block."""
+    import utils
+    prev_client = set_client(client) if client is not None else None
+    prev_soil = utils.set_soil_provider(soil) if soil is not None else None
+    try:
+        yield
+    finally:
+        if client is not None:
+            set_client(prev_client)
+        if soil is not None:
+            utils.set_soil_provider(prev_soil)
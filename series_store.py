@@ -0,0 +1,149 @@
+# series_store.py
+"""
+Local SQLite store (WAL mode) for Open-Meteo precipitation series, keyed by
+location cell (the round_coord grid) and date.
+
+- climatology: the 1991-2020 monthly normals, fetched once per cell and kept.
+- forecast: daily precipitation per forecast issue (FORECAST_TTL-wide blocks
+  of wall time). Within one issue a cell only ever fetches days it doesn't
+  hold yet; rows from older issues are pruned when a newer one is written.
+
+app_risk reads through this store, so repeated and nearby (same-cell) risk
+queries do no network I/O. Rows this process has read or written are also
+kept in memory (climatology per cell, forecasts for the current issue only),
+so warm queries don't touch SQLite either.
+"""
+import os, time, sqlite3, threading
+
+from http_client import cell_key, FORECAST_TTL
+
+DB_PATH = "data/series.db"
+
+
+def current_issue(now=None, period=FORECAST_TTL):
+    """Start (epoch seconds) of the forecast issue window containing now."""
+    now = time.time() if now is None else now
+    return int(now // period) * period
+
+
+class SeriesStore:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._pruned_issue = None
+        self._clim = {}       # cell -> {month: mm}
+        self._fc = {}         # cell -> {day: mm}, current issue only
+        self._fc_issue = None
+        self._mem_lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS climatology "
+                         "(lat_cell INTEGER, lon_cell INTEGER, month INTEGER, precip_mm REAL, fetched_at REAL, "
+                         "PRIMARY KEY (lat_cell, lon_cell, month)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS forecast "
+                         "(lat_cell INTEGER, lon_cell INTEGER, issued INTEGER, day TEXT, precip_mm REAL, "
+                         "PRIMARY KEY (lat_cell, lon_cell, issued, day)) WITHOUT ROWID")
+
+    def _conn(self):
+        # sqlite3 connections are per thread; risk fetches run on a thread pool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- climatology ---
+    def get_climatology(self, lat, lon):
+        """{month: mm} for the cell, or None if it was never stored."""
+        key = cell_key(lat, lon)
+        monthly = self._clim.get(key)
+        if monthly is not None:
+            return monthly
+        rows = self._conn().execute(
+            "SELECT month, precip_mm FROM climatology WHERE lat_cell = ? AND lon_cell = ?", key).fetchall()
+        if len(rows) != 12:
+            return None
+        monthly = self._clim[key] = {m: p for m, p in rows}
+        return monthly
+
+    def put_climatology(self, lat, lon, monthly):
+        key = cell_key(lat, lon)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO climatology VALUES (?, ?, ?, ?, ?)",
+                             [(*key, int(m), p, now) for m, p in monthly.items()])
+        self._clim[key] = {int(m): p for m, p in monthly.items()}
+
+    # --- forecast ---
+    def get_forecast(self, lat, lon, issued, days):
+        """[(day, mm)] stored for this issue, for the given ISO days, stopping at the first gap."""
+        if not days:
+            return []
+        key = cell_key(lat, lon)
+        rows = self._fc.get(key) if self._fc_issue == issued else None
+        if rows is None or days[-1] not in rows:
+            rows = dict(self._conn().execute(
+                "SELECT day, precip_mm FROM forecast WHERE lat_cell = ? AND lon_cell = ? AND issued = ? "
+                "AND day BETWEEN ? AND ?", (*key, int(issued), days[0], days[-1])).fetchall())
+            self._remember(key, issued, rows)
+        out = []
+        for day in days:
+            if day not in rows:
+                break
+            out.append((day, rows[day]))
+        return out
+
+    def put_forecast(self, lat, lon, issued, series):
+        """Store [(day, mm), ...] for one issue and drop rows from older issues."""
+        key = cell_key(lat, lon)
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO forecast VALUES (?, ?, ?, ?, ?)",
+                             [(*key, int(issued), day, mm) for day, mm in series])
+            if self._pruned_issue != issued:
+                conn.execute("DELETE FROM forecast WHERE issued < ?", (int(issued),))
+                self._pruned_issue = issued
+        self._remember(key, issued, dict(series))
+
+    def _remember(self, key, issued, rows):
+        with self._mem_lock:
+            if self._fc_issue is None or issued > self._fc_issue:
+                self._fc = {}
+                self._fc_issue = issued
+            elif issued < self._fc_issue:
+                return
+            self._fc[key] = {**self._fc.get(key, {}), **rows}
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM climatology")
+            conn.execute("DELETE FROM forecast")
+        with self._mem_lock:
+            self._clim.clear()
+            self._fc.clear()
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "climatology_cells": conn.execute(
+                "SELECT COUNT(*) FROM (SELECT DISTINCT lat_cell, lon_cell FROM climatology)").fetchone()[0],
+            "forecast_rows": conn.execute("SELECT COUNT(*) FROM forecast").fetchone()[0],
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_series_store(db_path=DB_PATH):
+    """Return the process-wide SeriesStore for db_path."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.db_path != db_path:
+            _store = SeriesStore(db_path)
+        return _store
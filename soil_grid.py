@@ -0,0 +1,167 @@
+# soil_grid.py
+"""
+Stacked, memory-mapped soil grid for fetch_soilgrids_local.
+
+build_soil_grid() reads the phh2o / soc / clay GeoTIFFs once, resamples them
+onto the first raster's pixel grid, fills nodata holes from the nearest valid
+pixel and writes one float32 array of shape (rows, cols, layers) to
+soil_grid.npy, with the affine transform, CRS and layer names in
+soil_grid.json. SoilGrid opens the .npy with mmap_mode='r', so startup reads
+no pixels and a lookup is two multiply-adds plus an index into the page cache.
+
+    python soil_grid.py            # build soil_rasters/soil_grid.npy from utils.RASTER_FILES
+"""
+import os, json, argparse, threading
+import numpy as np
+
+GRID_DIR = "soil_rasters"
+GRID_FILE = "soil_grid.npy"
+META_FILE = "soil_grid.json"
+
+
+def fill_nearest(band, valid):
+    """
+    Replace every invalid pixel with the value of its nearest valid pixel. A
+    band with no valid pixel at all comes back as all NaN, never as its nodata value.
+    """
+    if valid.all():
+        return band
+    if not valid.any():
+        return np.full(band.shape, np.nan, dtype=band.dtype if band.dtype.kind == "f" else np.float32)
+    from scipy import ndimage
+    _, (rows, cols) = ndimage.distance_transform_edt(~valid, return_indices=True)
+    return band[rows, cols]
+
+
+def build_soil_grid(raster_files=None, out_dir=GRID_DIR, fill=True):
+    """Stack the rasters into <out_dir>/soil_grid.npy + soil_grid.json. Returns the metadata dict."""
+    import rasterio
+    from rasterio.warp import reproject, Resampling
+    if raster_files is None:
+        from utils import RASTER_FILES as raster_files
+
+    layers = list(raster_files)
+    with rasterio.open(raster_files[layers[0]]) as ref:
+        height, width, transform, crs = ref.height, ref.width, ref.transform, ref.crs
+
+    os.makedirs(out_dir, exist_ok=True)
+    grid_path = os.path.join(out_dir, GRID_FILE)
+    tmp_path = grid_path + ".tmp.npy"
+    # pixel-interleaved, so one point's layers are contiguous
+    grid = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(height, width, len(layers)))
+    filled = {}
+    for i, layer in enumerate(layers):
+        with rasterio.open(raster_files[layer]) as src:
+            nodata = src.nodata
+            if (src.height, src.width) == (height, width) and src.transform == transform and src.crs == crs:
+                band = src.read(1).astype(np.float32)
+            else:
+                band = np.full((height, width), np.nan, dtype=np.float32)
+                reproject(rasterio.band(src, 1), band, dst_transform=transform, dst_crs=crs,
+                          dst_nodata=np.nan, resampling=Resampling.nearest)
+        valid = np.isfinite(band)
+        if nodata is not None and not np.isnan(nodata):
+            valid &= band != nodata
+        filled[layer] = int((~valid).sum()) if fill and valid.any() else 0
+        if fill:
+            band = fill_nearest(band, valid)
+        else:
+            band = np.where(valid, band, np.nan)
+        grid[:, :, i] = band
+    grid.flush()
+    del grid
+    os.replace(tmp_path, grid_path)
+
+    meta = {
+        "layers": layers,
+        "shape": [height, width],
+        "transform": list(transform)[:6],
+        "crs": crs.to_string() if crs else None,
+        "filled_pixels": filled,
+        "sources": {k: os.path.basename(v) for k, v in raster_files.items()},
+    }
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=4)
+    return meta
+
+
+class SoilGrid:
+    def __init__(self, data, meta):
+        self.data = data  # (rows, cols, layers), usually a read-only memmap
+        self.meta = meta
+        self.layers = list(meta["layers"])
+        self.rows, self.cols = data.shape[:2]
+        a, b, c, d, e, f = meta["transform"]
+        det = a * e - b * d
+        # inverse affine: (lon, lat) -> (col, row)
+        self._inv = (e / det, -b / det, (b * f - e * c) / det,
+                     -d / det, a / det, (d * c - a * f) / det)
+
+    @classmethod
+    def load(cls, grid_dir=GRID_DIR):
+        with open(os.path.join(grid_dir, META_FILE)) as f:
+            meta = json.load(f)
+        return cls(np.load(os.path.join(grid_dir, GRID_FILE), mmap_mode="r"), meta)
+
+    def pixel(self, lat, lon):
+        """(row, col) for a point, or None outside the grid."""
+        ia, ib, ic, id_, ie, if_ = self._inv
+        col = int((ia * lon + ib * lat + ic) // 1)
+        row = int((id_ * lon + ie * lat + if_) // 1)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def lookup(self, lat, lon):
+        """Layer values at a point as a read-only view (no copy), or None outside the grid."""
+        px = self.pixel(lat, lon)
+        return None if px is None else self.data[px[0], px[1]]
+
+    def lookup_dict(self, lat, lon):
+        vals = self.lookup(lat, lon)
+        if vals is None:
+            return {layer: None for layer in self.layers}
+        return {layer: (float(v) if np.isfinite(v) else None) for layer, v in zip(self.layers, vals.tolist())}
+
+    def lookup_many(self, lats, lons):
+        """(n, layers) float32 array for many points; NaN rows for points outside the grid."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        ia, ib, ic, id_, ie, if_ = self._inv
+        cols = np.floor(ia * lons + ib * lats + ic).astype(np.int64)
+        rows = np.floor(id_ * lons + ie * lats + if_).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        out = np.full((lats.size, len(self.layers)), np.nan, dtype=np.float32)
+        out[inside] = self.data[rows[inside], cols[inside]]
+        return out
+
+
+_grids = {}  # grid_dir -> (mtime, SoilGrid)
+_grids_lock = threading.Lock()
+
+
+def get_soil_grid(grid_dir=GRID_DIR):
+    """Process-wide SoilGrid for grid_dir (reopened when rebuilt), or None if it hasn't been built."""
+    path = os.path.join(grid_dir, GRID_FILE)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _grids.get(grid_dir)
+    if cached is None or cached[0] != mtime:
+        with _grids_lock:
+            cached = _grids.get(grid_dir)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, SoilGrid.load(grid_dir))
+                _grids[grid_dir] = cached
+    return cached[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stack the SoilGrids rasters into a memory-mapped grid")
+    parser.add_argument("--out_dir", type=str, default=GRID_DIR)
+    parser.add_argument("--no_fill", action="store_true", help="Keep nodata as NaN instead of nearest-pixel fill")
+    args = parser.parse_args()
+    meta = build_soil_grid(out_dir=args.out_dir, fill=not args.no_fill)
+    print(f"✅ Built {meta['shape'][0]}x{meta['shape'][1]} grid with layers {meta['layers']} -> {args.out_dir}/{GRID_FILE}")
+    print(f"   nodata pixels filled: {meta['filled_pixels']}")
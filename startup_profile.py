@@ -0,0 +1,142 @@
+# startup_profile.py
+"""
+Where a cold process spends its startup time.
+
+Runs a target's startup steps (import, model load, first request, ...) in a
+fresh interpreter under `python -X importtime`, then reports for each step its
+wall time and which top-level packages it imported, plus the slowest modules
+overall. Import cost is summed from importtime's self column, so nested
+imports are not counted twice.
+
+    python predict.py --profile-startup
+    python inference_server.py --profile-startup
+    python startup_profile.py app              # first headless run of app.py (Streamlit AppTest)
+    python startup_profile.py predict app --top 20
+"""
+import os, sys, json, argparse, subprocess
+
+# target -> [(step label, statement)], run in order in one fresh interpreter
+TARGETS = {
+    "predict": [
+        ("import predict", "import predict"),
+        ("load model", "predict._registry().current()"),
+        ("first prediction", "predict.predict_crop(90, 42, 43, 20.9, 82.0, 6.5, 202.9)"),
+        ("explained prediction", "predict.predict_crop(85, 58, 41, 21.8, 80.3, 7.0, 226.7, explain=True)"),
+    ],
+    "inference_server": [
+        ("import inference_server", "import inference_server"),
+        ("load model", "inference_server.get_registry('./model_artifacts').current()"),
+    ],
+    "app": [
+        ("import streamlit", "import streamlit; from streamlit.testing.v1 import AppTest"),
+        ("first script run", "AppTest.from_file('app.py', default_timeout=120).run()"),
+    ],
+}
+MARK = "@@startup-step "
+HEAVY = ("pandas", "pyarrow", "requests", "rasterio", "joblib", "sklearn", "lightgbm", "scipy")
+
+_CHILD = """
+import sys, time, json
+steps = json.loads(sys.argv[1])
+ns = {}
+timings = []
+for label, stmt in steps:
+    sys.stderr.write(%(mark)r + label + "\\n")
+    sys.stderr.flush()
+    t0 = time.perf_counter()
+    exec(stmt, ns)
+    timings.append([label, time.perf_counter() - t0])
+print(%(mark)r + json.dumps(timings))
+""" % {"mark": MARK}
+
+
+def parse_importtime(stderr):
+    """{step label: [(module, self_us, cumulative_us)]} from -X importtime output split by step markers."""
+    steps, current = {}, None
+    for line in stderr.splitlines():
+        if line.startswith(MARK):
+            current = line[len(MARK):]
+            steps[current] = []
+            continue
+        if not line.startswith("import time:") or current is None:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header row
+        steps[current].append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return steps
+
+
+def by_package(rows):
+    """[(package, self_ms, modules)] summed over top-level packages, costliest first."""
+    totals = {}
+    for module, self_us, _ in rows:
+        pkg = module.split(".")[0]
+        ms, n = totals.get(pkg, (0.0, 0))
+        totals[pkg] = (ms + self_us / 1000.0, n + 1)
+    return sorted(((p, ms, n) for p, (ms, n) in totals.items()), key=lambda r: -r[1])
+
+
+def profile(target, cwd=None):
+    """Run one target in a fresh interpreter; returns (step timings, importtime rows per step)."""
+    steps = TARGETS[target]
+    env = {**os.environ, "PYTHONWARNINGS": "ignore"}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD, json.dumps(steps)],
+                          cwd=cwd or os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True, env=env)
+    timings = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(MARK):
+            timings = json.loads(line[len(MARK):])
+    if proc.returncode != 0 or timings is None:
+        tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"{target} startup failed (exit {proc.returncode}):\n{tail}")
+    return timings, parse_importtime(proc.stderr)
+
+
+def report(target, timings, imports, top=10):
+    total = sum(t for _, t in timings)
+    print(f"\n=== {target}: {total * 1000:.0f} ms to ready ===")
+    print(f"{'step':28} {'wall ms':>9} {'import ms':>10}  packages imported (self ms)")
+    all_rows = []
+    for label, seconds in timings:
+        rows = imports.get(label, [])
+        all_rows += rows
+        pkgs = by_package(rows)
+        imp_ms = sum(ms for _, ms, _ in pkgs)
+        shown = ", ".join(f"{p} {ms:.0f}" for p, ms, _ in pkgs[:5] if ms >= 1.0) or "-"
+        print(f"{label:28} {seconds * 1000:9.1f} {imp_ms:10.1f}  {shown}")
+
+    print(f"\nImport cost by package (top {top}):")
+    for pkg, ms, n in by_package(all_rows)[:top]:
+        print(f"  {pkg:24} {ms:9.1f} ms  ({n} modules)")
+    print(f"\nSlowest modules, cumulative (top {top}):")
+    slowest = {}
+    for module, _, cum in all_rows:
+        slowest[module] = max(cum, slowest.get(module, 0))
+    for module, cum in sorted(slowest.items(), key=lambda r: -r[1])[:top]:
+        print(f"  {module:40} {cum / 1000.0:9.1f} ms")
+    loaded = {m.split(".")[0] for m, _, _ in all_rows}
+    heavy = [h for h in HEAVY if h in loaded]
+    print(f"\nHeavy dependencies loaded: {', '.join(heavy) if heavy else 'none'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import and initialization cost per module for a cold start")
+    parser.add_argument("targets", nargs="*", default=["predict"], choices=list(TARGETS))
+    parser.add_argument("--top", type=int, default=10, help="Rows in the package / module tables")
+    args = parser.parse_args(argv)
+    status = 0
+    for target in args.targets:
+        try:
+            timings, imports = profile(target)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            status = 1
+            continue
+        report(target, timings, imports, top=args.top)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# telemetry.py
+"""
+Lightweight per-stage timing for the recommendation flow.
+
+    from telemetry import span
+    with span("soil_lookup"):
+        ...
+
+Each stage (and each outbound API host, via http_span) gets an in-process
+histogram with fixed Prometheus-style buckets. Timing is off unless
+CROP_TIMING=1 is set or enable() is called (disable() turns it back off);
+while off, span() hands back one shared no-op context manager, so
+instrumented code pays a function call and nothing else.
+
+export_prometheus() renders the text exposition format; write_metrics(path)
+dumps it to a file (also done at exit when CROP_METRICS_FILE is set).
+"""
+import os, time, atexit, bisect, threading, contextlib
+
+# upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_METRIC = "crop_stage_seconds"
+HTTP_METRIC = "crop_http_request_seconds"
+METRIC_HELP = {
+    STAGE_METRIC: "Wall time per recommendation-flow stage",
+    HTTP_METRIC: "Wall time per outbound HTTP request, by host",
+}
+
+ENABLED_BY_ENV = os.getenv("CROP_TIMING", "").lower() in ("1", "true", "yes")
+_enabled = ENABLED_BY_ENV
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.total += seconds
+            self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None if empty)."""
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class _Span:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+        return False
+
+
+_hists = {}  # (metric, label, value) -> Histogram
+_hists_lock = threading.Lock()
+
+
+def _hist(metric, label, value):
+    key = (metric, label, value)
+    h = _hists.get(key)
+    if h is None:
+        with _hists_lock:
+            h = _hists.setdefault(key, Histogram())
+    return h
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def disable():
+    enable(False)
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _hists_lock:
+        _hists.clear()
+
+
+def span(stage):
+    """Context manager timing one stage; a shared no-op while timing is off."""
+    if not _enabled:
+        return _NOOP
+    return _Span(_hist(STAGE_METRIC, "stage", stage))
+
+
+def http_span(host):
+    """Like span() but recorded per outbound host."""
+    if not _enabled:
+        return _NOOP
+    return _Span(_hist(HTTP_METRIC, "host", host))
+
+
+def observe(stage, seconds):
+    if _enabled:
+        _hist(STAGE_METRIC, "stage", stage).observe(seconds)
+
+
+def snapshot():
+    """[{metric, label, count, mean_ms, p50_ms, p95_ms, total_s}] for every histogram, busiest first."""
+    with _hists_lock:
+        items = list(_hists.items())
+    rows = []
+    for (metric, label, value), h in items:
+        if not h.count:
+            continue
+        p50, p95 = h.quantile(0.5), h.quantile(0.95)
+        rows.append({
+            "metric": "http" if metric == HTTP_METRIC else "stage",
+            "label": value,
+            "count": h.count,
+            "mean_ms": round(h.total / h.count * 1000.0, 3),
+            "p50_ms": round(p50 * 1000.0, 3) if p50 != float("inf") else None,
+            "p95_ms": round(p95 * 1000.0, 3) if p95 != float("inf") else None,
+            "total_s": round(h.total, 4),
+        })
+    return sorted(rows, key=lambda r: -r["total_s"])
+
+
+def export_prometheus():
+    """All histograms in the Prometheus text exposition format."""
+    with _hists_lock:
+        items = sorted(_hists.items())
+    lines = []
+    for metric in (STAGE_METRIC, HTTP_METRIC):
+        series = [(label, value, h) for (m, label, value), h in items if m == metric]
+        if not series:
+            continue
+        lines.append(f"# HELP {metric} {METRIC_HELP[metric]}")
+        lines.append(f"# TYPE {metric} histogram")
+        for label, value, h in series:
+            with h.lock:
+                counts, total, count = list(h.counts), h.total, h.count
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            cum = 0
+            for bound, c in zip(BUCKETS + (float("inf"),), counts):
+                cum += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="{le}"}} {cum}')
+            lines.append(f'{metric}_sum{{{label}="{value}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{{label}="{value}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """Write export_prometheus() to path atomically (e.g. for node_exporter's textfile collector)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(export_prometheus())
+    os.replace(tmp, path)
+
+
+_metrics_file = os.getenv("CROP_METRICS_FILE")
+if _metrics_file:
+    atexit.register(write_metrics, _metrics_file)
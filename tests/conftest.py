@@ -0,0 +1,52 @@
+# tests/conftest.py
+"""
+Shared fixtures. The modules under test live flat at the repo root, so it goes
+on sys.path here. model_dir is a small LightGBM model trained on the bundled
+Crop_recommendation.csv and written the way training.py writes its artifacts.
+"""
+import os, sys, json
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def write_artifacts(out_dir, n_estimators=15, version="t1"):
+    """Train a small model on the bundled dataset and save it like training.py does."""
+    import joblib
+    import pandas as pd
+    from lightgbm import LGBMClassifier
+    from sklearn.preprocessing import StandardScaler, LabelEncoder
+
+    df = pd.read_csv(os.path.join(REPO, "Crop_recommendation.csv"))
+    scaler = StandardScaler().fit(df[FEATURES])
+    le = LabelEncoder().fit(df["label"])
+    model = LGBMClassifier(n_estimators=n_estimators, num_leaves=15, random_state=42, verbose=-1)
+    model.fit(scaler.transform(df[FEATURES]), le.transform(df["label"]))
+    os.makedirs(out_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(out_dir, "model.joblib"))
+    joblib.dump(scaler, os.path.join(out_dir, "scaler.joblib"))
+    joblib.dump(le, os.path.join(out_dir, "label_encoder.joblib"))
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"version": version, "features": FEATURES, "n_classes": len(le.classes_)}, f)
+    return model, scaler, le
+
+
+@pytest.fixture(scope="session")
+def trained(tmp_path_factory):
+    """(model_dir, model, scaler, label_encoder) shared by the whole session; treat as read-only."""
+    out = str(tmp_path_factory.mktemp("model"))
+    model, scaler, le = write_artifacts(out)
+    return out, model, scaler, le
+
+
+@pytest.fixture(scope="session")
+def rows():
+    """A few hundred raw feature rows from the dataset."""
+    import pandas as pd
+    df = pd.read_csv(os.path.join(REPO, "Crop_recommendation.csv"))
+    return df[FEATURES].sample(300, random_state=0).to_numpy(dtype=float)
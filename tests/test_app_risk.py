@@ -0,0 +1,24 @@
+# tests/test_app_risk.py
+"""Rain-risk day alignment: climatology months follow the same UTC days as the forecast."""
+import datetime
+
+import numpy as np
+
+import app_risk
+
+
+def test_default_start_is_the_utc_date(monkeypatch):
+    # 23:30 UTC on 31 Jan is already 1 Feb in India; the forecast still starts on 31 Jan
+    utc_now = datetime.datetime(2026, 1, 31, 23, 30, tzinfo=datetime.timezone.utc)
+
+    class FrozenDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return utc_now.astimezone(tz)
+
+    monkeypatch.setattr(app_risk.datetime, "datetime", FrozenDatetime)
+    monthly = {m: (310.0 if m == 1 else 0.0) for m in range(1, 13)}  # only January has rain
+    p = app_risk._daily_heavy_probs([[]], [monthly], [10.0], 2)[0, 0]
+    assert p[0] > 0 and p[1] == 0  # day 0 is 31 Jan, day 1 is 1 Feb
+    explicit = app_risk._daily_heavy_probs([[]], [monthly], [10.0], 2, start=datetime.date(2026, 1, 31))[0, 0]
+    np.testing.assert_array_equal(p, explicit)
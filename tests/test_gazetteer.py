@@ -0,0 +1,72 @@
+# tests/test_gazetteer.py
+"""Offline place lookup: only exact names/aliases resolve, near misses become suggestions or go to the API."""
+import os
+
+import pytest
+
+import gazetteer
+from conftest import REPO
+from gazetteer import Gazetteer
+
+PLACES = os.path.join(REPO, "data", "india_places.csv")
+
+
+@pytest.fixture
+def gaz(tmp_path):
+    return Gazetteer(PLACES, learned_csv=str(tmp_path / "learned.csv"))
+
+
+@pytest.mark.parametrize("query, name", [
+    ("Bhopal", "Bhopal"), ("  bhopal ", "Bhopal"), ("BHOPAL!", "Bhopal"),
+    ("भोपाल", "Bhopal"), ("بھوپال", "Bhopal"), ("सीहोर", "Sehore"), ("پٹنہ", "Patna"),
+    ("Patna, Bihar", "Patna"),
+])
+def test_exact_names_and_aliases_resolve(gaz, query, name):
+    assert gaz.lookup(query).name == name
+
+
+@pytest.mark.parametrize("query, other", [
+    ("Patan", "Patna"), ("Banda", "Bhind"), ("Badaun", "Budhni"), ("Sivani", "Seoni"), ("Bhopaal", "Bhopal"),
+])
+def test_phonetic_near_misses_are_not_answers(gaz, query, other):
+    # distinct towns share consonant skeletons; only suggest() may offer them
+    assert gaz.lookup(query) is None
+    assert other in [p.name for p in gaz.suggest(query)]
+
+
+def test_suggest_is_empty_for_nonsense(gaz):
+    assert gaz.lookup("Xyzzyqwv") is None
+    assert gaz.suggest("Xyzzyqwv") == []
+
+
+def test_learned_places_persist(gaz, tmp_path):
+    gaz.add("Patan", 23.85, 72.12, state="Gujarat", aliases=["पाटन"])
+    assert gaz.lookup("पाटन").state == "Gujarat"
+    again = Gazetteer(PLACES, learned_csv=str(tmp_path / "learned.csv"))
+    assert (again.lookup("Patan").lat, again.lookup("Patna").name) == (23.85, "Patna")
+
+
+def test_miss_falls_back_to_the_geocoder_and_is_cached(gaz, monkeypatch):
+    from providers import Cassette, ReplayClient, installed
+    import utils
+    url = "http://api.openweathermap.org/geo/1.0/direct"
+    tape = Cassette()
+    tape.add_http(url, {"q": "Patan", "limit": 1},
+                  [{"name": "Patan", "state": "Gujarat", "lat": 23.8493, "lon": 72.1266}])
+    monkeypatch.setattr(gazetteer, "_gazetteer", gaz)
+    client = ReplayClient(tape, synthetic=False)
+    with installed(client):
+        assert utils.get_coords_for_city_openweather("Patan", "test-key") == (23.8493, 72.1266)
+        assert client.stats()["replay_exact"] == 1
+        # second ask is answered offline, even without a key
+        assert utils.get_coords_for_city_openweather("Patan", None) == (23.8493, 72.1266)
+    assert client.stats()["replay_exact"] == 1
+    assert gaz.lookup("Patan").source == "learned"
+    assert gaz.lookup("Patna").name == "Patna"
+
+
+def test_miss_without_key_stays_unresolved(gaz, monkeypatch):
+    import utils
+    monkeypatch.setattr(gazetteer, "_gazetteer", gaz)
+    assert utils.get_coords_for_city_openweather("Sivani", None) == (None, None)
+    assert len(gaz) == sum(1 for _ in open(PLACES, encoding="utf-8")) - 1
@@ -0,0 +1,163 @@
+# tests/test_http_client.py
+"""HttpClient against a local http.server stub: TTL cache, single-flight, retries."""
+import json, time, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+from http_client import HttpClient
+
+
+class Stub(BaseHTTPRequestHandler):
+    """
+    /ok      200 {"path": ..., "n": hits so far}
+    /slow    like /ok after 200 ms
+    /flaky   503 for the first `fail` hits, then like /ok
+    /missing 404
+    """
+    hits = {}
+    fail = 0
+    lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        with self.lock:
+            n = self.hits[path] = self.hits.get(path, 0) + 1
+        if path == "/slow":
+            time.sleep(0.2)
+        if path == "/missing" or (path == "/flaky" and n <= self.fail):
+            code, body = (404 if path == "/missing" else 503), {"error": "nope"}
+        else:
+            code, body = 200, {"path": path, "n": n}
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    Stub.hits, Stub.fail = {}, 0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def client():
+    return HttpClient(retries=2, backoff=0.02, timeout=5)
+
+
+def test_cache_hit_within_ttl(server, client):
+    first = client.get_json(server + "/ok", {"q": 1}, ttl=60)
+    second = client.get_json(server + "/ok", {"q": 1}, ttl=60)
+    assert first == second == {"path": "/ok", "n": 1}
+    assert Stub.hits["/ok"] == 1
+    stats = client.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_cache_key_rounds_coordinates(server, client):
+    client.get_json(server + "/ok", {"lat": 23.1801, "lon": 77.2912}, ttl=60)
+    client.get_json(server + "/ok", {"lat": 23.1849, "lon": 77.2938}, ttl=60)
+    assert Stub.hits["/ok"] == 1
+    client.get_json(server + "/ok", {"lat": 23.19, "lon": 77.29}, ttl=60)
+    assert Stub.hits["/ok"] == 2
+
+
+def test_cache_entry_expires(server, client):
+    client.get_json(server + "/ok", ttl=0.1)
+    time.sleep(0.15)
+    assert client.get_json(server + "/ok", ttl=0.1)["n"] == 2
+    assert Stub.hits["/ok"] == 2
+
+
+def test_ttl_zero_does_not_cache(server, client):
+    client.get_json(server + "/ok")
+    client.get_json(server + "/ok")
+    assert Stub.hits["/ok"] == 2
+    assert client.stats()["entries"] == 0
+
+
+def test_concurrent_identical_requests_share_one_call(server, client):
+    n = 8
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def call(i):
+        barrier.wait()
+        results[i] = client.get_json(server + "/slow", {"lat": 12.5, "lon": 77.6})
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert Stub.hits["/slow"] == 1
+    assert all(r == {"path": "/slow", "n": 1} for r in results)
+    stats = client.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == n - 1
+
+
+def test_coalesced_callers_see_the_leaders_error(server):
+    client = HttpClient(retries=0)
+    Stub.fail = 100
+    errors = []
+    barrier = threading.Barrier(4)
+
+    def call():
+        barrier.wait()
+        try:
+            client.get_json(server + "/flaky")
+        except requests.HTTPError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 4
+    assert 1 <= Stub.hits["/flaky"] <= 4  # callers arriving after the leader finished make their own call
+
+
+def test_retries_5xx_with_backoff(server, client):
+    Stub.fail = 2
+    t0 = time.perf_counter()
+    assert client.get_json(server + "/flaky")["n"] == 3
+    elapsed = time.perf_counter() - t0
+    assert Stub.hits["/flaky"] == 3
+    assert client.stats()["retries"] == 2
+    assert elapsed >= client.backoff * (1 + 2)  # 0.02 then 0.04
+
+
+def test_gives_up_after_retries(server, client):
+    Stub.fail = 100
+    with pytest.raises(requests.HTTPError):
+        client.get_json(server + "/flaky", ttl=60)
+    assert Stub.hits["/flaky"] == client.retries + 1
+    stats = client.stats()
+    assert stats["errors"] == 1 and stats["entries"] == 0
+
+
+def test_does_not_retry_client_errors(server, client):
+    with pytest.raises(requests.HTTPError):
+        client.get_json(server + "/missing")
+    assert Stub.hits["/missing"] == 1
+    assert client.stats()["retries"] == 0
+
+
+def test_retries_connection_errors(client):
+    with pytest.raises(requests.ConnectionError):
+        client.get_json("http://127.0.0.1:9/unreachable")
+    assert client.stats()["retries"] == client.retries
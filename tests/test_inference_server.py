@@ -0,0 +1,101 @@
+# tests/test_inference_server.py
+"""Micro-batching and per-request error isolation in the inference service."""
+import json, threading
+import http.client
+
+import pytest
+
+import inference_server
+from inference_server import MicroBatcher, serve
+from model_registry import ModelRegistry
+from conftest import FEATURES
+
+
+@pytest.fixture
+def registry(trained):
+    return ModelRegistry(trained[0], check_interval=60)
+
+
+@pytest.fixture
+def server(trained):
+    srv = serve("127.0.0.1", 0, trained[0], max_batch=64, max_wait_ms=20)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_port
+    srv.shutdown()
+    srv.server_close()
+    inference_server.Handler.batcher = None
+
+
+def _post(port, body):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("POST", "/predict", json.dumps(body), {"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    out = resp.status, json.loads(resp.read())
+    conn.close()
+    return out
+
+
+def test_batched_results_match_single_rows(registry, rows):
+    batcher = MicroBatcher(registry, max_batch=32, max_wait_ms=50)
+    futures = [batcher.submit(list(x), top_k=1 + i % 3) for i, x in enumerate(rows[:40])]
+    results = [f.result(timeout=30) for f in futures]
+    art = registry.current()
+    expected = art.rank(art.predict_proba(rows[:40]), 3)
+    for i, (got, want) in enumerate(zip(results, expected)):
+        assert got["crop"] == want["crop"]
+        assert got["top_k"] == want["top_k"][:1 + i % 3]
+    m = batcher.metrics()
+    assert m["served"] == 40 and m["errors"] == 0
+    assert 1 < m["batch_size_max"] <= 32
+
+
+def test_scoring_failure_fails_only_its_batch(registry, rows):
+    class Flaky:
+        """Registry whose first current() call raises."""
+        calls = 0
+
+        def current(self):
+            Flaky.calls += 1
+            if Flaky.calls == 1:
+                raise RuntimeError("model files mid-write")
+            return registry.current()
+
+    batcher = MicroBatcher(Flaky(), max_batch=8, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        batcher.submit(list(rows[0])).result(timeout=30)
+    assert batcher.submit(list(rows[1])).result(timeout=30)["crop"]
+    m = batcher.metrics()
+    assert (m["errors"], m["served"]) == (1, 1)
+
+
+def test_bad_rows_get_400_and_do_not_touch_good_ones(server, rows):
+    good = [dict(zip(FEATURES, map(float, x))) for x in rows[:30]]
+    bad = [{}, {**good[0], "ph": "abc"}, {**good[0], "rainfall": None}, "not an object"]
+    results = {}
+
+    def call(key, body):
+        results[key] = _post(server, body)
+
+    threads = [threading.Thread(target=call, args=(("good", i), g)) for i, g in enumerate(good)]
+    threads += [threading.Thread(target=call, args=(("bad", i), b)) for i, b in enumerate(bad)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for i in range(len(good)):
+        status, body = results[("good", i)]
+        assert status == 200 and body["model_version"] == "t1"
+    for i in range(len(bad)):
+        status, body = results[("bad", i)]
+        assert status == 400 and body["error"]
+    assert "missing feature" in results[("bad", 0)][1]["error"]
+    assert "'ph'" in results[("bad", 1)][1]["error"]
+
+
+def test_list_payload_is_rejected_whole_and_names_the_row(server, rows):
+    good = dict(zip(FEATURES, map(float, rows[0])))
+    status, body = _post(server, [good, {**good, "N": "x"}])
+    assert status == 400 and body["error"].startswith("row 1:")
+    status, body = _post(server, [good, {**good, "top_k": 2}])
+    assert status == 200 and [len(r["top_k"]) for r in body] == [3, 2]
+    assert body[0]["crop"] == body[1]["crop"]
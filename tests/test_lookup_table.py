@@ -0,0 +1,36 @@
+# tests/test_lookup_table.py
+"""Which inputs LookupTable.index() serves from the grid and which go to the live model."""
+import numpy as np
+import pytest
+
+from lookup_table import LookupTable, GRID, FERTILITY_PRESETS, grid_shape
+
+
+@pytest.fixture(scope="module")
+def table():
+    shape = grid_shape()
+    return LookupTable(np.zeros(shape, np.uint8), np.zeros(shape, np.float16), GRID, ["rice"])
+
+
+N, P, K = FERTILITY_PRESETS["Medium"]
+
+
+@pytest.mark.parametrize("temperature, humidity, ph, rainfall, cell", [
+    (25.0, 60, 6.5, 0.0, (1, 35, 10, 50, 0)),       # widget defaults and a dry week
+    (25.4, 60, 6.5, 0.0, (1, 35, 10, 50, 0)),       # forecast temperature within 0.5 °C
+    (24.6, 59.6, 3.0 + 35 * 0.1, 104.9, (1, 35, 10, 50, 5)),
+    (45.3, 100.4, 9.0, 302.0, (1, 60, 20, 90, 15)),  # top edges
+])
+def test_values_near_a_grid_point_are_served(table, temperature, humidity, ph, rainfall, cell):
+    assert table.index(N, P, K, temperature, humidity, ph, rainfall) == cell
+
+
+@pytest.mark.parametrize("npk, temperature, humidity, ph, rainfall", [
+    ((N, P, K), 26.0, 60, 6.5, 0.0),       # halfway between temperature cells
+    ((N, P, K), 25.0, 60, 6.55, 0.0),      # pH off the slider steps
+    ((N, P, K), 25.0, 60, 6.5, 10.0),      # rainfall more than 5 mm from a cell
+    ((N, P, K), 25.0, 60, 6.5, 320.0),     # beyond the grid
+    ((61.0, P, K), 25.0, 60, 6.5, 0.0),    # not a fertility preset
+])
+def test_values_far_from_the_grid_are_not(table, npk, temperature, humidity, ph, rainfall):
+    assert table.index(*npk, temperature, humidity, ph, rainfall) is None
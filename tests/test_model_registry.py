@@ -0,0 +1,110 @@
+# tests/test_model_registry.py
+"""Hot reload: new training output is picked up, broken output is not, old sets stay usable."""
+import os, shutil
+
+import numpy as np
+import pytest
+
+from conftest import write_artifacts
+from model_registry import ModelRegistry
+
+
+def _registry(trained, tmp_path):
+    model_dir = str(tmp_path / "artifacts")
+    shutil.copytree(trained[0], model_dir)
+    return model_dir, ModelRegistry(model_dir, check_interval=0)
+
+
+def test_serves_the_trained_model(trained, tmp_path, rows):
+    _, model, scaler, _ = trained
+    _, reg = _registry(trained, tmp_path)
+    art = reg.current()
+    assert art.version == "t1"
+    np.testing.assert_allclose(art.predict_proba(rows), model.predict_proba(scaler.transform(rows)), atol=1e-9)
+    res = reg.predict(dict(zip(art.features, rows[0])))
+    assert res["model_version"] == "t1" and len(res["top_k"]) == 3
+
+
+def test_reloads_new_training_output(trained, tmp_path, rows):
+    model_dir, reg = _registry(trained, tmp_path)
+    old = reg.current()
+    write_artifacts(model_dir, n_estimators=5, version="t2")
+    new = reg.current()
+    assert new.version == "t2" and new is not old
+    assert new.content_hash != old.content_hash
+    # a caller still holding the old set keeps getting its answers
+    assert old.predict_proba(rows[:5]).shape == new.predict_proba(rows[:5]).shape
+    assert old.version == "t1"
+
+
+def test_unchanged_files_keep_the_same_set(trained, tmp_path):
+    _, reg = _registry(trained, tmp_path)
+    first = reg.current()
+    assert reg.reload() is first
+    assert reg.current() is first
+
+
+def test_rollback_reuses_the_loaded_set(trained, tmp_path):
+    model_dir, reg = _registry(trained, tmp_path)
+    original = reg.current()
+    backup = str(tmp_path / "backup")
+    shutil.copytree(model_dir, backup)
+    write_artifacts(model_dir, n_estimators=5, version="t2")
+    assert reg.current().version == "t2"
+    for name in os.listdir(backup):
+        shutil.copy(os.path.join(backup, name), os.path.join(model_dir, name))
+    assert reg.current() is original
+
+
+def test_broken_output_keeps_serving_the_current_set(trained, tmp_path):
+    model_dir, reg = _registry(trained, tmp_path)
+    good = reg.current()
+    with open(os.path.join(model_dir, "model.joblib"), "wb") as f:
+        f.write(b"half-written")
+    assert reg.current() is good
+    write_artifacts(model_dir, n_estimators=5, version="t3")
+    assert reg.current().version == "t3"
+
+
+def test_predict_rejects_missing_and_non_numeric_features(trained, tmp_path, rows):
+    _, reg = _registry(trained, tmp_path)
+    values = dict(zip(reg.current().features, rows[0]))
+    partial = {k: v for k, v in values.items() if k != "rainfall"}
+    with pytest.raises(ValueError, match="rainfall"):
+        reg.predict(partial)
+    with pytest.raises(ValueError, match="'ph'"):
+        reg.predict({**values, "ph": "acidic"})
+    with pytest.raises(ValueError, match="not finite"):
+        reg.predict({**values, "N": float("nan")})
+
+
+def test_reload_hashes_the_files_once(trained, tmp_path, monkeypatch):
+    import model_registry
+    calls = []
+    real = model_registry._content_hash
+    monkeypatch.setattr(model_registry, "_content_hash", lambda paths: calls.append(1) or real(paths))
+    _, reg = _registry(trained, tmp_path)
+    reg.current()
+    assert len(calls) == 1
+
+
+def test_partial_write_is_not_served_until_committed(trained, tmp_path):
+    from model_registry import commit_artifacts, IncompleteArtifacts
+    model_dir, reg = _registry(trained, tmp_path)
+    commit_artifacts(model_dir, {"version": "t1"})
+    committed = reg.current()
+    assert committed.version == "t1"
+
+    staged = str(tmp_path / "staged")
+    write_artifacts(staged, n_estimators=5, version="t2")
+    # training has replaced model.joblib, the rest is still the old set
+    shutil.copy(os.path.join(staged, "model.joblib"), os.path.join(model_dir, "model.joblib"))
+    assert reg.current() is committed
+    with pytest.raises(IncompleteArtifacts):
+        ModelRegistry(model_dir, check_interval=0).current()
+    for name in ("scaler.joblib", "label_encoder.joblib"):
+        shutil.copy(os.path.join(staged, name), os.path.join(model_dir, name))
+    assert reg.current() is committed
+
+    commit_artifacts(model_dir, {"version": "t2", "features": committed.features})
+    assert reg.current().version == "t2"
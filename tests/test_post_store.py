@@ -0,0 +1,67 @@
+# tests/test_post_store.py
+"""PostStore paging and the one-time import of the legacy JSON files."""
+import json
+
+from post_store import PostStore
+
+
+def _store(tmp_path, migrate_from=None):
+    return PostStore(str(tmp_path / "app.db"), migrate_from=migrate_from)
+
+
+def test_pages_newest_first_without_gaps(tmp_path):
+    store = _store(tmp_path)
+    ids = [store.add_post(f"user{i}", f"post {i}") for i in range(45)]
+    seen, cursor, sizes = [], None, []
+    while True:
+        page, cursor = store.latest_posts(limit=20, before_id=cursor)
+        sizes.append(len(page))
+        seen += [r["id"] for r in page]
+        if cursor is None:
+            break
+    assert sizes == [20, 20, 5]
+    assert seen == ids[::-1]
+
+
+def test_exact_multiple_of_page_size_ends_with_an_empty_page(tmp_path):
+    store = _store(tmp_path)
+    for i in range(4):
+        store.add_support_message(f"n{i}", "123", f"m{i}")
+    page, cursor = store.latest_support_messages(limit=2)
+    page, cursor = store.latest_support_messages(limit=2, before_id=cursor)
+    assert [r["message"] for r in page] == ["m1", "m0"]
+    assert store.latest_support_messages(limit=2, before_id=cursor) == ([], None)
+
+
+def test_migrates_legacy_json_once(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    # community_posts.json is newest first, support_messages.json oldest first
+    (legacy / "community_posts.json").write_text(json.dumps([
+        {"name": "c", "post": "newest"}, {"name": "b", "post": "middle"}, {"name": "a", "post": "oldest"},
+        {"name": "", "post": ""}, "not a record"]))
+    (legacy / "support_messages.json").write_text(json.dumps([
+        {"name": "x", "phone": "1", "message": "first", "city": "Pune"},
+        {"name": "y", "phone": "2", "message": "second"}]))
+
+    store = _store(tmp_path, migrate_from=str(legacy))
+    posts, _ = store.latest_posts()
+    assert [p["post"] for p in posts] == ["newest", "middle", "oldest"]
+    msgs, _ = store.latest_support_messages()
+    assert [(m["message"], m["city"]) for m in msgs] == [("second", None), ("first", "Pune")]
+
+    store.add_post("d", "after migration")
+    again = _store(tmp_path, migrate_from=str(legacy))
+    posts, _ = again.latest_posts()
+    assert [p["post"] for p in posts] == ["after migration", "newest", "middle", "oldest"]
+
+
+def test_unreadable_legacy_file_is_marked_done(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "community_posts.json").write_text("{not json")
+    store = _store(tmp_path, migrate_from=str(legacy))
+    assert store.latest_posts() == ([], None)
+    (legacy / "community_posts.json").write_text(json.dumps([{"name": "a", "post": "late"}]))
+    store.migrate_json(str(legacy))
+    assert store.latest_posts() == ([], None)
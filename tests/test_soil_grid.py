@@ -0,0 +1,35 @@
+# tests/test_soil_grid.py
+"""Nodata handling when stacking the soil rasters into the grid."""
+import numpy as np
+import pytest
+
+from soil_grid import fill_nearest, build_soil_grid, SoilGrid
+
+
+def test_fill_nearest_copies_the_closest_valid_pixel():
+    band = np.array([[1, -1, -1, 4]], dtype=np.float32)
+    out = fill_nearest(band, band != -1)
+    np.testing.assert_array_equal(out, [[1, 1, 4, 4]])
+
+
+def test_band_without_valid_pixels_becomes_nan():
+    band = np.full((4, 5), -32768, dtype=np.float32)
+    out = fill_nearest(band, band != -32768)
+    assert out.shape == band.shape and np.isnan(out).all()
+    ints = np.full((2, 2), -32768, dtype=np.int16)
+    assert np.isnan(fill_nearest(ints, ints != -32768)).all()
+
+
+def test_all_nodata_layer_reads_as_missing(tmp_path):
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import from_origin
+    files = {}
+    for layer, value in (("phh2o", 65), ("soc", -32768)):
+        path = str(tmp_path / f"{layer}.tif")
+        with rasterio.open(path, "w", driver="GTiff", height=8, width=8, count=1, dtype="int16",
+                           crs="EPSG:4326", transform=from_origin(77.0, 24.0, 0.25, 0.25), nodata=-32768) as dst:
+            dst.write(np.full((8, 8), value, dtype=np.int16), 1)
+        files[layer] = path
+    meta = build_soil_grid(files, out_dir=str(tmp_path))
+    assert meta["filled_pixels"] == {"phh2o": 0, "soc": 0}
+    assert SoilGrid.load(str(tmp_path)).lookup_dict(23.5, 77.5) == {"phh2o": 65.0, "soc": None}
@@ -0,0 +1,73 @@
+# tests/test_training.py
+"""update_model: warm start on known crops, unseen crops dropped or retrained from scratch."""
+import os, json
+
+import joblib
+import pandas as pd
+import pytest
+
+from conftest import REPO, FEATURES
+from model_registry import ModelRegistry
+from training import train_model, update_model
+
+CROPS = ["rice", "maize", "chickpea", "coffee"]
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory):
+    """(base_csv, new_csv, unseen_csv, model_dir): a small model trained on four crops."""
+    tmp = tmp_path_factory.mktemp("training")
+    df = pd.read_csv(os.path.join(REPO, "Crop_recommendation.csv"))
+    known = df[df["label"].isin(CROPS)].groupby("label")
+    base = df.loc[known.head(30).index]
+    new = df.loc[known.nth(slice(30, 50)).index]
+    unseen = pd.concat([new, df[df["label"] == "banana"].iloc[:20]])
+    paths = [str(tmp / name) for name in ("base.csv", "new.csv", "unseen.csv")]
+    for frame, path in zip((base, new, unseen), paths):
+        frame.to_csv(path, index=False)
+    model_dir = str(tmp / "model")
+    train_model(paths[0], model_dir, search_mode="halving", n_candidates=3)
+    return (*paths, model_dir)
+
+
+def _meta(model_dir):
+    with open(os.path.join(model_dir, "meta.json")) as f:
+        return json.load(f)
+
+
+def test_warm_start_adds_rounds_and_commits_a_new_version(data, tmp_path):
+    base, new, _, model_dir = data
+    before = _meta(model_dir)
+    old_rounds = joblib.load(os.path.join(model_dir, "model.joblib")).booster_.current_iteration()
+    out = str(tmp_path / "updated")
+    updated = update_model(new, model_dir, out_dir=out, n_rounds=5, base_data=base, force=True)
+
+    meta = _meta(out)
+    assert meta["version"] != before["version"] and meta["parent_version"] == before["version"]
+    upd = meta["update"]
+    assert upd["holdout_rows"] == 16 and upd["old_holdout_rows"] == 120
+    assert upd["holdout_accuracy_before"] is not None and upd["old_holdout_accuracy_after"] is not None
+    assert upd["dropped_unseen_labels"] == []
+    assert upd["total_rounds"] == old_rounds + upd["rounds_added"] == updated.booster_.current_iteration()
+    assert list(updated.classes_) == list(range(len(CROPS)))
+    # the written set is committed and served as the new version
+    assert ModelRegistry(out, check_interval=0).current().version == meta["version"]
+
+
+def test_unseen_crops_are_dropped_without_base_data(data, tmp_path):
+    _, _, unseen, model_dir = data
+    out = str(tmp_path / "updated")
+    update_model(unseen, model_dir, out_dir=out, n_rounds=5, force=True)
+    upd = _meta(out)["update"]
+    assert upd["dropped_unseen_labels"] == ["banana"] and upd["rows"] == 80
+    assert "banana" not in joblib.load(os.path.join(out, "label_encoder.joblib")).classes_
+
+
+def test_unseen_crops_retrain_from_scratch_with_base_data(data, tmp_path):
+    base, _, unseen, model_dir = data
+    out = str(tmp_path / "retrained")
+    update_model(unseen, model_dir, out_dir=out, base_data=base)
+    meta = _meta(out)
+    assert "update" not in meta and meta["n_classes"] == len(CROPS) + 1
+    assert "banana" in joblib.load(os.path.join(out, "label_encoder.joblib")).classes_
+    assert meta["features"] == FEATURES
@@ -0,0 +1,43 @@
+# tests/test_tree_engine.py
+"""TreeEnsemble must score raw rows exactly like scaler + LGBMClassifier.predict_proba."""
+import numpy as np
+
+from tree_engine import TreeEnsemble, export_model
+
+
+def test_predict_proba_matches_lightgbm(trained, rows):
+    _, model, scaler, le = trained
+    engine = export_model(model, scaler, le)
+    expected = model.predict_proba(scaler.transform(rows))
+    np.testing.assert_allclose(engine.predict_proba(rows), expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(engine.predict_proba(rows[:1]), expected[:1], rtol=0, atol=1e-9)
+    assert (engine.predict(rows) == le.inverse_transform(expected.argmax(axis=1))).all()
+
+
+def test_missing_values_follow_lightgbm(trained, rows):
+    _, model, scaler, le = trained
+    engine = export_model(model, scaler, le)
+    X = rows[:50].copy()
+    X[::3, 5] = np.nan
+    X[1::4, 6] = np.nan
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(scaler.transform(X)),
+                               rtol=0, atol=1e-9)
+
+
+def test_contributions_add_up_to_raw_score(trained, rows):
+    _, model, scaler, le = trained
+    engine = export_model(model, scaler, le)
+    contrib, cls = engine.contributions(rows)
+    raw = engine.raw_score(rows)
+    np.testing.assert_allclose(contrib.sum(axis=1), raw[np.arange(len(rows)), cls], atol=1e-9)
+    assert (cls == raw.argmax(axis=1)).all()
+
+
+def test_save_load_round_trip(trained, rows, tmp_path):
+    _, model, scaler, le = trained
+    engine = export_model(model, scaler, le)
+    path = str(tmp_path / "trees.npz")
+    engine.save(path)
+    loaded = TreeEnsemble.load(path)
+    np.testing.assert_array_equal(loaded.predict_proba(rows), engine.predict_proba(rows))
+    assert list(loaded.classes) == list(le.classes_)
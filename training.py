@@ -2,13 +2,97 @@ import pandas as pd
 import numpy as np
 import argparse
 import joblib
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
+from sklearn.model_selection import train_test_split, RandomizedSearchCV, StratifiedKFold
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.metrics import accuracy_score, classification_report
+import lightgbm as lgb
 from lightgbm import LGBMClassifier
-import os, json
+import os, json, time, copy, tempfile
+from tree_engine import export_model
+from model_bundle import write_bundle, BUNDLE_FILE
+from model_registry import dump_atomic, replace_atomic, commit_artifacts, MANIFEST_KEY
 
-def train_model(data_path, out_dir):
+# --- successive-halving search ---
+HALVING_SPACE = {
+    "num_leaves": [15, 20, 31, 50, 63, 90, 127],
+    "max_depth": [-1, 5, 8, 10, 12, 15],
+    "learning_rate": (0.01, 0.3),        # log-uniform
+    "min_child_samples": [5, 10, 20, 30, 50],
+    "feature_fraction": (0.6, 1.0),      # uniform
+    "bagging_fraction": (0.6, 1.0),      # uniform
+    "lambda_l2": (1e-3, 10.0),           # log-uniform
+}
+
+def sample_params(rng, space=HALVING_SPACE):
+    params = {}
+    for k, v in space.items():
+        if isinstance(v, list):
+            params[k] = v[rng.integers(len(v))]
+        elif k in ("learning_rate", "lambda_l2"):
+            params[k] = float(np.exp(rng.uniform(np.log(v[0]), np.log(v[1]))))
+        else:
+            params[k] = float(rng.uniform(*v))
+    # numpy ints are not JSON serializable
+    return {k: (int(x) if isinstance(x, (np.integer,)) else x) for k, x in params.items()}
+
+def halving_search(X_train, y_train, n_candidates=81, eta=3, min_rounds=10, cv=3, random_state=42):
+    """
+    Successive halving over boosting rounds: every candidate gets min_rounds,
+    the best 1/eta move on with eta times the rounds. The search stops at the
+    rung that would promote a single candidate; its winner is returned with
+    the rounds early stopping picked for it, without another round of training.
+    The binned LightGBM Dataset is built once and its fold subsets are reused by
+    every trial. Returns (best_params, best_rounds, trace).
+    """
+    rng = np.random.default_rng(random_state)
+    n_classes = int(np.max(y_train)) + 1
+    base = {"objective": "multiclass", "num_class": n_classes, "metric": ["multi_logloss", "multi_error"],
+            "verbosity": -1, "seed": random_state, "bagging_freq": 1, "num_threads": 0}
+
+    # feature_pre_filter off: otherwise a candidate with a smaller min_child_samples than the
+    # default makes LightGBM silently rebuild the bins from the raw data
+    full = lgb.Dataset(X_train, label=y_train, params={"verbosity": -1, "feature_pre_filter": False},
+                       free_raw_data=False).construct()
+    folds = []
+    for tr_idx, va_idx in StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state).split(X_train, y_train):
+        tr = full.subset(sorted(tr_idx)).construct()
+        va = full.subset(sorted(va_idx)).construct()
+        folds.append((tr, va))
+
+    candidates = list(enumerate(sample_params(rng) for _ in range(n_candidates)))
+    trace = []
+    rounds = min_rounds
+    rung = 0
+    while True:
+        scored = []
+        for cand_id, params in candidates:
+            t0 = time.perf_counter()
+            losses, errors, best_iters = [], [], []
+            for tr, va in folds:
+                evals = {}
+                booster = lgb.train({**base, **params}, tr, num_boost_round=rounds, valid_sets=[va],
+                                    valid_names=["valid"],
+                                    callbacks=[lgb.record_evaluation(evals), lgb.early_stopping(20, verbose=False)])
+                best = booster.best_iteration or rounds
+                losses.append(evals["valid"]["multi_logloss"][best - 1])
+                errors.append(evals["valid"]["multi_error"][best - 1])
+                best_iters.append(best)
+            trial = {"rung": rung, "candidate": cand_id, "rounds": rounds, "params": params,
+                     "cv_logloss": float(np.mean(losses)), "cv_accuracy": float(1 - np.mean(errors)),
+                     "best_iteration": int(np.mean(best_iters)), "seconds": round(time.perf_counter() - t0, 4)}
+            trace.append(trial)
+            scored.append((trial["cv_logloss"], cand_id, params, trial["best_iteration"]))
+        scored.sort(key=lambda x: x[0])
+        print(f"Rung {rung}: {len(scored)} candidates x {rounds} rounds, best logloss {scored[0][0]:.4f}")
+        keep = len(scored) // eta
+        if keep <= 1:
+            _, _, best_params, best_rounds = scored[0]
+            return best_params, best_rounds, trace
+        candidates = [(cid, p) for _, cid, p, _ in scored[:keep]]
+        rounds *= eta
+        rung += 1
+
+def train_model(data_path, out_dir, search_mode="random", n_candidates=81):
     # Load dataset
     df = pd.read_csv(data_path)
     print("Dataset loaded:", df.shape)
@@ -29,26 +113,46 @@ def train_model(data_path, out_dir):
         X_scaled, y_enc, test_size=0.2, random_state=42, stratify=y_enc
     )
 
-    # Model
-    model = LGBMClassifier(random_state=42)
+    search_start = time.perf_counter()
+    if search_mode == "halving":
+        params, best_rounds, trace = halving_search(X_train, y_train, n_candidates=n_candidates)
+        best_params = {**params, "n_estimators": int(best_rounds)}
+        # refit on the whole training split with the sklearn wrapper (same artifact type as before)
+        best_model = LGBMClassifier(random_state=42, subsample_freq=1, verbose=-1,
+                                    num_leaves=params["num_leaves"], max_depth=params["max_depth"],
+                                    learning_rate=params["learning_rate"], min_child_samples=params["min_child_samples"],
+                                    colsample_bytree=params["feature_fraction"], subsample=params["bagging_fraction"],
+                                    reg_lambda=params["lambda_l2"], n_estimators=int(best_rounds))
+        best_model.fit(X_train, y_train)
+    else:
+        # Model
+        model = LGBMClassifier(random_state=42)
 
-    # Hyperparameter tuning
-    param_dist = {
-        "num_leaves": [20, 31, 50],
-        "max_depth": [-1, 5, 10, 15],
-        "learning_rate": [0.01, 0.05, 0.1],
-        "n_estimators": [50, 100, 200]
-    }
+        # Hyperparameter tuning
+        param_dist = {
+            "num_leaves": [20, 31, 50],
+            "max_depth": [-1, 5, 10, 15],
+            "learning_rate": [0.01, 0.05, 0.1],
+            "n_estimators": [50, 100, 200]
+        }
 
-    search = RandomizedSearchCV(
-        model, param_distributions=param_dist,
-        n_iter=10, scoring="accuracy", cv=3, random_state=42, n_jobs=-1
-    )
+        search = RandomizedSearchCV(
+            model, param_distributions=param_dist,
+            n_iter=10, scoring="accuracy", cv=3, random_state=42, n_jobs=-1
+        )
 
-    search.fit(X_train, y_train)
+        search.fit(X_train, y_train)
 
-    best_model = search.best_estimator_
-    print("Best params:", search.best_params_)
+        best_model = search.best_estimator_
+        best_params = search.best_params_
+        res = search.cv_results_
+        # sklearn times each fold, not each candidate; fit_seconds sums fit + score time over
+        # the folds (which ran in parallel), and search.seconds below is the real wall time
+        per_fold = np.asarray(res["mean_fit_time"]) + np.asarray(res["mean_score_time"])
+        trace = [{"candidate": i, "params": res["params"][i], "cv_accuracy": float(res["mean_test_score"][i]),
+                  "fit_seconds": round(float(per_fold[i] * search.n_splits_), 4)} for i in range(len(res["params"]))]
+    search_seconds = time.perf_counter() - search_start
+    print("Best params:", best_params)
 
     # Evaluate
     y_pred = best_model.predict(X_test)
@@ -56,25 +160,189 @@ def train_model(data_path, out_dir):
     print("Test Accuracy:", acc)
     print("\nClassification Report:\n", classification_report(y_test, y_pred, target_names=le.classes_))
 
-    # Save artifacts
+    # Save artifacts: each file atomically, bundle after the loose files, meta.json commits the set
     os.makedirs(out_dir, exist_ok=True)
-    joblib.dump(best_model, os.path.join(out_dir, "model.joblib"))
-    joblib.dump(scaler, os.path.join(out_dir, "scaler.joblib"))
-    joblib.dump(le, os.path.join(out_dir, "label_encoder.joblib"))
+    dump_atomic(best_model, os.path.join(out_dir, "model.joblib"))
+    dump_atomic(scaler, os.path.join(out_dir, "scaler.joblib"))
+    dump_atomic(le, os.path.join(out_dir, "label_encoder.joblib"))
+    engine = export_model(best_model, scaler, le, feature_names=list(X.columns))
+    replace_atomic(os.path.join(out_dir, "trees.npz"), engine.save)
 
     meta = {
+        "version": time.strftime("%Y%m%d-%H%M%S"),
         "accuracy": acc,
-        "best_params": search.best_params_,
-        "n_classes": len(le.classes_)
+        "best_params": best_params,
+        "search": {"mode": search_mode, "seconds": round(search_seconds, 2), "n_trials": len(trace), "trace": trace},
+        "n_classes": len(le.classes_),
+        "features": list(X.columns)
     }
-    with open(os.path.join(out_dir, "meta.json"), "w") as f:
-        json.dump(meta, f, indent=4)
+    # single-file bundle the app and predict.py serve from (see model_bundle.py)
+    write_bundle(os.path.join(out_dir, BUNDLE_FILE), engine, scaler, le.classes_, list(X.columns), meta)
+    commit_artifacts(out_dir, meta)
 
     print(f"\nModel & artifacts saved to {out_dir}")
 
+# --- warm-start incremental update ---
+def _continue_params(model, n_classes):
+    """LightGBM train() params equivalent to a fitted LGBMClassifier's hyperparameters."""
+    p = model.get_params()
+    params = {"objective": "multiclass", "num_class": n_classes, "verbosity": -1,
+              "seed": p.get("random_state") or 42}
+    for k in ("num_leaves", "max_depth", "learning_rate", "min_child_samples", "min_child_weight",
+              "subsample", "subsample_freq", "colsample_bytree", "reg_alpha", "reg_lambda", "min_split_gain"):
+        if p.get(k) is not None:
+            params[k] = p[k]
+    return params
+
+def _wrap_booster(template, booster):
+    """An LGBMClassifier like template (same classes/features) that serves booster."""
+    model = copy.copy(template)
+    model._Booster = booster
+    model._best_iteration = booster.best_iteration
+    model._evals_result = {}
+    model.n_estimators = booster.current_iteration()
+    return model
+
+UPDATE_MIN_HOLDOUT_ROWS = 10  # smaller update batches are all used for training
+OLD_HOLDOUT_ROWS = 2000  # rows of --base_data re-scored to catch regressions on the old data
+
+def _holdout_split(X, y, holdout, seed=42):
+    """
+    (X_fit, X_hold, y_fit, y_hold). Stratified only when every class present
+    fits on both sides; tiny batches get an empty holdout.
+    """
+    n_hold = int(np.ceil(len(y) * holdout)) if holdout else 0
+    if len(y) < UPDATE_MIN_HOLDOUT_ROWS or n_hold == 0 or n_hold >= len(y):
+        return X, X[:0], y, y[:0]
+    counts = np.bincount(y)
+    n_present = int((counts > 0).sum())
+    stratify = y if counts[counts > 0].min() >= 2 and min(n_hold, len(y) - n_hold) >= n_present else None
+    return train_test_split(X, y, test_size=n_hold, random_state=seed, stratify=stratify)
+
+def _new_version(parent=None):
+    """Timestamp version; suffixed when an update lands in the same second as its parent."""
+    version = time.strftime("%Y%m%d-%H%M%S")
+    return version if version != parent else f"{version}.1"
+
+def _accuracy(model, X, y):
+    return float(accuracy_score(y, model.predict(X))) if len(y) else None
+
+def update_model(data_path, model_dir, out_dir=None, n_rounds=50, holdout=0.2, base_data=None,
+                 max_accuracy_drop=0.01, force=False):
+    """
+    Continue boosting the model in model_dir on new rows (same columns as the
+    training CSV) instead of retraining from scratch. The existing scaler and
+    label encoder are reused. Rows with crops the model has never seen cannot be
+    added to a fixed multiclass booster: with base_data the whole model is
+    retrained on base + new rows, otherwise those rows are dropped. Accuracy is
+    compared before/after on a holdout of the new rows and, with base_data, on a
+    sample of the old data; the update is written only if neither falls by more
+    than max_accuracy_drop.
+    """
+    t_start = time.perf_counter()
+    out_dir = out_dir or model_dir
+    model = joblib.load(os.path.join(model_dir, "model.joblib"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+    le = joblib.load(os.path.join(model_dir, "label_encoder.joblib"))
+    with open(os.path.join(model_dir, "meta.json")) as f:
+        old_meta = json.load(f)
+
+    df = pd.read_csv(data_path)
+    features = old_meta.get("features", [c for c in df.columns if c != "label"])
+    unseen = sorted(set(df["label"]) - set(le.classes_))
+    if unseen:
+        if base_data:
+            print(f"New crop labels {unseen}: retraining from scratch on {base_data} + {data_path}")
+            combined = pd.concat([pd.read_csv(base_data), df[features + ["label"]]], ignore_index=True)
+            # train_model reads a CSV; keep the combined copy out of the model directory
+            with tempfile.TemporaryDirectory() as tmp:
+                combined_path = os.path.join(tmp, "combined_training_data.csv")
+                combined.to_csv(combined_path, index=False)
+                return train_model(combined_path, out_dir)
+        print(f"Warning: dropping {df['label'].isin(unseen).sum()} rows with unseen labels {unseen} "
+              f"(pass --base_data to retrain with them)")
+        df = df[~df["label"].isin(unseen)]
+
+    X = scaler.transform(df[features])
+    y = le.transform(df["label"])
+    X_new, X_hold, y_new, y_hold = _holdout_split(X, y, holdout)
+    X_old, y_old = X[:0], y[:0]
+    if base_data:
+        old = pd.read_csv(base_data)
+        old = old[old["label"].isin(le.classes_)]
+        old = old.sample(n=min(len(old), OLD_HOLDOUT_ROWS), random_state=42)
+        X_old, y_old = scaler.transform(old[features]), le.transform(old["label"])
+
+    t0 = time.perf_counter()
+    trees_before = model.booster_.num_trees()
+    booster = lgb.train(_continue_params(model, len(le.classes_)), lgb.Dataset(X_new, label=y_new),
+                        num_boost_round=n_rounds, init_model=model.booster_, keep_training_booster=False)
+    updated = _wrap_booster(model, booster)
+    train_seconds = time.perf_counter() - t0
+    trees_added = booster.num_trees() - trees_before
+    rounds_added = trees_added // max(1, booster.num_model_per_iteration())
+
+    checks = {}
+    for name, Xh, yh in (("new", X_hold, y_hold), ("old", X_old, y_old)):
+        if len(yh):
+            checks[name] = (_accuracy(model, Xh, yh), _accuracy(updated, Xh, yh), len(yh))
+            print(f"Held-out accuracy on {name} rows ({len(yh)}): {checks[name][0]:.4f} -> {checks[name][1]:.4f}")
+    print(f"{rounds_added} rounds ({trees_added} trees) added in {train_seconds:.2f}s")
+    if not trees_added:
+        print("Warning: LightGBM found no split worth adding (batch likely smaller than min_child_samples per class)")
+    if not checks:
+        print("Warning: no holdout (batch too small and no --base_data); writing without an accuracy check")
+    worse = [name for name, (before, after, _) in checks.items() if after < before - max_accuracy_drop]
+    if worse and not force:
+        raise SystemExit(f"Updated model is worse on the held-out {' and '.join(worse)} rows; "
+                         "not writing it (use --force to override).")
+
+    os.makedirs(out_dir, exist_ok=True)
+    dump_atomic(updated, os.path.join(out_dir, "model.joblib"))
+    dump_atomic(scaler, os.path.join(out_dir, "scaler.joblib"))
+    dump_atomic(le, os.path.join(out_dir, "label_encoder.joblib"))
+    engine = export_model(updated, scaler, le, feature_names=features)
+    replace_atomic(os.path.join(out_dir, "trees.npz"), engine.save)
+    new_acc = checks.get("new", (None, None, 0))
+    old_acc = checks.get("old", (None, None, 0))
+    meta = {
+        **{k: v for k, v in old_meta.items() if k not in ("search", MANIFEST_KEY)},
+        "version": _new_version(old_meta.get("version")),
+        "parent_version": old_meta.get("version"),
+        "features": features,
+        "update": {"data_path": data_path, "rows": int(len(df)), "rounds_requested": n_rounds,
+                   "rounds_added": int(rounds_added), "trees_added": int(trees_added),
+                   "total_rounds": int(booster.current_iteration()), "holdout_rows": new_acc[2],
+                   "holdout_accuracy_before": new_acc[0], "holdout_accuracy_after": new_acc[1],
+                   "old_holdout_rows": old_acc[2],
+                   "old_holdout_accuracy_before": old_acc[0], "old_holdout_accuracy_after": old_acc[1],
+                   "dropped_unseen_labels": unseen, "seconds": round(time.perf_counter() - t_start, 2)},
+    }
+    write_bundle(os.path.join(out_dir, BUNDLE_FILE), engine, scaler, le.classes_, features, meta)
+    # the registry serves the loose files only once meta.json's manifest matches them
+    commit_artifacts(out_dir, meta)
+    print(f"\nUpdated model ({meta['version']}) saved to {out_dir}")
+    return updated
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data_path", type=str, required=True)
-    parser.add_argument("--out_dir", type=str, required=True)
+    parser.add_argument("--out_dir", type=str, default=None, help="Required unless --warm_start (defaults to its model dir)")
+    parser.add_argument("--search", type=str, default="random", choices=["random", "halving"],
+                        help="random: RandomizedSearchCV (10 x 3-fold); halving: successive halving over boosting rounds")
+    parser.add_argument("--n_candidates", type=int, default=81, help="Starting candidates for --search halving")
+    parser.add_argument("--warm_start", type=str, default=None,
+                        help="Model dir to continue boosting from on --data_path (new rows only)")
+    parser.add_argument("--rounds", type=int, default=50, help="Boosting rounds to add with --warm_start")
+    parser.add_argument("--base_data", type=str, default=None,
+                        help="Original training CSV: --warm_start checks accuracy on a sample of it and "
+                             "falls back to a full retrain on unseen crops")
+    parser.add_argument("--force", action="store_true", help="Write the warm-started model even if held-out accuracy drops")
     args = parser.parse_args()
-    train_model(args.data_path, args.out_dir)
+    if args.warm_start:
+        update_model(args.data_path, args.warm_start, args.out_dir, n_rounds=args.rounds,
+                     base_data=args.base_data, force=args.force)
+    else:
+        if not args.out_dir:
+            parser.error("--out_dir is required")
+        train_model(args.data_path, args.out_dir, search_mode=args.search, n_candidates=args.n_candidates)
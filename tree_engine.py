@@ -0,0 +1,326 @@
+# tree_engine.py
+"""
+Flat, array-backed evaluator for the LightGBM crop model.
+
+export_model() walks the booster's JSON dump into one node table shared by all
+trees and folds the StandardScaler into the split thresholds, so raw (unscaled)
+feature rows go straight in. TreeEnsemble.predict_proba() then walks every tree
+for every row at once, one tree level per NumPy step.
+"""
+import os, json, time
+import numpy as np
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+BLOCK_ROWS = 256  # rows walked together; keeps the (rows, trees) node matrix in cache
+
+
+class TreeEnsemble:
+    """
+    Node table layout (index = global node id, leaves included):
+      feature[i]    feature column tested at node i (0 for leaves)
+      threshold[i]  go right when x > threshold[i] (+inf for leaves)
+      nan_left[i]   direction taken by NaN inputs
+      left[i]       left child; the right child is left[i] + 1 (leaves point to themselves)
+      leaf_value[i] output of leaf i (0 for internal nodes)
+      node_value[i] expected output of the subtree under node i (optional; used by contributions())
+    roots[t] is the root of tree t and tree_class[t] the class it adds to. Trees are
+    sorted by depth (deepest first) and level_width[d] counts trees deeper than d,
+    so level d only walks the first level_width[d] trees. Single-leaf trees are
+    folded into bias.
+    """
+
+    def __init__(self, feature, threshold, nan_left, left, leaf_value, roots, tree_class,
+                 level_width, bias, feature_names=None, classes=None, node_value=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.nan_left = np.ascontiguousarray(nan_left, dtype=bool)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.leaf_value = np.ascontiguousarray(leaf_value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.tree_class = np.ascontiguousarray(tree_class, dtype=np.int32)
+        self.level_width = np.ascontiguousarray(level_width, dtype=np.int32)
+        self.bias = np.ascontiguousarray(bias, dtype=np.float64)
+        self.feature_names = list(feature_names) if feature_names is not None else list(FEATURES)
+        self.classes = np.asarray(classes) if classes is not None else None
+        self.node_value = np.ascontiguousarray(node_value, dtype=np.float64) if node_value is not None else None
+        # one-hot (n_trees, n_classes) so per-class sums are a single matmul
+        self._class_matrix = np.zeros((self.roots.size, self.n_classes))
+        self._class_matrix[np.arange(self.roots.size), self.tree_class] = 1.0
+        # per-class raw score before any split is seen
+        self._expected = None
+        self._class_walks = {}
+        if self.node_value is not None:
+            self._expected = self.bias + np.bincount(self.tree_class, weights=self.node_value.take(self.roots),
+                                                     minlength=self.n_classes)
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    @property
+    def n_classes(self):
+        return self.bias.size
+
+    @property
+    def max_depth(self):
+        return self.level_width.size
+
+    def _leaves(self, X):
+        """Return the (n_rows, n_trees) leaf node reached by every row in every tree."""
+        n = X.shape[0]
+        has_nan = np.isnan(X).any()
+        if n == 1:
+            xrow = X[0]
+            node = self.roots.copy()
+            for k in self.level_width:
+                cur = node[:k]
+                x = xrow.take(self.feature.take(cur))
+                go_right = x > self.threshold.take(cur)
+                if has_nan:
+                    go_right = np.where(np.isnan(x), ~self.nan_left.take(cur), go_right)
+                node[:k] = self.left.take(cur) + go_right
+            return node[None, :]
+        Xflat = X.ravel()
+        row_off = (np.arange(n, dtype=np.int64) * X.shape[1])[:, None]
+        node = np.tile(self.roots, (n, 1))
+        for k in self.level_width:
+            cur = node[:, :k]
+            x = Xflat.take(row_off + self.feature.take(cur))
+            go_right = x > self.threshold.take(cur)
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.nan_left.take(cur), go_right)
+            cur[...] = self.left.take(cur) + go_right
+        return node
+
+    def contributions(self, X, cls=None):
+        """
+        Per-feature contributions to one class's raw score for each row.
+        cls gives the class index per row (default: the predicted class).
+        Returns (contrib, cls) with contrib of shape (n_rows, n_features + 1); the
+        last column is the expected value and each row sums to the raw score.
+
+        Attribution follows the decision path: every split credits its feature
+        with the change in expected subtree output. It adds up exactly like
+        LightGBM's pred_contrib but is path-based, not SHAP. Rows are grouped by
+        class and only that class's trees are walked.
+        """
+        if self.node_value is None:
+            raise ValueError("Tree tables have no node values; re-export the model")
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float64)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        if cls is None:
+            cls = self.raw_score(X).argmax(axis=1)
+        cls = np.broadcast_to(np.asarray(cls, dtype=np.int64), (X.shape[0],))
+        out = np.empty((X.shape[0], self.n_features + 1))
+        for c in np.unique(cls):
+            rows = np.nonzero(cls == c)[0]
+            for i in range(0, rows.size, BLOCK_ROWS):
+                block = rows[i:i + BLOCK_ROWS]
+                out[block] = self._class_contributions(X[block], int(c))
+        return out, np.array(cls)
+
+    def _class_walk(self, c):
+        """Trees of class c (still deepest first) and how many of them each level walks."""
+        walk = self._class_walks.get(c)
+        if walk is None:
+            idx = np.nonzero(self.tree_class == c)[0].astype(np.int32)
+            widths = [int(w) for w in np.searchsorted(idx, self.level_width) if w > 0]
+            walk = self._class_walks[c] = (idx, widths)
+        return walk
+
+    def _class_contributions(self, X, c):
+        """Contributions toward class c for a block of rows, walking only that class's trees."""
+        idx, widths = self._class_walk(c)
+        n, width = X.shape[0], self.n_features + 1
+        has_nan = np.isnan(X).any()
+        Xflat = X.ravel()
+        row_off = (np.arange(n, dtype=np.int64) * X.shape[1])[:, None]
+        out_off = (np.arange(n, dtype=np.int64) * width)[:, None]
+        node = np.tile(self.roots.take(idx), (n, 1))
+        contrib = np.zeros(n * width)
+        for k in widths:
+            cur = node[:, :k]
+            feat = self.feature.take(cur)
+            x = Xflat.take(row_off + feat)
+            go_right = x > self.threshold.take(cur)
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.nan_left.take(cur), go_right)
+            nxt = self.left.take(cur) + go_right
+            contrib += np.bincount((out_off + feat).ravel(),
+                                   weights=(self.node_value.take(nxt) - self.node_value.take(cur)).ravel(),
+                                   minlength=n * width)
+            cur[...] = nxt
+        contrib = contrib.reshape(n, width)
+        contrib[:, -1] = self._expected[c]
+        return contrib
+
+    def raw_score(self, X):
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float64)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        if X.shape[0] == 1:
+            vals = self.leaf_value.take(self._leaves(X)[0])
+            return (np.bincount(self.tree_class, weights=vals, minlength=self.n_classes) + self.bias)[None, :]
+        out = np.empty((X.shape[0], self.n_classes))
+        for i in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[i:i + BLOCK_ROWS]
+            out[i:i + BLOCK_ROWS] = self.leaf_value.take(self._leaves(block)) @ self._class_matrix + self.bias
+        return out
+
+    def predict_proba(self, X):
+        raw = self.raw_score(X)
+        raw -= raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        raw /= raw.sum(axis=1, keepdims=True)
+        return raw
+
+    def predict(self, X):
+        """Return class labels (or indices if classes are unknown)."""
+        idx = self.predict_proba(X).argmax(axis=1)
+        return self.classes[idx] if self.classes is not None else idx
+
+    # --- persistence ---
+    def arrays(self):
+        """Name -> ndarray mapping of everything needed to rebuild the ensemble."""
+        return {
+            'feature': self.feature, 'threshold': self.threshold, 'nan_left': self.nan_left,
+            'left': self.left, 'leaf_value': self.leaf_value, 'roots': self.roots,
+            'tree_class': self.tree_class, 'level_width': self.level_width, 'bias': self.bias,
+            'feature_names': np.asarray(self.feature_names, dtype=str),
+            'classes': self.classes.astype(str) if self.classes is not None else np.asarray([], dtype=str),
+            'node_value': self.node_value if self.node_value is not None else np.asarray([], dtype=np.float64),
+        }
+
+    def save(self, path):
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def from_arrays(cls, a):
+        classes = a['classes'] if a['classes'].size else None
+        node_value = a.get('node_value')
+        return cls(a['feature'], a['threshold'], a['nan_left'], a['left'], a['leaf_value'],
+                   a['roots'], a['tree_class'], a['level_width'], a['bias'],
+                   feature_names=[str(f) for f in a['feature_names']], classes=classes,
+                   node_value=node_value if node_value is not None and node_value.size else None)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls.from_arrays({k: z[k] for k in z.files})
+
+
+def export_model(model, scaler=None, label_encoder=None, feature_names=None):
+    """
+    Build a TreeEnsemble from a fitted multiclass LGBMClassifier (or Booster).
+    If scaler is a fitted StandardScaler, its mean/scale are folded into the
+    thresholds so the ensemble scores raw feature values.
+    """
+    booster = getattr(model, 'booster_', model)
+    dump = booster.dump_model()
+    if dump.get('objective', '').split(' ')[0] != 'multiclass':
+        raise ValueError(f"Only multiclass softmax models are supported, got {dump.get('objective')!r}")
+    n_classes = int(dump['num_class'])
+    n_features = int(dump['max_feature_idx']) + 1
+
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    if scaler is not None:
+        mean = np.asarray(scaler.mean_ if scaler.with_mean else mean, dtype=np.float64)
+        scale = np.asarray(scaler.scale_ if scaler.with_std else scale, dtype=np.float64)
+
+    def depth(node):
+        if 'split_feature' not in node:
+            return 0
+        return 1 + max(depth(node['left_child']), depth(node['right_child']))
+
+    bias = np.zeros(n_classes)
+    trees = []  # (depth, tree_structure, class)
+    for t, info in enumerate(dump['tree_info']):
+        structure = info['tree_structure']
+        if 'split_feature' not in structure:
+            bias[t % n_classes] += float(structure['leaf_value'])
+        else:
+            trees.append((depth(structure), structure, t % n_classes))
+    trees.sort(key=lambda x: -x[0])
+
+    # Number nodes level by level across all trees, with siblings adjacent, so
+    # each level touches one contiguous block and the right child is left + 1.
+    feature, threshold, nan_left, left, leaf_value, node_value = [], [], [], [], [], []
+    level = [node for _, node, _ in trees]
+    while level:
+        first = len(feature)
+        next_first = first + len(level)
+        next_level = []
+        for i, node in enumerate(level, start=first):
+            if 'split_feature' not in node:
+                feature.append(0); threshold.append(np.inf); nan_left.append(True)
+                left.append(i); leaf_value.append(float(node['leaf_value']))
+                node_value.append(float(node['leaf_value']))
+                continue
+            if node.get('decision_type', '<=') != '<=':
+                raise ValueError("Categorical splits are not supported")
+            f = int(node['split_feature'])
+            t = float(node['threshold'])
+            feature.append(f)
+            # x_scaled <= t  <=>  x <= t * scale + mean   (scale > 0)
+            threshold.append(t * scale[f] + mean[f])
+            if node.get('missing_type') == 'None':
+                # LightGBM treats NaN as 0.0 in the scaled space
+                nan_left.append(0.0 <= t)
+            else:
+                nan_left.append(bool(node.get('default_left', True)))
+            left.append(next_first + len(next_level))
+            leaf_value.append(0.0)
+            node_value.append(float(node.get('internal_value', 0.0)))
+            next_level.extend([node['left_child'], node['right_child']])
+        level = next_level
+
+    depths = np.array([d for d, _, _ in trees], dtype=np.int32)
+    max_depth = int(depths.max()) if depths.size else 0
+    level_width = [(depths > d).sum() for d in range(max_depth)]
+
+    if feature_names is None:
+        feature_names = FEATURES if len(FEATURES) == n_features else dump['feature_names']
+    classes = label_encoder.classes_ if label_encoder is not None else None
+    return TreeEnsemble(feature, threshold, nan_left, left, leaf_value,
+                        np.arange(len(trees)), [c for _, _, c in trees], level_width, bias,
+                        feature_names=feature_names, classes=classes, node_value=node_value)
+
+
+if __name__ == "__main__":
+    import argparse, joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Export the LightGBM crop model to flat tree tables")
+    parser.add_argument("--model_dir", type=str, default="./model_artifacts")
+    parser.add_argument("--out", type=str, default=None, help="Output .npz (default: <model_dir>/trees.npz)")
+    parser.add_argument("--check", type=str, default=None, help="CSV with feature columns to compare against predict_proba")
+    args = parser.parse_args()
+
+    model = joblib.load(os.path.join(args.model_dir, "model.joblib"))
+    scaler = joblib.load(os.path.join(args.model_dir, "scaler.joblib"))
+    le = joblib.load(os.path.join(args.model_dir, "label_encoder.joblib"))
+    feats = FEATURES
+    meta_path = os.path.join(args.model_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            feats = json.load(f).get('features', FEATURES)
+
+    ens = export_model(model, scaler, le, feature_names=feats)
+    out = args.out or os.path.join(args.model_dir, "trees.npz")
+    ens.save(out)
+    print(f"Exported {ens.roots.size} trees / {ens.feature.size} nodes (depth {ens.max_depth}) -> {out}")
+
+    if args.check:
+        X = pd.read_csv(args.check)[feats].to_numpy(dtype=np.float64)
+        ref = model.predict_proba(scaler.transform(pd.DataFrame(X, columns=feats)))
+        got = ens.predict_proba(X)
+        print(f"Max |p - predict_proba| over {len(X)} rows: {np.abs(ref - got).max():.2e}")
+        t0 = time.perf_counter()
+        for row in X[:1000]:
+            ens.predict_proba(row)
+        print(f"Single-row latency: {(time.perf_counter() - t0) / min(len(X), 1000) * 1e6:.1f} us")
+        t0 = time.perf_counter()
+        ens.predict_proba(X)
+        print(f"Batch of {len(X)}: {(time.perf_counter() - t0) * 1e3:.1f} ms")
@@ -1,30 +1,20 @@
 # utils.py
-import os, joblib, rasterio, requests, math
-import pandas as pd
+# rasterio, requests and pandas are imported inside the functions that need
+# them, so pages that never look up soil or weather don't pay for them
+import os
+from http_client import get_client, FORECAST_TTL, GEOCODE_TTL
+from telemetry import span
+from soil_grid import get_soil_grid
 
-# --- model loader (expects joblib artifacts in model_artifacts/) ---
+# --- model loader (model_bundle.npy or joblib artifacts in model_artifacts/) ---
 def load_model_artifacts(model_dir="./model_artifacts"):
     """
-    Return (model, scaler, label_encoder, meta) or raise helpful errors.
+    Return (model, scaler, label_encoder, meta). Missing files come back as None / {}.
+    Artifacts are loaded once per process and hot-reloaded when training rewrites
+    them (see model_registry.py).
     """
-    # Adjust filenames if your repo uses different ones
-    mpath = os.path.join(model_dir, "crop_recommender.pkl")
-    spath = os.path.join(model_dir, "scaler.pkl")
-    lpath = os.path.join(model_dir, "label_encoder.pkl")
-    meta_path = os.path.join(model_dir, "meta.json")
-
-    model = joblib.load(mpath) if os.path.exists(mpath) else None
-    scaler = joblib.load(spath) if os.path.exists(spath) else None
-    le = joblib.load(lpath) if os.path.exists(lpath) else None
-    meta = {}
-    if os.path.exists(meta_path):
-        try:
-            meta = pd.read_json(meta_path).to_dict()
-        except:
-            import json
-            with open(meta_path) as f:
-                meta = json.load(f)
-    return model, scaler, le, meta
+    from model_registry import get_registry
+    return get_registry(model_dir).current().as_tuple()
 
 # --- local SoilGrids raster lookup ---
 RASTER_FILES = {
@@ -33,8 +23,48 @@ RASTER_FILES = {
     "clay": "soil_rasters/clay_0-5cm.tif"
 }
 
+SOIL_GRID_DIR = "soil_rasters"  # soil_grid.npy/.json from `python soil_grid.py`
+_soil_provider = None  # anything with soil(lat, lon) -> dict, e.g. providers.ReplaySoil
+
+def set_soil_provider(provider):
+    """Serve soil lookups from provider instead of the grid/rasters (None restores them); returns the previous one."""
+    global _soil_provider
+    previous, _soil_provider = _soil_provider, provider
+    return previous
+
 def fetch_soilgrids_local(lat, lon):
-    """Return dict with phh2o, soc, clay (floats or None)."""
+    """
+    Return dict with phh2o, soc, clay (floats or None). Reads the stacked,
+    memory-mapped soil grid when it has been built, otherwise the GeoTIFFs.
+    """
+    with span("soil_lookup"):
+        if _soil_provider is not None:
+            return _soil_provider.soil(lat, lon)
+        return read_local_soil(lat, lon)
+
+def read_local_soil(lat, lon):
+    """The grid / raster read behind fetch_soilgrids_local, bypassing any soil provider."""
+    grid = get_soil_grid(SOIL_GRID_DIR)
+    if grid is not None:
+        return grid.lookup_dict(lat, lon)
+    return _read_soil_rasters(lat, lon)
+
+def fetch_soilgrids_local_many(lats, lons):
+    """Vectorized fetch_soilgrids_local: DataFrame with one column per layer (NaN where unknown)."""
+    import pandas as pd
+    with span("soil_lookup_many"):
+        if _soil_provider is not None:
+            return pd.DataFrame([_soil_provider.soil(la, lo) for la, lo in zip(lats, lons)],
+                                columns=list(RASTER_FILES), dtype=float)
+        grid = get_soil_grid(SOIL_GRID_DIR)
+        if grid is not None:
+            return pd.DataFrame(grid.lookup_many(lats, lons), columns=grid.layers)
+        return pd.DataFrame([_read_soil_rasters(la, lo) for la, lo in zip(lats, lons)],
+                            columns=list(RASTER_FILES), dtype=float)
+
+def _read_soil_rasters(lat, lon):
+    import rasterio
+    from rasterio.windows import Window
     out = {}
     for prop, path in RASTER_FILES.items():
         try:
@@ -43,7 +73,11 @@ def fetch_soilgrids_local(lat, lon):
                 continue
             with rasterio.open(path) as src:
                 row, col = src.index(lon, lat)   # note: src.index expects lon,lat if CRS is EPSG:4326
-                val = src.read(1)[row, col]
+                if not (0 <= row < src.height and 0 <= col < src.width):
+                    out[prop] = None
+                    continue
+                # decode just this pixel, not the whole band
+                val = src.read(1, window=Window(col, row, 1, 1))[0, 0]
                 if val == src.nodata:
                     out[prop] = None
                 else:
@@ -54,28 +88,44 @@ def fetch_soilgrids_local(lat, lon):
 
 # --- OpenWeather helper (simple) ---
 def get_coords_for_city_openweather(city, key):
-    """Return (lat, lon) using OpenWeather geocoding."""
+    """
+    Return (lat, lon) for a place name, or (None, None). The offline gazetteer
+    answers first (exact name or alias matches only, never a phonetic guess);
+    OpenWeather geocoding is only called on a miss (and needs a key), and its
+    answer is added to the gazetteer for next time.
+    """
+    from gazetteer import get_gazetteer
+    with span("geocode_local"):
+        place = get_gazetteer().lookup(city)
+    if place is not None:
+        return place.lat, place.lon
     if not key:
         return None, None
+    from requests import RequestException
     url = "http://api.openweathermap.org/geo/1.0/direct"
-    r = requests.get(url, params={"q": city, "limit": 1, "appid": key}, timeout=10)
-    if r.status_code != 200:
+    try:
+        with span("geocode"):
+            data = get_client().get_json(url, params={"q": city, "limit": 1, "appid": key}, ttl=GEOCODE_TTL)
+    except RequestException:
         return None, None
-    data = r.json()
     if not data:
         return None, None
-    return data[0]["lat"], data[0]["lon"]
+    lat, lon = float(data[0]["lat"]), float(data[0]["lon"])
+    get_gazetteer().add(data[0].get("name") or city, lat, lon, state=data[0].get("state") or "", aliases=[city])
+    return lat, lon
 
 def fetch_openweather(lat, lon, key):
     """Simple 7-day weather fetch (use OneCall or current+forecast). Return small dict or None."""
     if not key:
         return None
+    from requests import RequestException
     url = "https://api.openweathermap.org/data/2.5/onecall"
     params = {"lat": lat, "lon": lon, "exclude": "minutely,hourly", "appid": key, "units": "metric"}
-    r = requests.get(url, params=params, timeout=10)
-    if r.status_code != 200:
+    try:
+        with span("openweather"):
+            j = get_client().get_json(url, params=params, ttl=FORECAST_TTL)
+    except RequestException:
         return None
-    j = r.json()
     # compute 7-day avg temp/humidity and total precipitation (if present)
     temps = [d.get("temp", {}).get("day") for d in j.get("daily", [])][:7]
     hums = [d.get("humidity") for d in j.get("daily", [])][:7]